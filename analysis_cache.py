@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from shared_state import get_shared_state, shared_state_configured
+
+# Bump this to invalidate every cached analysis at once
+CACHE_SCHEMA_VERSION = "1"
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def normalize_text(text):
+    """Normalize text so cosmetic whitespace changes still hit the cache"""
+    if text is None:
+        return ""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def template_version(template):
+    """Short fingerprint of a prompt template, so prompt edits invalidate old entries"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+def make_cache_key(node, model, template, inputs):
+    """Content-addressed key for one node's output.
+
+    Only the inputs a node actually uses go into the key, so e.g.
+    extract_keywords entries are shared by every resume analyzed against
+    the same job description.
+    """
+    payload = {
+        "v": CACHE_SCHEMA_VERSION,
+        "node": node,
+        "model": model,
+        "template": template_version(template),
+        "inputs": {
+            name: normalize_text(value) if isinstance(value, str) else value
+            for name, value in sorted(inputs.items())
+        },
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return f"{node}:{hashlib.sha256(encoded).hexdigest()}"
+
+
+class CacheStats:
+    """Thread-safe hit/miss counter"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.stats.record(True)
+                    return value
+                del self._entries[key]
+        self.stats.record(False)
+        return None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """Local disk cache backed by SQLite, shared by every process on the host"""
+
+    def __init__(self, path="analysis_cache.db", max_entries=DEFAULT_MAX_ENTRIES * 10, ttl=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and (row[1] is None or row[1] > now):
+            with conn:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats.record(True)
+            return json.loads(row[0])
+        if row is not None:
+            with conn:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        self.stats.record(False)
+        return None
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            # Evict least recently used entries beyond the size limit
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache")
+
+
+class RedisCache:
+    """Cache backed by Redis or any Redis-protocol compatible server"""
+
+    def __init__(self, url="redis://localhost:6379/0", ttl=DEFAULT_TTL_SECONDS, prefix="resume-matcher:", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("The redis cache backend requires the 'redis' package: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        self.stats.record(raw is not None)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        # Redis handles LRU eviction itself when configured with maxmemory-policy allkeys-lru
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(self.ttl) if self.ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class SharedCache:
+    """Cache in the shared-state store (shared_state.py), so every app replica shares its entries"""
+
+    def __init__(self, kv, ttl=DEFAULT_TTL_SECONDS, prefix="analysis:"):
+        self.kv = kv
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get(self, key):
+        value = self.kv.get(self.prefix + key)
+        self.stats.record(value is not None)
+        return value
+
+    def set(self, key, value):
+        self.kv.set(self.prefix + key, value, ttl=self.ttl)
+
+    def delete(self, key):
+        self.kv.delete(self.prefix + key)
+
+    def clear(self):
+        self.kv.clear(self.prefix)
+
+
+class NullCache:
+    """Backend that never stores anything, used to disable caching"""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.record(False)
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_cache():
+    """Process-wide analysis cache, configured from environment variables.
+
+    ANALYSIS_CACHE_BACKEND: memory, sqlite, redis, shared or none. Defaults
+        to shared when SHARED_STATE_URL is set, memory otherwise
+    ANALYSIS_CACHE_TTL: entry lifetime in seconds
+    ANALYSIS_CACHE_MAX_ENTRIES: LRU size limit (memory and sqlite)
+    ANALYSIS_CACHE_PATH: database file for the sqlite backend
+    ANALYSIS_CACHE_REDIS_URL: server URL for the redis backend
+    """
+    default = "shared" if shared_state_configured() else "memory"
+    backend = os.environ.get("ANALYSIS_CACHE_BACKEND", default).lower()
+    ttl = float(os.environ.get("ANALYSIS_CACHE_TTL", DEFAULT_TTL_SECONDS))
+
+    if backend == "memory":
+        max_entries = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        max_entries = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES * 10))
+        path = os.environ.get("ANALYSIS_CACHE_PATH", "analysis_cache.db")
+        return SQLiteCache(path=path, max_entries=max_entries, ttl=ttl)
+    if backend == "redis":
+        url = os.environ.get("ANALYSIS_CACHE_REDIS_URL", "redis://localhost:6379/0")
+        return RedisCache(url=url, ttl=ttl)
+    if backend == "shared":
+        return SharedCache(get_shared_state(), ttl=ttl)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown ANALYSIS_CACHE_BACKEND: {backend}")
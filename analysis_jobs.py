@@ -0,0 +1,556 @@
+"""Analysis jobs, run off the Streamlit script thread.
+
+submit_analysis() stores a job in the analysis_jobs database and returns
+its ID. Worker threads claim queued jobs (premium plans first), run the
+analysis graph (scoring against a cached job profile for a fresh
+analysis) and write progress back under the job ID as it happens:
+the finished nodes and the recommendations streamed so far, then the
+final result. The page only submits and polls job_status(), so a rerun,
+a second tab or a reload loses nothing. A job submitted with previous_job
+re-analyzes an edited resume incrementally from that job's result.
+
+Workers run inside the app (ANALYSIS_WORKERS threads per process, default
+4) or as separate processes sharing the database, so one UI process can
+front any number of them:
+    ANALYSIS_WORKERS=0 streamlit run app.py
+    python analysis_jobs.py work --workers 16
+
+ANALYSIS_JOBS_DB is a SQLite file (default analysis_jobs.db) for one host,
+or a postgresql:// URL so app replicas and workers on several hosts share
+one queue.
+
+ANALYSIS_QUEUE_DEPTH (default 100) bounds the number of queued jobs;
+submit_analysis() raises QueueFullError beyond it.
+"""
+import abc
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from llm_scheduler import PRIORITIES, llm_priority
+from subscription_store import get_subscription_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_DEPTH = 100
+POLL_INTERVAL_SECONDS = 0.2
+
+# Streamed recommendations are written back at most this often
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# A running job whose worker stopped renewing its lease is handed out again,
+# up to MAX_ATTEMPTS times in all. Workers renew it every HEARTBEAT_SECONDS,
+# also while waiting on the model.
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 2
+
+# Finished jobs are deleted after this long
+RETENTION_SECONDS = 7 * 24 * 3600
+
+FINISHED_STATUSES = ("completed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    job_id TEXT PRIMARY KEY,
+    username TEXT,
+    plan_type TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    refund INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    claimed_by TEXT,
+    lease_until DOUBLE PRECISION,
+    created_at DOUBLE PRECISION NOT NULL,
+    started_at DOUBLE PRECISION,
+    finished_at DOUBLE PRECISION
+)
+"""
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS analysis_jobs_queue ON analysis_jobs (status, priority, created_at)",
+)
+
+
+class QueueFullError(Exception):
+    """More than ANALYSIS_QUEUE_DEPTH jobs are already waiting"""
+
+
+class AnalysisJobStore(abc.ABC):
+    """Jobs, their progress and results over any DB-API connection"""
+
+    # DB-API parameter placeholder; "?" for sqlite3, "%s" for psycopg
+    placeholder = "?"
+
+    def __init__(self):
+        self._local = threading.local()
+        with self._transaction() as cursor:
+            cursor.execute(SCHEMA)
+            for index in INDEXES:
+                cursor.execute(index)
+            self._upgrade_schema(cursor)
+
+    @abc.abstractmethod
+    def connect(self):
+        """A new DB-API connection to the database"""
+
+    def _upgrade_schema(self, cursor):
+        """Bring a table created by an older version up to the current schema"""
+
+    @abc.abstractmethod
+    def location(self):
+        """Where the jobs are stored, for logs (no credentials)"""
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _sql(self, query):
+        return query.replace("?", self.placeholder)
+
+    def submit(self, inputs, username=None, plan_type="basic", refund=False, max_queued=DEFAULT_QUEUE_DEPTH):
+        """Queue a job; returns its ID, or raises QueueFullError"""
+        job_id = uuid.uuid4().hex
+        with self._transaction() as cursor:
+            # The depth check and the insert are one statement, so concurrent
+            # submits can't overfill the queue
+            cursor.execute(self._sql(
+                "INSERT INTO analysis_jobs (job_id, username, plan_type, priority, status, inputs, refund, "
+                "attempts, created_at) SELECT ?, ?, ?, ?, 'queued', ?, ?, 0, ? "
+                "WHERE (SELECT COUNT(*) FROM analysis_jobs WHERE status = 'queued') < ?"),
+                (job_id, username, plan_type, PRIORITIES.get(plan_type, PRIORITIES["basic"]), json.dumps(inputs),
+                 int(refund), time.time(), max_queued))
+            if cursor.rowcount != 1:
+                raise QueueFullError(f"{max_queued} analyses are already queued")
+        return job_id
+
+    def claim(self, worker_id):
+        """Take the next job for this worker, or None.
+
+        Returns a dict with job_id, username, plan_type, refund, attempts and
+        inputs. Like payment events, attempts doubles as a version number, so
+        concurrent workers never receive the same job.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            row = cursor.execute(self._sql(
+                "SELECT job_id, attempts FROM analysis_jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until <= ? AND attempts < ?) "
+                "ORDER BY priority, created_at LIMIT 1"), (now, MAX_ATTEMPTS)).fetchone()
+            if row is None:
+                return None
+            job_id, attempts = row
+            cursor.execute(self._sql(
+                "UPDATE analysis_jobs SET status = 'running', claimed_by = ?, attempts = attempts + 1, "
+                "lease_until = ?, started_at = ?, progress = NULL WHERE job_id = ? AND attempts = ?"),
+                (worker_id, now + LEASE_SECONDS, now, job_id, attempts))
+            if cursor.rowcount != 1:
+                return None
+            row = cursor.execute(self._sql(
+                "SELECT job_id, username, plan_type, refund, attempts, inputs FROM analysis_jobs WHERE job_id = ?"),
+                (job_id,)).fetchone()
+        job = dict(zip(("job_id", "username", "plan_type", "refund", "attempts", "inputs"), row))
+        job["refund"] = bool(job["refund"])
+        job["inputs"] = json.loads(job["inputs"])
+        return job
+
+    def save_progress(self, job_id, worker_id, progress):
+        """Record partial output and renew the lease; returns False if the job was taken from this worker"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE analysis_jobs SET progress = ?, lease_until = ? "
+                "WHERE job_id = ? AND claimed_by = ? AND status = 'running'"),
+                (json.dumps(progress), time.time() + LEASE_SECONDS, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def renew_lease(self, job_id, worker_id):
+        """Extend a claimed job's lease; returns False if the job was taken from this worker"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE analysis_jobs SET lease_until = ? WHERE job_id = ? AND claimed_by = ? AND status = 'running'"),
+                (time.time() + LEASE_SECONDS, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def finish(self, job_id, worker_id, result=None, error=None):
+        """Mark a claimed job completed (with its result) or failed (with an error)"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE analysis_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE job_id = ? AND claimed_by = ? AND status = 'running'"),
+                ("failed" if error else "completed", None if error else json.dumps(result), error, time.time(),
+                 job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def fail_abandoned(self):
+        """Fail jobs whose worker stopped on their last attempt; returns them for refunds"""
+        now = time.time()
+        with self._transaction() as cursor:
+            rows = cursor.execute(self._sql(
+                "SELECT job_id, username, refund FROM analysis_jobs "
+                "WHERE status = 'running' AND lease_until <= ? AND attempts >= ?"), (now, MAX_ATTEMPTS)).fetchall()
+            failed = []
+            for job_id, username, refund in rows:
+                cursor.execute(self._sql(
+                    "UPDATE analysis_jobs SET status = 'failed', error = 'The analysis worker stopped', "
+                    "finished_at = ?, lease_until = NULL WHERE job_id = ? AND status = 'running'"), (now, job_id))
+                if cursor.rowcount == 1:
+                    failed.append({"job_id": job_id, "username": username, "refund": bool(refund)})
+        return failed
+
+    def analysis_state(self, job_id):
+        """The inputs and analyses of a completed job, as the "previous" state of an incremental run, or None"""
+        with self._transaction() as cursor:
+            row = cursor.execute(self._sql(
+                "SELECT inputs, result FROM analysis_jobs WHERE job_id = ? AND status = 'completed'"), (job_id,)).fetchone()
+        if row is None:
+            return None
+        inputs, result = json.loads(row[0]), json.loads(row[1])
+        return {"resume": inputs["resume"], "job_description": inputs["job_description"],
+                **{key: result.get(key) or {} for key in ("skills_analysis", "experience_analysis", "keyword_analysis")}}
+
+    def get(self, job_id):
+        """Status, progress, result and queue position of a job, or None for an unknown ID"""
+        with self._transaction() as cursor:
+            row = cursor.execute(self._sql(
+                "SELECT job_id, username, plan_type, priority, status, progress, result, error, attempts, "
+                "created_at, started_at, finished_at FROM analysis_jobs WHERE job_id = ?"), (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(("job_id", "username", "plan_type", "priority", "status", "progress", "result", "error",
+                            "attempts", "created_at", "started_at", "finished_at"), row))
+            job["queue_position"] = None
+            if job["status"] == "queued":
+                job["queue_position"] = cursor.execute(self._sql(
+                    "SELECT COUNT(*) FROM analysis_jobs WHERE status = 'queued' "
+                    "AND (priority < ? OR (priority = ? AND created_at < ?))"),
+                    (job["priority"], job["priority"], job["created_at"])).fetchone()[0]
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self):
+        """Number of jobs by status"""
+        with self._transaction() as cursor:
+            return dict(cursor.execute(self._sql("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status")).fetchall())
+
+    def purge(self, max_age=RETENTION_SECONDS):
+        """Delete jobs that finished more than max_age seconds ago; returns how many"""
+        with self._transaction() as cursor:
+            return cursor.execute(self._sql("DELETE FROM analysis_jobs WHERE status IN ('completed', 'failed') "
+                                            "AND finished_at < ?"), (time.time() - max_age,)).rowcount
+
+
+class SQLiteJobStore(AnalysisJobStore):
+    """Jobs in SQLite (WAL), shared by every process on the host"""
+
+    def __init__(self, path="analysis_jobs.db"):
+        self.path = path
+        super().__init__()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def location(self):
+        return self.path
+
+
+class PostgresJobStore(AnalysisJobStore):
+    """Jobs on a PostgreSQL server, shared by app replicas and workers on any host"""
+
+    placeholder = "%s"
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        super().__init__()
+
+    def connect(self):
+        try:
+            import psycopg
+        except ImportError:
+            raise ImportError("The PostgreSQL job store requires 'psycopg': pip install psycopg[binary]")
+        return psycopg.connect(self.dsn)
+
+    def _upgrade_schema(self, cursor):
+        # Timestamps were once REAL, which Postgres stores as float4: about a
+        # two-minute resolution for epoch seconds, coarser than the lease
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() "
+            "AND table_name = 'analysis_jobs' AND data_type = 'real'")
+        for (column,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE analysis_jobs ALTER COLUMN {column} TYPE DOUBLE PRECISION")
+
+    def location(self):
+        url = urlparse(self.dsn)
+        return f"postgresql://{url.hostname}{url.path}"
+
+
+@lru_cache(maxsize=None)
+def get_job_store():
+    """Process-wide job store, chosen by ANALYSIS_JOBS_DB.
+
+    A SQLite file path (default analysis_jobs.db), a sqlite:/// URL or a
+    postgresql:// connection URL.
+    """
+    location = os.environ.get("ANALYSIS_JOBS_DB", "analysis_jobs.db")
+    if location.startswith(("postgresql://", "postgres://")):
+        return PostgresJobStore(location)
+    if location.startswith("sqlite:///"):
+        location = location[len("sqlite:///"):]
+    return SQLiteJobStore(location)
+
+
+def submit_analysis(resume, job_description, username=None, plan_type="basic", refund=False, previous_job=None,
+                    store=None):
+    """Queue an analysis of resume against job_description; returns the job ID.
+
+    With refund, a failed job gives the user's analysis back. previous_job
+    is the ID of an earlier completed analysis of the same job description,
+    whose results are reused for the resume sections that have not changed.
+    """
+    store = store or get_job_store()
+    max_queued = int(os.environ.get("ANALYSIS_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH))
+    inputs = {"resume": resume, "job_description": job_description}
+    if previous_job:
+        inputs["previous_job"] = previous_job
+    return store.submit(inputs,
+                        username=username, plan_type=plan_type, refund=refund, max_queued=max_queued)
+
+
+def job_status(job_id, store=None):
+    """The job as a dict (status queued, running, completed or failed), or None"""
+    return (store or get_job_store()).get(job_id)
+
+
+def job_result(job_id, store=None):
+    """The finished analysis state of a completed job, or None"""
+    job = job_status(job_id, store)
+    return job and job["result"]
+
+
+_graph_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _default_graph():
+    # Importing LangChain and LangGraph takes seconds, so the page never does:
+    # the first worker to claim a job compiles the graph for all of them
+    from resume_analyzer import create_analysis_graph
+    return create_analysis_graph()
+
+
+def default_graph():
+    """The analysis graph shared by this process's workers, compiled on first use"""
+    with _graph_lock:
+        return _default_graph()
+
+
+@lru_cache(maxsize=None)
+def _profile_graph():
+    from resume_analyzer import create_profile_analysis_graph
+    return create_profile_analysis_graph()
+
+
+def profile_graph():
+    """The job-profile scoring graph shared by this process's workers, compiled on first use"""
+    with _graph_lock:
+        return _profile_graph()
+
+
+def _refund(job):
+    if job["refund"] and job["username"]:
+        get_subscription_store().refund_analysis(job["username"])
+
+
+class AnalysisWorker(threading.Thread):
+    """Daemon thread that claims queued jobs and runs them through the analysis graph"""
+
+    def __init__(self, workflow=None, store=None, poll_interval=POLL_INTERVAL_SECONDS):
+        super().__init__(name="analysis-worker", daemon=True)
+        self.workflow = workflow
+        self.store = store or get_job_store()
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        self._stop_event = threading.Event()
+
+    def _heartbeat(self, job_id, done, lost):
+        # Keeps the lease while the graph waits on the model between progress writes
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                if not self.store.renew_lease(job_id, self.worker_id):
+                    lost.set()
+                    return
+            except Exception:
+                logger.exception("analysis worker could not renew the lease of job %s", job_id)
+
+    def _workflow_for(self, inputs):
+        """The graph to run inputs through, adding the job profile to inputs when it is used"""
+        from resume_analyzer import analysis_mode, build_job_profile, is_degraded
+        if self.workflow is not None:
+            return self.workflow
+        # A fresh analysis in the default mode is scored against the job profile,
+        # extracted once per job description; re-analyses after an edit and the
+        # other ANALYSIS_MODEs run the full analysis graph
+        if "previous" not in inputs and analysis_mode() == "multi":
+            profile = build_job_profile(inputs["job_description"])
+            if not is_degraded(profile):
+                inputs["job_profile"] = profile
+                return profile_graph()
+        return default_graph()
+
+    def run_job(self, job):
+        """Run one claimed job to completion, writing progress as it goes"""
+        inputs = {"resume": job["inputs"]["resume"], "job_description": job["inputs"]["job_description"],
+                  "skills_analysis": {}, "experience_analysis": {}, "keyword_analysis": {}}
+        previous = job["inputs"].get("previous_job") and self.store.analysis_state(job["inputs"]["previous_job"])
+        if previous:
+            inputs["previous"] = previous
+        progress = {"nodes": {}, "recommendations": ""}
+        saved_at = 0.0
+        done, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["job_id"], done, lost),
+                                     name="analysis-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            from resume_analyzer import stream_analysis
+            # Premium jobs are admitted to the model ahead of basic ones, as in the page itself
+            with llm_priority(job["plan_type"]):
+                workflow = self._workflow_for(inputs)
+                for kind, payload in stream_analysis(workflow, inputs):
+                    if kind == "token":
+                        progress["recommendations"] += payload
+                        if time.monotonic() - saved_at < PROGRESS_INTERVAL_SECONDS:
+                            continue
+                    elif kind == "reset":
+                        # The recommendations call was retried and streams its answer again
+                        progress["recommendations"] = ""
+                    elif kind == "node":
+                        name, update = payload
+                        progress["nodes"][name] = update
+                    else:
+                        result = {key: value for key, value in payload.items()
+                                  if key not in ("resume", "job_description", "previous", "job_profile")}
+                        continue
+                    saved_at = time.monotonic()
+                    if lost.is_set() or not self.store.save_progress(job["job_id"], self.worker_id, progress):
+                        # Our lease lapsed and another worker has the job
+                        return
+        except Exception as e:
+            if self.store.finish(job["job_id"], self.worker_id, error=str(e) or type(e).__name__):
+                _refund(job)
+            return
+        finally:
+            done.set()
+            heartbeat.join()
+        self.store.finish(job["job_id"], self.worker_id, result=result)
+
+    def process_next(self):
+        """Claim and run one job; returns False when nothing is queued"""
+        for job in self.store.fail_abandoned():
+            _refund(job)
+        job = self.store.claim(self.worker_id)
+        if job is None:
+            return False
+        self.run_job(job)
+        return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                busy = self.process_next()
+            except Exception:
+                # Database hiccups shouldn't kill the worker
+                logger.exception("analysis worker error")
+                busy = False
+            if not busy:
+                self._stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class AnalysisWorkerPool:
+    """A number of AnalysisWorker threads sharing compiled graphs (default_graph() and profile_graph() unless given)"""
+
+    def __init__(self, workers=None, workflow=None, store=None):
+        if workers is None:
+            workers = int(os.environ.get("ANALYSIS_WORKERS", DEFAULT_WORKERS))
+        self.size = workers
+        self.store = store or get_job_store()
+        self.workflow = workflow
+        self.workers = []
+
+    def start(self):
+        if not self.size:
+            return self
+        self.store.purge()
+        self.workers = [AnalysisWorker(self.workflow, self.store) for _ in range(self.size)]
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analysis job workers.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    work = subcommands.add_parser("work", help="Run analysis jobs from the shared queue")
+    work.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    subcommands.add_parser("stats", help="Print the number of jobs by status")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(get_job_store().counts()))
+        return
+
+    from telemetry import configure_telemetry
+    configure_telemetry()
+    # A dedicated worker process compiles the graphs up front rather than on its first job
+    default_graph()
+    profile_graph()
+    pool = AnalysisWorkerPool(args.workers).start()
+    print(f"{args.workers} analysis workers running on {get_job_store().location()}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Typed output schemas for the extraction nodes, and repair of malformed output.
+
+Each model mirrors the JSON structure its prompt asks for. The models are
+sent to the API as the response schema, so well-behaved models return
+exactly this shape; repair_output() salvages responses that still do not
+validate (code fences, prose around the JSON, missing keys, a string where
+a list belongs) without another LLM call.
+"""
+import json
+from typing import List
+
+from pydantic import BaseModel, ValidationError
+
+
+class SkillsAnalysis(BaseModel):
+    skills_in_job_description: List[str]
+    skills_in_resume: List[str]
+    missing_skills: List[str]
+    matching_skills: List[str]
+
+
+class ExperienceAnalysis(BaseModel):
+    experience_required: List[str]
+    experience_in_resume: List[str]
+    experience_gaps: List[str]
+    experience_highlights: List[str]
+
+
+class KeywordAnalysis(BaseModel):
+    essential_keywords: List[str]
+    technical_terms: List[str]
+    industry_buzzwords: List[str]
+    action_verbs: List[str]
+
+
+class CombinedAnalysis(BaseModel):
+    """The three extraction analyses from one single-pass call"""
+    skills_analysis: SkillsAnalysis
+    experience_analysis: ExperienceAnalysis
+    keyword_analysis: KeywordAnalysis
+
+
+class JobProfileExtraction(BaseModel):
+    required_skills: List[str]
+    required_experience: List[str]
+    essential_keywords: List[str]
+    technical_terms: List[str]
+    industry_buzzwords: List[str]
+    action_verbs: List[str]
+
+
+class ProfileMatch(BaseModel):
+    skills_in_resume: List[str]
+    missing_skills: List[str]
+    matching_skills: List[str]
+    experience_in_resume: List[str]
+    experience_gaps: List[str]
+    experience_highlights: List[str]
+
+
+def _json_object(text):
+    """The outermost {...} in text, parsed, or None"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if isinstance(value, list):
+        return [str(item) for item in value if item is not None]
+    return [str(value)]
+
+
+def _nested_schema(field):
+    annotation = field.annotation
+    return annotation if isinstance(annotation, type) and issubclass(annotation, BaseModel) else None
+
+
+def _coerce(schema, data):
+    """data reshaped to schema's fields: lists of strings, or nested objects for nested models"""
+    fields = {}
+    for name, field in schema.model_fields.items():
+        nested = _nested_schema(field)
+        if nested is None:
+            fields[name] = _as_list(data.get(name))
+        else:
+            value = data.get(name)
+            fields[name] = _coerce(nested, value if isinstance(value, dict) else {})
+    return fields
+
+
+def _has_content(fields):
+    return any(_has_content(value) if isinstance(value, dict) else value for value in fields.values())
+
+
+def repair_output(schema, text):
+    """Coerce raw model output into schema as a dict, or None if nothing usable is in it"""
+    data = _json_object(text or "")
+    if data is None:
+        return None
+    fields = _coerce(schema, data)
+    if not _has_content(fields):
+        return None
+    try:
+        return schema.model_validate(fields).model_dump()
+    except ValidationError:
+        return None
+
+
+def empty_output(schema):
+    """A valid, empty result for schema, used when output cannot be repaired"""
+    return _coerce(schema, {})
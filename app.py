@@ -1,32 +1,174 @@
 import streamlit as st
 import os
-from datetime import datetime
 
-# Import our custom modules
+# Import our custom modules. The login page needs none of the analysis,
+# document or PayPal libraries: the analysis graph is compiled by the job
+# workers on their first job, and payment and upload handling are imported
+# below once a user has logged in.
 from auth_handler import setup_authentication
-from paypal_handler import initialize_paypal, display_payment_options, check_user_subscription, execute_paypal_payment
-from document_processor import process_resume_file
-from resume_analyzer import create_analysis_graph, GraphState
+from payment_webhooks import (PaymentEventProcessor, PaymentWorker, checkout_status, enqueue_checkout_return,
+                              paypal_checkout_executor)
+from analysis_jobs import (FINISHED_STATUSES, PROGRESS_INTERVAL_SECONDS, AnalysisWorkerPool, QueueFullError,
+                           get_job_store, job_status, submit_analysis)
+from llm_scheduler import get_scheduler
+from subscription_store import get_subscription_store
+from telemetry import configure_telemetry, stage_summary
 
 # Set the page title
 st.set_page_config(page_title="Resume Matcher Pro", page_icon="📝")
 
+# JSON stage logs and the Prometheus endpoint, if configured
+configure_telemetry()
+
+# Users who can see pipeline latency metrics
+ADMIN_USERS = {name.strip() for name in os.environ.get("ADMIN_USERS", "").split(",") if name.strip()}
+
+@st.cache_resource
+def start_analysis_workers():
+    """Run queued analyses on ANALYSIS_WORKERS background threads per process (0 runs none here)"""
+    return AnalysisWorkerPool().start()
+
+start_analysis_workers()
+
 # App title and description
 st.title("Resume Matcher Pro")
 st.write("Match your resume to job descriptions with AI-powered recommendations.")
 
+def paypal_credentials():
+    """PayPal client ID and secret from the environment or st.secrets, or (None, None)"""
+    client_id = os.environ.get('PAYPAL_CLIENT_ID')
+    client_secret = os.environ.get('PAYPAL_CLIENT_SECRET')
+    try:
+        paypal_secrets = st.secrets['paypal'] if 'paypal' in st.secrets else {}
+    except FileNotFoundError:
+        paypal_secrets = {}
+    return client_id or paypal_secrets.get('client_id'), client_secret or paypal_secrets.get('client_secret')
+
+@st.cache_resource
+def start_payment_worker():
+    """Apply queued payment events on one background thread per process.
+
+    The worker may confirm a checkout before anyone has logged in here, so it
+    configures PayPal with the deployment's credentials itself (on its first
+    PayPal call, keeping the SDK off the login page).
+    """
+    processor = None
+    client_id, client_secret = paypal_credentials()
+    if client_id and client_secret:
+        processor = PaymentEventProcessor(execute_checkout=paypal_checkout_executor(client_id, client_secret))
+    # Otherwise the worker uses the credentials initialize_paypal() takes from the sidebar
+    worker = PaymentWorker(processor)
+    worker.start()
+    return worker
+
+start_payment_worker()
+
 # Check if we're coming back from a successful payment
 if 'success' in st.query_params:
-    execute_paypal_payment()
+    # Confirmation happens on the payment worker; the page only queues it
+    checkout_id = enqueue_checkout_return(dict(st.query_params))
+    if checkout_id:
+        st.session_state['pending_checkout'] = checkout_id
     # Clear the URL parameters after processing
     for param in list(st.query_params):
         del st.query_params[param]
 
+@st.fragment(run_every=1)
+def show_checkout_status(checkout_id):
+    """Poll the local checkout status until the worker has confirmed the payment"""
+    status = checkout_status(checkout_id)
+    if status != 'created':
+        # A full rerun refreshes the sidebar plan and stops this fragment;
+        # an unknown checkout (None) is reported as failed rather than polled forever
+        del st.session_state['pending_checkout']
+        st.session_state['checkout_result'] = status or 'failed'
+        st.rerun()
+    st.info("Confirming your payment with PayPal...")
+
+DETAIL_TITLES = {
+    "skills_analysis": "Skills Analysis",
+    "experience_analysis": "Experience Analysis",
+    "keyword_analysis": "Keyword Analysis"
+}
+
+def show_analysis(job):
+    """Render a queued or finished analysis job: its place in the queue or its result"""
+    st.subheader("Resume Optimization Recommendations")
+    if job['status'] == 'queued':
+        st.info(f"Waiting for a free analysis worker ({job['queue_position']} ahead of you)...")
+    elif job['status'] == 'completed':
+        st.markdown(job['result']['final_recommendations'])
+    else:
+        # The worker has already refunded the analysis
+        st.error(f"Analysis failed: {job['error']}. You have not been charged for it.")
+
+    state = job['result'] or {}
+    details = [(title, state[key]) for key, title in DETAIL_TITLES.items() if state.get(key)]
+    if details:
+        with st.expander("View Detailed Analysis"):
+            for title, value in details:
+                st.subheader(title)
+                st.json(value)
+
+def show_running_analysis(job):
+    """Render a running job's recommendations and finished analyses as its worker has stored them"""
+    st.subheader("Resume Optimization Recommendations")
+    st.info("Analyzing your resume against the job description...")
+    progress = job['progress'] or {}
+    recommendations = progress.get('recommendations', '')
+    # Text shown by earlier runs of the polling fragment is redrawn at once; only
+    # the part the worker added since is streamed. A shorter text means the
+    # worker started the recommendations over.
+    shown_key = f"recommendations_shown:{job['job_id']}"
+    shown = st.session_state.get(shown_key, 0)
+    if shown > len(recommendations):
+        shown = 0
+    if recommendations:
+        st.write_stream(chunk for chunk in (recommendations[:shown], recommendations[shown:]) if chunk)
+    st.session_state[shown_key] = len(recommendations)
+
+    # Intermediate analyses appear here as each node completes
+    state = {}
+    for update in progress.get('nodes', {}).values():
+        state.update(update)
+    details = [(title, state[key]) for key, title in DETAIL_TITLES.items() if state.get(key)]
+    if details:
+        with st.expander("View Detailed Analysis"):
+            for title, value in details:
+                st.subheader(title)
+                st.json(value)
+
+@st.fragment(run_every=PROGRESS_INTERVAL_SECONDS)
+def poll_analysis(job_id):
+    """Show an unfinished analysis job, its place in the queue or its progress, until it finishes"""
+    job = job_status(job_id)
+    if job is None or job['status'] in FINISHED_STATUSES:
+        st.session_state.pop(f"recommendations_shown:{job_id}", None)
+        # A full rerun shows the result, refreshes the sidebar quota and stops this fragment
+        st.rerun()
+    if job['status'] == 'running':
+        show_running_analysis(job)
+    else:
+        show_analysis(job)
+
+if st.session_state.get('pending_checkout'):
+    show_checkout_status(st.session_state['pending_checkout'])
+elif st.session_state.get('checkout_result') == 'completed':
+    del st.session_state['checkout_result']
+    st.success("Payment successful! Your plan is now active.")
+elif st.session_state.get('checkout_result') == 'failed':
+    del st.session_state['checkout_result']
+    st.error("Your payment could not be completed. You have not been charged.")
+
 # Set up authentication
 is_authenticated, username, authenticator = setup_authentication()
 
-# Initialize PayPal
-paypal_initialized = initialize_paypal()
+# Initialize PayPal, for logged-in users only
+paypal_initialized = False
+if is_authenticated:
+    from paypal_handler import initialize_paypal, display_payment_options, check_user_subscription
+    from document_processor import process_resume_file
+    paypal_initialized = initialize_paypal()
 
 if is_authenticated and paypal_initialized:
     # Check if the user has an active subscription
@@ -39,8 +181,10 @@ if is_authenticated and paypal_initialized:
         # Show subscription info
         st.sidebar.success(f"Active Plan: {plan_type.capitalize()}")
         
+        subscription_store = get_subscription_store()
+        
         if plan_type == 'basic':
-            analyses_remaining = st.session_state['user_subscriptions'][username]['analyses_remaining']
+            analyses_remaining = subscription_store.get(username)['analyses_remaining']
             st.sidebar.info(f"Analyses Remaining: {analyses_remaining}")
         
         # OpenAI API key
@@ -68,56 +212,58 @@ if is_authenticated and paypal_initialized:
 
         # Check if we have enough analyses remaining
         can_analyze = False
-        if username in st.session_state.get('user_subscriptions', {}):
-            subscription = st.session_state['user_subscriptions'][username]
+        subscription = subscription_store.get(username)
+        if subscription is not None:
             if subscription['plan_type'] == 'premium' or subscription['analyses_remaining'] > 0:
                 can_analyze = True
 
         # Button to analyze
         if st.button("Analyze Resume", disabled=not can_analyze):
-            if resume_text and job_description:
-                # Update the user's remaining analyses count
-                if username in st.session_state['user_subscriptions']:
-                    subscription = st.session_state['user_subscriptions'][username]
-                    
-                    if subscription['plan_type'] == 'basic':
-                        subscription['analyses_remaining'] -= 1
-                        st.session_state['user_subscriptions'][username] = subscription
-                
-                with st.spinner("Analyzing your resume against the job description..."):
-                    # Initialize the graph
-                    workflow = create_analysis_graph()
-                    
-                    # Run the graph
-                    result = workflow.invoke({
-                        "resume": resume_text,
-                        "job_description": job_description,
-                        "skills_analysis": {},
-                        "experience_analysis": {},
-                        "keyword_analysis": {}
-                    })
-                    
-                    # Display results
-                    st.subheader("Resume Optimization Recommendations")
-                    st.markdown(result["final_recommendations"])
-                    
-                    # Show detailed analysis if wanted
-                    with st.expander("View Detailed Analysis"):
-                        st.subheader("Skills Analysis")
-                        st.json(result["skills_analysis"])
-                        
-                        st.subheader("Experience Analysis")
-                        st.json(result["experience_analysis"])
-                        
-                        st.subheader("Keyword Analysis")
-                        st.json(result["keyword_analysis"])
+            if resume_text and job_description and not subscription_store.consume_analysis(username):
+                # Another tab spent the last analysis since this page rendered
+                st.error("You have no analyses remaining. Please upgrade your plan to continue.")
+            elif resume_text and job_description:
+                # The analysis runs on a worker; the page polls it by job ID, which
+                # survives reruns and reloads in the URL. After an edit to the resume
+                # text, the last analysis is updated rather than redone.
+                previous = job_status(st.query_params['job']) if 'job' in st.query_params else None
+                previous_job = previous['job_id'] if previous and previous['username'] == username else None
+                try:
+                    st.query_params['job'] = submit_analysis(resume_text, job_description, username=username,
+                                                             plan_type=subscription['plan_type'], refund=True,
+                                                             previous_job=previous_job)
+                except QueueFullError:
+                    subscription_store.refund_analysis(username)
+                    st.error("Too many analyses are waiting right now. Please try again in a minute.")
             else:
                 st.error("Please provide both your resume and the job description.")
-                
+
+        job = job_status(st.query_params['job']) if 'job' in st.query_params else None
+        if job is not None and job['username'] == username:
+            if job['status'] in FINISHED_STATUSES:
+                show_analysis(job)
+            else:
+                poll_analysis(job['job_id'])
+
         # If we're running out of analyses, show a prompt to upgrade
-        if username in st.session_state.get('user_subscriptions', {}) and plan_type == 'basic':
-            subscription = st.session_state['user_subscriptions'][username]
+        subscription = subscription_store.get(username)
+        if subscription is not None and plan_type == 'basic':
             if subscription['analyses_remaining'] <= 1:
                 st.warning("You're running low on resume analyses. Consider upgrading to our Premium plan for unlimited analyses.")
                 if st.button("Upgrade to Premium"):
                     display_payment_options(username)
+
+# Latency and usage per pipeline stage, for operators
+if is_authenticated and username in ADMIN_USERS:
+    with st.expander("Pipeline metrics (admin)"):
+        summary = stage_summary()
+        if summary:
+            st.dataframe([{"stage": stage, **{name: round(value, 3) if isinstance(value, float) else value
+                                             for name, value in stats.items()}}
+                          for stage, stats in summary.items()], hide_index=True)
+        else:
+            st.write("No stages recorded in this process yet.")
+        st.caption("LLM scheduler")
+        st.json(get_scheduler().snapshot())
+        st.caption("Analysis jobs")
+        st.json(get_job_store().counts())
@@ -1,59 +1,27 @@
+import os
+
 import streamlit as st
 import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
-from pathlib import Path
-import os
+
+from credential_store import get_credential_store
+
+# Cookie details; every replica must sign cookies with the same AUTH_COOKIE_KEY
+COOKIE = {
+    "expiry_days": 30,
+    "key": os.environ.get("AUTH_COOKIE_KEY", "resume_matcher_app"),
+    "name": "resume_matcher_auth"
+}
 
 def setup_authentication():
-    # Delete existing config file if having issues
-    if os.path.exists("auth_config.yaml"):
-        os.remove("auth_config.yaml")
-    
-    # Hard-coded credentials for simplicity
-    names = ["Demo User"]
-    usernames = ["demo"]
-    passwords = ["password"]  # Plain text for initial creation
-    
-    # Hash passwords
-    hashed_passwords = stauth.Hasher(passwords).generate()
-    
-    # Create config dictionary
-    credentials = {
-        "usernames": {
-            usernames[0]: {
-                "name": names[0],
-                "password": hashed_passwords[0]
-            }
-        }
-    }
-    
-    # Cookie details
-    cookie = {
-        "expiry_days": 30,
-        "key": "resume_matcher_app",
-        "name": "resume_matcher_auth"
-    }
-    
-    # Save config
-    config = {
-        "credentials": credentials,
-        "cookie": cookie
-    }
-    
-    with open("auth_config.yaml", "w") as file:
-        yaml.dump(config, file)
-    
-    # Load from file
-    with open("auth_config.yaml") as file:
-        config = yaml.load(file, Loader=SafeLoader)
+    # Credentials are loaded once per process; no hashing or file I/O per rerun
+    store = get_credential_store()
     
     # Create authenticator
     authenticator = stauth.Authenticate(
-        config["credentials"],
-        config["cookie"]["name"],
-        config["cookie"]["key"],
-        config["cookie"]["expiry_days"]
+        store.credentials(),
+        COOKIE["name"],
+        COOKIE["key"],
+        COOKIE["expiry_days"]
     )
     
     # Create login widget
@@ -67,7 +35,7 @@ def setup_authentication():
     elif authentication_status == None:
         st.warning("Please enter your username and password")
         with st.expander("Don't have an account? Register here"):
-            register_user(authenticator, config)
+            register_user(store)
         return False, None, authenticator
     
     else:
@@ -75,7 +43,7 @@ def setup_authentication():
         authenticator.logout("Logout", "sidebar")
         return True, username, authenticator
 
-def register_user(authenticator, config):
+def register_user(store):
     with st.form("Registration"):
         new_username = st.text_input("Username", key="reg_username")
         new_name = st.text_input("Full Name", key="reg_name")
@@ -90,18 +58,8 @@ def register_user(authenticator, config):
                 return
             
             try:
-                # Hash password
-                hashed_password = stauth.Hasher([new_password]).generate()[0]
-                
-                # Add new user
-                config["credentials"]["usernames"][new_username] = {
-                    "name": new_name,
-                    "password": hashed_password
-                }
-                
-                # Save updated config
-                with open("auth_config.yaml", "w") as file:
-                    yaml.dump(config, file)
+                # Hash the password and insert just this user
+                store.add_user(new_username, new_name, new_password)
                 
                 st.success("Registration successful! You can now log in with username: " + new_username)
                 
@@ -0,0 +1,281 @@
+"""Rank a directory of resumes against one job description, without the Streamlit UI.
+
+Usage:
+    python batch_runner.py resumes/ job_description.txt --output ranked.csv
+
+Each resume is scored against a job profile built once for the job
+description, so a run costs one LLM call for the posting plus two per
+resume. Completed resumes are appended to a checkpoint file as they finish;
+re-running the same command after a crash skips everything already done.
+Checkpointed records are only reused by a run with the same job
+description, mode (--local or not) and --min-prescore.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from analysis_cache import normalize_text
+from document_processor import SUPPORTED_EXTENSIONS, extract_text_from_path
+from llm_scheduler import DEFAULT_TOKENS_PER_MINUTE, LLMScheduler, llm_priority, set_scheduler
+from skill_matcher import prepare_job, prescore
+from telemetry import configure_telemetry, stage_summary, trace_run
+
+def find_resumes(resume_dir):
+    """All supported resume files under a directory, in a stable order"""
+    return sorted(
+        path for path in Path(resume_dir).rglob("*")
+        if path.is_file() and path.suffix.lower().lstrip(".") in SUPPORTED_EXTENSIONS
+    )
+
+
+def file_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def run_key(job_description, local_only=False, min_prescore=None):
+    """Fingerprint of the settings a record depends on: job description, mode and prescore threshold"""
+    settings = {"job_description": normalize_text(job_description), "mode": "local" if local_only else "llm",
+                "min_prescore": min_prescore}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(checkpoint_path, key=None):
+    """Completed records from a previous run with the same run_key, keyed by file content hash"""
+    completed = {}
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written last line
+                    continue
+                if record.get("status") in ("ok", "filtered") and record.get("run_key") == key:
+                    completed[record["sha256"]] = record
+    return completed
+
+
+def write_results(records, output_path):
+    """Write records ranked by match score as CSV or JSONL, based on the file extension"""
+    ranked = sorted(records, key=lambda record: record.get("match_score", -1), reverse=True)
+    for rank, record in enumerate(ranked, start=1):
+        record["rank"] = rank
+
+    if str(output_path).endswith(".jsonl"):
+        with open(output_path, "w") as file:
+            for record in ranked:
+                file.write(json.dumps(record) + "\n")
+        return ranked
+
+    with open(output_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["rank", "file", "match_score", "matching_skills", "missing_skills",
+                         "experience_gaps", "status", "recommendations"])
+        for record in ranked:
+            skills = record.get("skills_analysis") or {}
+            experience = record.get("experience_analysis") or {}
+            writer.writerow([
+                record["rank"],
+                record["file"],
+                record.get("match_score", ""),
+                "; ".join(skills.get("matching_skills", [])),
+                "; ".join(skills.get("missing_skills", [])),
+                "; ".join(experience.get("experience_gaps", [])),
+                record["status"],
+                record.get("final_recommendations", record.get("error", "")),
+            ])
+    return ranked
+
+
+def _local_record(path, digest, local, status):
+    return {
+        "file": str(path),
+        "sha256": digest,
+        "status": status,
+        "match_score": local["match_score"],
+        "skills_analysis": local["skills_analysis"],
+        "experience_analysis": {},
+        "keyword_analysis": local["keyword_analysis"],
+        "final_recommendations": "",
+    }
+
+
+async def _analyze_resume(path, digest, local_job, job_profile, workflow,
+                          local_only=False, min_prescore=None):
+    resume_text = await asyncio.to_thread(extract_text_from_path, path)
+
+    # The local matcher costs milliseconds; use it to rank outright or to skip weak matches
+    if local_only or min_prescore is not None:
+        local = prescore(resume_text, local_job)
+        if local_only:
+            return _local_record(path, digest, local, "ok")
+        if local["match_score"] < min_prescore:
+            return _local_record(path, digest, local, "filtered")
+
+    from resume_analyzer import compute_match_score, is_degraded
+
+    # Rate limits and retries are handled per LLM call by the shared scheduler
+    result = await workflow.ainvoke({
+        "resume": resume_text,
+        "job_description": job_profile["job_description"],
+        "job_profile": job_profile,
+    })
+
+    if is_degraded(result):
+        # Empty analyses would score as a perfect match
+        return {"file": str(path), "sha256": digest, "status": "error",
+                "error": "The analysis output could not be parsed or repaired"}
+
+    return {
+        "file": str(path),
+        "sha256": digest,
+        "status": "ok",
+        "match_score": compute_match_score(result),
+        "skills_analysis": result["skills_analysis"],
+        "experience_analysis": result["experience_analysis"],
+        "keyword_analysis": result["keyword_analysis"],
+        "final_recommendations": result["final_recommendations"],
+    }
+
+
+async def run_batch(resume_dir, job_description, output_path, concurrency=8,
+                    requests_per_minute=300, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                    checkpoint_path=None, local_only=False, min_prescore=None, log=sys.stderr):
+    """Analyze every resume in a directory against one job description and write a ranked report.
+
+    With local_only, resumes are ranked by the LLM-free skill matcher alone.
+    With min_prescore, resumes whose local match score falls below it are
+    recorded as "filtered" without any LLM calls.
+
+    Returns a summary dict with counts, elapsed time and throughput in
+    resumes per minute (counting only resumes analyzed in this run), plus
+    per-stage latency percentiles under "stages".
+    """
+    if checkpoint_path is None:
+        checkpoint_path = f"{output_path}.checkpoint.jsonl"
+
+    key = run_key(job_description, local_only, min_prescore)
+    paths = find_resumes(resume_dir)
+    completed = load_checkpoint(checkpoint_path, key)
+    # One output record per file; identical files are analyzed once and share the result
+    records = {}
+    paths_by_digest = {}
+    for path in paths:
+        digest = file_digest(path)
+        if digest in completed:
+            records[str(path)] = dict(completed[digest], file=str(path))
+        else:
+            paths_by_digest.setdefault(digest, []).append(path)
+    pending = [(same_paths[0], digest) for digest, same_paths in paths_by_digest.items()]
+    print(f"{len(paths)} resumes found, {len(records)} already done, {len(pending)} to analyze", file=log)
+
+    start = time.monotonic()
+    set_scheduler(LLMScheduler(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                               max_concurrency=2 * concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    job_profile = workflow = None
+    # The job description's side of the local matcher is worked out once for all resumes
+    local_job = prepare_job(job_description) if local_only or min_prescore is not None else None
+    if pending and not local_only:
+        # Imported here so --local runs never load the LLM stack
+        from resume_analyzer import abuild_job_profile, create_profile_analysis_graph, is_degraded
+
+        job_profile = await abuild_job_profile(job_description)
+        if is_degraded(job_profile):
+            # Every resume would be scored against an empty profile
+            raise RuntimeError("Could not extract a job profile from the job description; try again")
+        workflow = create_profile_analysis_graph()
+
+    with open(checkpoint_path, "a") as checkpoint:
+        async def worker(path, digest):
+            nonlocal done
+            queued_at = time.perf_counter()
+            async with semaphore:
+                with trace_run("batch_resume") as span:
+                    span["queue_wait_seconds"] = time.perf_counter() - queued_at
+                    try:
+                        record = await _analyze_resume(path, digest, local_job, job_profile, workflow,
+                                                      local_only=local_only, min_prescore=min_prescore)
+                    except Exception as e:
+                        record = {"file": str(path), "sha256": digest, "status": "error", "error": str(e)}
+                    span["status"] = record["status"]
+            record["run_key"] = key
+            for same_path in paths_by_digest[digest]:
+                records[str(same_path)] = dict(record, file=str(same_path))
+            checkpoint.write(json.dumps(record) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+            done += 1
+            elapsed = time.monotonic() - start
+            rate = 60.0 * done / elapsed if elapsed else 0.0
+            print(f"[{done}/{len(pending)}] {path.name}: {record.get('match_score', record['status'])} "
+                  f"({rate:.1f} resumes/min)", file=log)
+
+        with llm_priority("batch"):
+            await asyncio.gather(*(worker(path, digest) for path, digest in pending))
+
+    elapsed = time.monotonic() - start
+    ranked = write_results(list(records.values()), output_path)
+    summary = {
+        "total": len(paths),
+        "analyzed": done,
+        "skipped_from_checkpoint": len(paths) - sum(len(same_paths) for same_paths in paths_by_digest.values()),
+        "errors": sum(1 for record in ranked if record["status"] == "error"),
+        "filtered": sum(1 for record in ranked if record["status"] == "filtered"),
+        "elapsed_seconds": round(elapsed, 2),
+        "resumes_per_minute": round(60.0 * done / elapsed, 2) if elapsed and done else 0.0,
+        "output": str(output_path),
+        "stages": stage_summary(),
+    }
+    print(f"Throughput: {summary['resumes_per_minute']} resumes/min "
+          f"({done} analyzed in {summary['elapsed_seconds']}s, {summary['errors']} errors)", file=log)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank a directory of resumes against one job description.")
+    parser.add_argument("resume_dir", help="Directory of PDF, DOCX or TXT resumes")
+    parser.add_argument("job_description", help="Text file containing the job description")
+    parser.add_argument("--output", "-o", default="ranked_resumes.csv", help="Ranked output file (.csv or .jsonl)")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="Resumes analyzed at the same time")
+    parser.add_argument("--rpm", type=int, default=300, help="OpenAI requests-per-minute budget (0 for no limit)")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help="OpenAI tokens-per-minute budget (0 for no limit)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument("--local", action="store_true", help="Rank with the local skill matcher only (no LLM calls)")
+    parser.add_argument("--min-prescore", type=float,
+                        help="Skip LLM analysis for resumes whose local match score (0-100) is below this")
+    args = parser.parse_args(argv)
+
+    if not args.local and not os.environ.get("OPENAI_API_KEY"):
+        parser.error("OPENAI_API_KEY must be set")
+    configure_telemetry()
+
+    with open(args.job_description) as file:
+        job_description = file.read()
+
+    summary = asyncio.run(run_batch(
+        args.resume_dir,
+        job_description,
+        args.output,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        checkpoint_path=args.checkpoint,
+        local_only=args.local,
+        min_prescore=args.min_prescore,
+    ))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Overhead and throughput of running analyses as queued jobs.
+
+Runs --jobs analyses of one resume/JD pair with the seeded fake model and
+the analysis cache off, first directly on the calling thread (as the page
+used to), then submitted to a temporary job database and drained by
+--workers worker threads. Reports per-analysis latency for both, the time
+from submit to the first recorded progress, and jobs completed per minute.
+The difference in single-job latency is the cost of the queue: claiming,
+progress writes and polling.
+
+Usage:
+    python benchmarks/bench_analysis_jobs.py [--jobs 16] [--workers 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-not-used")
+os.environ["LLM_REQUESTS_PER_MINUTE"] = os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+
+from fake_llm import install_fake_llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--median-ms", type=float, default=400.0, help="Fake model first-token latency")
+    args = parser.parse_args()
+
+    install_fake_llm(median_ms=args.median_ms)
+    from analysis_jobs import FINISHED_STATUSES, AnalysisWorkerPool, SQLiteJobStore, job_status, submit_analysis
+    from corpus import JD_SIZES, RESUME_SIZES, job_description, resume_lines
+    from resume_analyzer import create_analysis_graph, stream_analysis
+
+    resume = "\n".join(resume_lines(next(iter(RESUME_SIZES)), 0))
+    jd = job_description(JD_SIZES[0])
+    workflow = create_analysis_graph()
+
+    direct = []
+    for _ in range(min(args.jobs, 4)):
+        start = time.perf_counter()
+        for _ in stream_analysis(workflow, {"resume": resume, "job_description": jd, "skills_analysis": {},
+                                            "experience_analysis": {}, "keyword_analysis": {}}):
+            pass
+        direct.append(time.perf_counter() - start)
+    print(f"Direct, on the page thread:  {1000 * statistics.median(direct):7.0f} ms per analysis")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteJobStore(os.path.join(directory, "jobs.db"))
+        pool = AnalysisWorkerPool(args.workers, workflow=workflow, store=store).start()
+
+        start = time.perf_counter()
+        submitted = {submit_analysis(resume, jd, store=store): time.perf_counter() for _ in range(args.jobs)}
+        first_progress, finished = {}, {}
+        while len(finished) < len(submitted):
+            for job_id in submitted.keys() - finished.keys():
+                job = job_status(job_id, store)
+                if job["progress"] and job_id not in first_progress:
+                    first_progress[job_id] = time.perf_counter()
+                if job["status"] in FINISHED_STATUSES:
+                    finished[job_id] = time.perf_counter()
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        pool.stop()
+
+        latencies = sorted(finished[job_id] - submitted[job_id] for job_id in submitted)
+        to_progress = [first_progress[job_id] - submitted[job_id] for job_id in first_progress]
+        print(f"Queued, {args.workers} workers:         {1000 * latencies[0]:7.0f} ms for the first job, "
+              f"p50 {1000 * statistics.median(latencies):.0f} ms, max {1000 * latencies[-1]:.0f} ms")
+        print(f"Submit to first progress:    {1000 * min(to_progress):7.0f} ms at best, "
+              f"p50 {1000 * statistics.median(to_progress):.0f} ms")
+        print(f"Throughput: {60 * args.jobs / elapsed:.0f} analyses per minute; {store.counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Input tokens, latency and output quality of the multi-node and single-pass analysis modes.
+
+Every resume/JD pair of the synthetic corpus is analyzed in both
+ANALYSIS_MODEs with the analysis cache off. For each mode this reports
+prompt tokens and cost per analysis (extraction stages and in total), LLM
+calls, and end-to-end latency percentiles. Quality is measured two ways:
+
+- agreement: per-field Jaccard overlap between the two modes' skills,
+  experience and keyword lists, averaged over the corpus
+- skill recall: the share of skills the local dictionary matcher finds in
+  both documents that each mode also reports as matching
+
+Offline, the seeded fake model answers every prompt with the same canned
+analysis, so agreement is trivially 1.0 and only tokens and latency are
+informative; its generation time grows with answer length, so the longer
+combined answer is not free. With --live the real OpenAI API is used
+(OPENAI_API_KEY must be set, and the run is billed) and the quality
+figures become meaningful.
+
+Usage:
+    python benchmarks/bench_analysis_modes.py [--resumes-per-size 1] [--live]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+
+EXTRACTION_STAGES = ("extract_skills", "analyze_experience", "extract_keywords", "extract_combined")
+COMPARED_FIELDS = {
+    "skills_analysis": ("skills_in_resume", "missing_skills", "matching_skills"),
+    "experience_analysis": ("experience_required", "experience_gaps", "experience_highlights"),
+    "keyword_analysis": ("essential_keywords", "technical_terms", "action_verbs"),
+}
+
+
+def _normalized(items):
+    return {item.strip().lower() for item in items}
+
+
+def jaccard(first, second):
+    first, second = _normalized(first), _normalized(second)
+    return len(first & second) / len(first | second) if first | second else 1.0
+
+
+def skill_recall(result, reference):
+    """Share of reference matching skills that the analysis also lists as matching"""
+    expected = _normalized(reference["matching_skills"])
+    if not expected:
+        return None
+    found = _normalized(result["skills_analysis"].get("matching_skills", []))
+    return len(expected & found) / len(expected)
+
+
+def run_mode(mode, pairs):
+    import telemetry
+    from resume_analyzer import create_analysis_graph
+
+    telemetry.reset()
+    workflow = create_analysis_graph(mode=mode)
+    results, latencies = [], []
+    for resume, job_description in pairs:
+        start = time.perf_counter()
+        results.append(workflow.invoke({"resume": resume, "job_description": job_description,
+                                        "skills_analysis": {}, "experience_analysis": {}, "keyword_analysis": {}}))
+        latencies.append(time.perf_counter() - start)
+
+    summary = telemetry.stage_summary()
+    extraction = [stats for stage, stats in summary.items() if stage in EXTRACTION_STAGES]
+    latencies_ms = sorted(1000 * seconds for seconds in latencies)
+    return results, {
+        "extraction_prompt_tokens": sum(stats["prompt_tokens"] for stats in extraction) / len(pairs),
+        "total_prompt_tokens": sum(stats["prompt_tokens"] for stats in summary.values()) / len(pairs),
+        "completion_tokens": sum(stats["completion_tokens"] for stats in summary.values()) / len(pairs),
+        "llm_calls": sum(stats["count"] for stats in summary.values()) / len(pairs),
+        "cost_usd": sum(stats["cost_usd"] for stats in summary.values()) / len(pairs),
+        "extraction_p50_ms": statistics.median(stats["p50_ms"] for stats in extraction),
+        "p50_ms": latencies_ms[len(latencies_ms) // 2],
+        "p95_ms": latencies_ms[min(len(latencies_ms) - 1, int(0.95 * len(latencies_ms)))],
+    }
+
+
+def compare_quality(multi_results, single_results, references):
+    agreement = {}
+    for key, fields in COMPARED_FIELDS.items():
+        for field in fields:
+            agreement[f"{key}.{field}"] = statistics.mean(
+                jaccard(multi[key].get(field, []), single[key].get(field, []))
+                for multi, single in zip(multi_results, single_results))
+    recall = {}
+    for mode, results in (("multi", multi_results), ("single", single_results)):
+        scores = [score for score in map(skill_recall, results, references) if score is not None]
+        recall[mode] = statistics.mean(scores) if scores else None
+    return agreement, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resumes-per-size", type=int, default=1)
+    parser.add_argument("--live", action="store_true", help="Call the real OpenAI API instead of the fake model")
+    parser.add_argument("--median-ms", type=float, default=400.0, help="Fake model first-token latency")
+    parser.add_argument("--ms-per-output-token", type=float, default=12.0, help="Fake model generation speed")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.live:
+        if not os.environ.get("OPENAI_API_KEY"):
+            parser.error("--live needs OPENAI_API_KEY")
+    else:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-not-used")
+        os.environ["LLM_REQUESTS_PER_MINUTE"] = os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+        from fake_llm import install_fake_llm
+        install_fake_llm(median_ms=args.median_ms, ms_per_output_token=args.ms_per_output_token)
+
+    from corpus import JD_SIZES, RESUME_SIZES, job_description, resume_lines
+    from skill_matcher import match_skills
+
+    pairs = [("\n".join(resume_lines(size, seed)), job_description(jd_size))
+             for size in RESUME_SIZES for seed in range(args.resumes_per_size) for jd_size in JD_SIZES]
+    references = [match_skills(resume, jd) for resume, jd in pairs]
+
+    report = {"pairs": len(pairs), "live": args.live, "modes": {}}
+    results = {}
+    for mode in ("multi", "single"):
+        results[mode], report["modes"][mode] = run_mode(mode, pairs)
+    report["agreement"], report["skill_recall"] = compare_quality(results["multi"], results["single"], references)
+
+    print(f"{len(pairs)} analyses per mode ({'live API' if args.live else 'fake model'})")
+    print(f"{'':28}{'multi':>12}{'single':>12}")
+    for metric in report["modes"]["multi"]:
+        multi, single = report["modes"]["multi"][metric], report["modes"]["single"][metric]
+        print(f"{metric:28}{multi:>12.4g}{single:>12.4g}")
+    for mode, recall in report["skill_recall"].items():
+        print(f"skill recall vs local matcher ({mode}): {recall if recall is None else round(recall, 3)}")
+    print(f"mean field agreement between modes: {statistics.mean(report['agreement'].values()):.3f}")
+    worst = sorted(report["agreement"].items(), key=lambda item: item[1])[:3]
+    print("least agreement: " + ", ".join(f"{field} {score:.2f}" for field, score in worst))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-rerun authentication setup cost, before and after the credential store.
+
+"Before" repeats what setup_authentication did on every Streamlit rerun:
+bcrypt-hash the demo password, write auth_config.yaml and read it back.
+"After" is the per-rerun work now: one indexed MAX(rowid) query, plus
+building the credentials dict only when users were added.
+
+Usage:
+    python benchmarks/bench_auth_overhead.py [iterations]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import streamlit_authenticator as stauth
+import yaml
+from yaml.loader import SafeLoader
+
+from credential_store import CredentialStore
+
+
+def setup_per_rerun(config_path):
+    """The old per-rerun path: hash, dump YAML, load YAML"""
+    hashed_passwords = stauth.Hasher(["password"]).generate()
+    config = {
+        "credentials": {"usernames": {"demo": {"name": "Demo User", "password": hashed_passwords[0]}}},
+        "cookie": {"expiry_days": 30, "key": "resume_matcher_app", "name": "resume_matcher_auth"},
+    }
+    with open(config_path, "w") as file:
+        yaml.dump(config, file)
+    with open(config_path) as file:
+        return yaml.load(file, Loader=SafeLoader)["credentials"]
+
+
+def measure(func, iterations):
+    func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "auth_config.yaml")
+        store = CredentialStore(os.path.join(tmp, "users.db"))
+        for label, func in [("before (hash + YAML rewrite)", lambda: setup_per_rerun(config_path)),
+                            ("after (credential store)", store.credentials)]:
+            timings = measure(func, iterations)
+            print(f"{label:30s} median {statistics.median(timings):9.3f} ms   "
+                  f"max {max(timings):9.3f} ms   ({iterations} iterations)")
+
+
+if __name__ == "__main__":
+    main()
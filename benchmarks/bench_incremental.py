@@ -0,0 +1,95 @@
+"""Cost of re-analyzing an edited resume incrementally versus from scratch.
+
+For each resume size of the synthetic corpus, one resume is analyzed in
+full, then edited in three ways and re-analyzed with the first analysis as
+"previous" state:
+
+- one bullet point of one role reworded
+- the education line changed
+- the contact details changed
+
+For each edit this reports the LLM calls made, prompt tokens and estimated
+cost, next to a full analysis of the edited resume. The analysis cache is
+off, so nothing is saved by cache hits. The recommendations always rerun,
+since they quote the resume; the "extraction" columns exclude them. Runs
+offline with the seeded fake model.
+
+Usage:
+    python benchmarks/bench_incremental.py
+"""
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-not-used")
+os.environ["LLM_REQUESTS_PER_MINUTE"] = os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+
+from fake_llm import install_fake_llm
+
+install_fake_llm(median_ms=1, sigma=0.0)
+
+import telemetry
+from corpus import RESUME_SIZES, job_description, resume_lines
+from resume_analyzer import STREAMED_NODE, create_analysis_graph
+
+
+def edit_bullet(lines):
+    lines = list(lines)
+    index = next(i for i, line in enumerate(lines) if line.startswith("- "))
+    lines[index] = lines[index].replace("using", "with", 1) + ", cutting on-call pages in half"
+    return lines
+
+
+def edit_education(lines):
+    return lines[:-1] + ["M.Sc. Computer Science, State University"]
+
+
+def edit_contact(lines):
+    return [lines[0], "new.address@example.com | (555) 010-9999"] + lines[2:]
+
+
+def analyze(workflow, resume, jd, previous=None):
+    """(state, {"calls", "prompt_tokens", "cost_usd"} in total and for extraction only)"""
+    telemetry.reset()
+    state = {"resume": resume, "job_description": jd, "skills_analysis": {}, "experience_analysis": {},
+             "keyword_analysis": {}}
+    if previous is not None:
+        state["previous"] = previous
+    state = workflow.invoke(state)
+    usage = {}
+    for scope in ("total", "extraction"):
+        stages = [stats for stage, stats in telemetry.stage_summary().items()
+                  if scope == "total" or stage != STREAMED_NODE]
+        usage[scope] = {
+            "calls": sum(stats["count"] for stats in stages if stats["prompt_tokens"]),
+            "prompt_tokens": sum(stats["prompt_tokens"] for stats in stages),
+            "cost_usd": sum(stats["cost_usd"] for stats in stages),
+        }
+    return state, usage
+
+
+def main():
+    workflow = create_analysis_graph()
+    jd = job_description("long")
+    print(f"{'resume':8}{'edit':11}{'run':13}{'calls':>6}{'prompt tok':>12}{'extraction tok':>16}"
+          f"{'cost $':>10}{'extraction $':>14}")
+    for size in RESUME_SIZES:
+        lines = resume_lines(size, 0)
+        first, _ = analyze(workflow, "\n".join(lines), jd)
+        previous = {key: first[key] for key in ("resume", "job_description", "skills_analysis",
+                                                "experience_analysis", "keyword_analysis")}
+        for name, edit in (("bullet", edit_bullet), ("education", edit_education), ("contact", edit_contact)):
+            edited = "\n".join(edit(lines))
+            for run, prior in (("full", None), ("incremental", previous)):
+                _, usage = analyze(workflow, edited, jd, prior)
+                total, extraction = usage["total"], usage["extraction"]
+                print(f"{size:8}{name:11}{run:13}{total['calls']:>6}{total['prompt_tokens']:>12}"
+                      f"{extraction['prompt_tokens']:>16}{total['cost_usd']:>10.4f}{extraction['cost_usd']:>14.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Insert throughput, query latency and approximate-search recall of the job description index.
+
+Indexes --postings synthetic job descriptions with the hashing embedder in a
+temporary directory, then queries it with synthetic resumes:
+
+- exact search, one query at a time and in batches
+- the IVF index at several nprobe settings, with recall@k measured
+  against the exact results
+
+The synthetic postings are variations on one template with randomly drawn
+skills, so they have none of the topical clusters (job families) real
+postings form; IVF recall here is a pessimistic bound. Runs fully offline.
+
+Usage:
+    python benchmarks/bench_jd_index.py [--postings 50000] [--queries 200] [-k 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from corpus import JD_SIZES, RESUME_SIZES, job_description, resume_lines
+from jd_index import HashingEmbedder, JDIndex
+
+
+def postings(count):
+    for seed in range(count):
+        text = job_description(JD_SIZES[seed % len(JD_SIZES)], seed)
+        yield f"jd-{seed}", text, text.splitlines()[0]
+
+
+def timed_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(1000 * (time.perf_counter() - start))
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def recall(approximate, exact):
+    return statistics.mean(len({hit["job_id"] for hit in found} & {hit["job_id"] for hit in truth}) / len(truth)
+                           for found, truth in zip(approximate, exact))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--postings", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    sizes = list(RESUME_SIZES)
+    queries = ["\n".join(resume_lines(sizes[seed % len(sizes)], seed)) for seed in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = JDIndex(directory, HashingEmbedder())
+        start = time.perf_counter()
+        index.add_many(postings(args.postings))
+        elapsed = time.perf_counter() - start
+        print(f"Indexed {len(index)} postings in {elapsed:.1f}s ({len(index) / elapsed:.0f}/s, "
+              f"{os.path.getsize(os.path.join(directory, 'vectors.f32')) / 2 ** 20:.0f} MB of vectors)")
+
+        # Embedding is shared by every strategy; time it separately
+        start = time.perf_counter()
+        index.embedder.embed(queries)
+        print(f"Query embedding: {1000 * (time.perf_counter() - start) / len(queries):.2f} ms per resume")
+
+        exact, p50, p95 = timed_queries(lambda query: index.search(query, args.k, approximate=False), queries)
+        print(f"Exact search:             p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
+
+        start = time.perf_counter()
+        index.search_many(queries, args.k, approximate=False)
+        print(f"Exact search, one batch:  {1000 * (time.perf_counter() - start) / len(queries):7.2f} ms per query")
+
+        start = time.perf_counter()
+        cells = index.build_ivf()
+        print(f"IVF build: {cells} clusters in {time.perf_counter() - start:.1f}s")
+        for nprobe in (1, 4, 8, 16, 32):
+            found, p50, p95 = timed_queries(
+                lambda query: index.search(query, args.k, approximate=True, nprobe=nprobe), queries)
+            print(f"IVF nprobe {nprobe:>3}:           p50 {p50:7.2f} ms   p95 {p95:7.2f} ms   "
+                  f"recall@{args.k} {recall(found, exact):.3f}")
+
+
+if __name__ == "__main__":
+    main()
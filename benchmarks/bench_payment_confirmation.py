@@ -0,0 +1,137 @@
+"""Return-page latency and webhook idempotency for payment confirmation.
+
+"Before" executes the payment inline on the return redirect, as the page
+used to (Payment.find + execute, against the stub with PayPal-like latency).
+"After" queues the return and reads the local checkout status, which is all
+the page does now; the worker executes the payment in the background.
+
+Then every recorded webhook in fixtures/paypal_webhooks is delivered twice
+and the resulting subscriptions are checked, so duplicate deliveries must
+not be applied twice. Runs fully offline.
+
+Usage:
+    python benchmarks/bench_payment_confirmation.py [--latency 0.4]
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from paypal_stub_server import start_stub_server
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "paypal_webhooks")
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["SUBSCRIPTION_DB_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'subscriptions.db')}"
+
+
+def stub_payment(server):
+    import paypalrestsdk
+    payment = paypalrestsdk.Payment({"intent": "sale", "payer": {"payment_method": "paypal"},
+                                     "transactions": [{"amount": {"total": "9.99", "currency": "USD"}}]})
+    assert payment.create(), payment.error
+    return payment.id
+
+
+def bench_return_page(server, runs):
+    import paypalrestsdk
+    from payment_webhooks import PaymentEventProcessor, checkout_status, enqueue_checkout_return
+    from subscription_store import get_subscription_store
+
+    store = get_subscription_store()
+    inline, queued, confirmed = [], [], []
+    for i in range(runs):
+        payment_id = stub_payment(server)
+        start = time.perf_counter()
+        payment = paypalrestsdk.Payment.find(payment_id)
+        assert payment.execute({"payer_id": "PAYER"})
+        inline.append(time.perf_counter() - start)
+
+        payment_id = stub_payment(server)
+        store.save_checkout(payment_id, f"user{i}", "basic")
+        start = time.perf_counter()
+        checkout_id = enqueue_checkout_return({"success": "true", "plan": "basic",
+                                               "paymentId": payment_id, "PayerID": "PAYER"})
+        checkout_status(checkout_id)
+        queued.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        PaymentEventProcessor().run_until_idle()
+        assert checkout_status(checkout_id) == "completed"
+        confirmed.append(time.perf_counter() - start)
+
+    ms = lambda samples: round(1000 * sorted(samples)[len(samples) // 2], 2)
+    return {"inline_execute_ms": ms(inline), "enqueue_and_poll_ms": ms(queued),
+            "background_confirmation_ms": ms(confirmed)}
+
+
+def replay_fixtures():
+    from payment_webhooks import PaymentEventProcessor, ingest_webhook
+    from subscription_store import get_subscription_store
+
+    store = get_subscription_store()
+    # The buyers the recorded events refer to
+    store.save_checkout("PAYID-FIXTURE0001", "alice", "basic")
+    store.save("bob", "premium", datetime.now() + timedelta(days=2), float("inf"), agreement_id="I-FIXTURE0002")
+
+    processor = PaymentEventProcessor()
+    results = {}
+    for name in ("payment_sale_completed", "billing_subscription_created", "billing_sale_completed_recurring"):
+        with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+            body = f.read()
+        # Every delivery arrives twice, as PayPal does when an acknowledgement is slow
+        results[name] = [ingest_webhook(body, {}, verify=None)[1] for _ in range(2)]
+        processor.run_until_idle()
+
+    alice, bob = store.get("alice"), store.get("bob")
+    assert alice["plan_type"] == "basic" and alice["analyses_remaining"] == 5, alice
+    assert store.consume_analysis("alice")
+    assert bob["expiry_date"] > datetime.now() + timedelta(days=29), bob
+
+    for name in ("payment_sale_refunded", "billing_subscription_suspended"):
+        with open(os.path.join(FIXTURES, f"{name}.json"), "rb") as f:
+            body = f.read()
+        results[name] = [ingest_webhook(body, {}, verify=None)[1] for _ in range(2)]
+    processor.run_until_idle()
+    assert store.get("alice")["expiry_date"] <= datetime.now()
+    assert store.get("bob")["expiry_date"] <= datetime.now()
+
+    # Redelivering the sale after the refund must not grant the plan again
+    with open(os.path.join(FIXTURES, "payment_sale_completed.json"), "rb") as f:
+        assert ingest_webhook(f.read(), {}, verify=None)[1] == "duplicate"
+    processor.run_until_idle()
+    assert store.get("alice")["expiry_date"] <= datetime.now()
+
+    assert len(glob.glob(os.path.join(FIXTURES, "*.json"))) == len(results)
+    return results, store.payment_event_counts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.4, help="Simulated PayPal latency per request (s)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    os.environ["PAYPAL_ENDPOINT"] = server.url
+    from paypal_handler import configure_paypal_sdk
+    configure_paypal_sdk("stub-client", "stub-secret")
+
+    print(f"Return page with {args.latency * 1000:.0f} ms PayPal latency (median of {args.runs}):")
+    for name, value in bench_return_page(server, args.runs).items():
+        print(f"  {name}: {value}")
+
+    deliveries, counts = replay_fixtures()
+    print("Recorded webhooks, each delivered twice:")
+    for name, statuses in deliveries.items():
+        print(f"  {name}: {', '.join(statuses)}")
+    print(f"Event queue: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""PayPal round-trips per premium checkout, against the local stub server.
+
+"Before" forgets the provisioned billing plan before every checkout, which
+reproduces the old create + activate plan per click. "After" reuses the
+cached plan, so each checkout is a single agreement request. Runs fully
+offline.
+
+Usage:
+    python benchmarks/bench_paypal_checkout.py [checkouts]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from paypal_stub_server import start_stub_server
+
+server = start_stub_server()
+_tmp = tempfile.TemporaryDirectory()
+os.environ["PAYPAL_ENDPOINT"] = server.url
+os.environ["SUBSCRIPTION_DB_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'subscriptions.db')}"
+
+import paypal_handler
+
+
+def run(checkouts, reuse_plan):
+    server.request_counts.clear()
+    start = time.perf_counter()
+    for _ in range(checkouts):
+        if not reuse_plan:
+            paypal_handler.forget_premium_plan_id()
+        url = paypal_handler.create_premium_subscription(f"{server.url}/return", f"{server.url}/cancel", "bench")
+        assert url and "approve" in url, url
+    elapsed = time.perf_counter() - start
+    counts = dict(server.request_counts)
+    requests = sum(count for route, count in counts.items() if route != "POST /v1/oauth2/token")
+    return {
+        "requests_per_checkout": requests / checkouts,
+        "plans_created": counts.get("POST /v1/payments/billing-plans", 0),
+        "token_fetches": counts.get("POST /v1/oauth2/token", 0),
+        "ms_per_checkout": 1000 * elapsed / checkouts,
+    }
+
+
+def main():
+    checkouts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # Simulate a rerun calling initialize_paypal every time; only the first configures
+    for _ in range(checkouts):
+        paypal_handler.configure_paypal_sdk("stub-client-id", "stub-secret")
+
+    for label, reuse_plan in [("before (plan per checkout)", False), ("after (cached plan)", True)]:
+        result = run(checkouts, reuse_plan)
+        print(f"{label:28s} {result['requests_per_checkout']:.1f} PayPal requests/checkout, "
+              f"{result['plans_created']} plans created, {result['token_fetches']} token fetches, "
+              f"{result['ms_per_checkout']:.2f} ms/checkout ({checkouts} checkouts)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
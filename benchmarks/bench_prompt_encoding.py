@@ -0,0 +1,73 @@
+"""Prompt size of the analyses passed to generate_recommendations, and per-hop state allocation.
+
+Encodings: the analyses are built for every resume/JD pair of the
+synthetic corpus, with skills and keywords from the local matcher (whose
+lists are about as long as the model's) and experience from the fake
+model's canned answer. Each is encoded as str() of the dicts (how the
+prompt used to be built) and with encode_analyses(), and tokens are
+counted with the recommendations model's encoding.
+
+Allocation: bytes allocated per node hop when a node returns only its delta
+versus a copy of the whole state ({**state, key: value}). The copy is
+shallow, so the resume and job description strings are shared, not
+duplicated; the difference is the dict itself.
+
+Usage:
+    python benchmarks/bench_prompt_encoding.py
+"""
+import os
+import statistics
+import sys
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from corpus import JD_SIZES, RESUME_SIZES, job_description, resume_lines
+from fake_llm import EXPERIENCE
+from prompt_compaction import count_tokens, encode_analyses
+from skill_matcher import extract_keywords_local, match_skills
+
+ANALYSIS_KEYS = ("skills_analysis", "experience_analysis", "keyword_analysis")
+MODEL = "gpt-4o-mini"
+HOPS = 10000
+
+
+def allocated_per_hop(make_update, state):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    updates = [make_update(state) for _ in range(HOPS)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del updates
+    return (after - before) / HOPS
+
+
+def main():
+    before, after = [], []
+    state = None
+    for size in RESUME_SIZES:
+        for jd_size in JD_SIZES:
+            resume, jd = "\n".join(resume_lines(size, 0)), job_description(jd_size)
+            state = {"resume": resume, "job_description": jd, "skills_analysis": match_skills(resume, jd),
+                     "experience_analysis": EXPERIENCE, "keyword_analysis": extract_keywords_local(jd)}
+            before.append(sum(count_tokens(str(state[key]), MODEL) for key in ANALYSIS_KEYS))
+            after.append(sum(count_tokens(text, MODEL) for text in encode_analyses(state).values()))
+
+    print(f"{len(before)} resume/JD pairs; analysis tokens in the recommendations prompt:")
+    print(f"  str() of the dicts:   mean {statistics.mean(before):6.0f}   max {max(before):5d}")
+    print(f"  encode_analyses():    mean {statistics.mean(after):6.0f}   max {max(after):5d}   "
+          f"({100 * (1 - sum(after) / sum(before)):.0f}% fewer)")
+
+    analysis = state["skills_analysis"]
+    # Every GraphState key set, as late in a run
+    state = dict(state, final_recommendations="", job_profile={}, previous={})
+    delta = allocated_per_hop(lambda state: {"skills_analysis": analysis}, state)
+    copy = allocated_per_hop(lambda state: {**state, "skills_analysis": analysis}, state)
+    print(f"Bytes allocated per node hop: delta {delta:.0f}, full-state copy {copy:.0f} "
+          f"(resume and JD strings, {len(state['resume']) + len(state['job_description'])} chars, are shared)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Shared state across app replicas: correctness under contention and throughput.
+
+Starts 1, 2 and 4 "replica" processes on one temporary shared-state store
+(SQLite by default, or --url). Every replica:
+
+- registers the same --users usernames, so each name must be won by
+  exactly one replica
+- reads and writes --ops analysis cache entries, half of them written by
+  another replica first
+- bumps one shared counter once per operation
+
+It reports operations per second across all replicas and checks that no
+registration was lost or duplicated, that the counter saw every increment,
+and how many cache reads hit an entry another replica wrote. Password
+hashing is replaced with a constant so the numbers measure the store, not
+bcrypt.
+
+Usage:
+    python benchmarks/bench_shared_state.py [--ops 2000] [--users 200] [--url sqlite:///...]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+
+REPLICA_COUNTS = (1, 2, 4)
+
+
+def replica(url, index, replicas, ops, users, barrier, results):
+    import credential_store
+    from analysis_cache import SharedCache
+    from credential_store import SharedCredentialStore, UsernameTakenError
+    from shared_state import open_shared_state
+
+    credential_store.hash_password = lambda password: "$2b$12$benchmark"
+    kv = open_shared_state(url)
+    cache = SharedCache(kv)
+    credentials = SharedCredentialStore(kv)
+    barrier.wait()
+
+    start = time.perf_counter()
+    registered = 0
+    for user in range(users):
+        try:
+            credentials.add_user(f"user{user}", "Benchmark User", "password")
+            registered += 1
+        except UsernameTakenError:
+            pass
+    for op in range(ops):
+        # Even keys are shared by all replicas, odd keys are this replica's own
+        key = f"shared:{op}" if op % 2 == 0 else f"own:{index}:{op}"
+        if cache.get(key) is None:
+            cache.set(key, {"op": op, "replica": index})
+        kv.incr("benchmark:counter")
+    elapsed = time.perf_counter() - start
+    results.put({"registered": registered, "hits": cache.stats.hits, "elapsed": elapsed,
+                 "visible_users": len(credentials.credentials()["usernames"])})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000, help="Cache operations per replica")
+    parser.add_argument("--users", type=int, default=200, help="Usernames every replica tries to register")
+    parser.add_argument("--url", help="SHARED_STATE_URL to benchmark (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    from shared_state import open_shared_state
+
+    print(f"{'replicas':>8}{'ops/s':>10}{'registered':>12}{'visible':>9}{'counter':>9}{'cross-replica hits':>20}")
+    for replicas in REPLICA_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            url = args.url or f"sqlite:///{os.path.join(directory, 'shared_state.db')}"
+            kv = open_shared_state(url)
+            kv.clear()
+            barrier, results = multiprocessing.Barrier(replicas), multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=replica, args=(url, index, replicas, args.ops, args.users,
+                                                                       barrier, results))
+                         for index in range(replicas)]
+            for process in processes:
+                process.start()
+            reports = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            registered = sum(report["registered"] for report in reports)
+            visible = min(report["visible_users"] for report in reports)
+            counter = kv.get("benchmark:counter")
+            # A replica's first read of a shared key hits only if another replica wrote it first
+            hits = sum(report["hits"] for report in reports)
+            ops_per_second = replicas * (args.ops * 2 + args.users) / max(report["elapsed"] for report in reports)
+            print(f"{replicas:>8}{ops_per_second:>10.0f}{registered:>12}{visible:>9}{counter:>9}{hits:>20}")
+            # The demo user is seeded alongside the benchmark users
+            assert registered == args.users and visible == args.users + 1, "registrations lost or duplicated"
+            assert counter == replicas * args.ops, "counter increments lost"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Deterministic synthetic resumes and job descriptions for the benchmarks.
+
+Documents are generated from a seeded RNG, so every run benchmarks exactly
+the same corpus. Resumes come in several sizes and in PDF, DOCX and TXT
+form; job descriptions come short and long, the long ones padded with the
+kind of boilerplate prompt compaction strips.
+"""
+import io
+import random
+
+import docx
+
+from skill_matcher import ACTION_VERBS, INDUSTRY_BUZZWORDS, SKILL_SYNONYMS
+
+# Resume size name -> (pages, roles); xl crosses the parallel PDF extraction threshold
+RESUME_SIZES = {
+    "small": (1, 2),
+    "medium": (3, 4),
+    "large": (8, 8),
+    "xl": (24, 16),
+}
+JD_SIZES = ("short", "long")
+FORMATS = ("pdf", "docx", "txt")
+
+LINES_PER_PAGE = 45
+
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Analytics", "Stark Industries", "Wayne Data", "Hooli"]
+TITLES = ["Software Engineer", "Data Engineer", "Backend Developer", "Platform Engineer", "ML Engineer"]
+NOUNS = ["pipelines", "services", "dashboards", "APIs", "data models", "deployments", "test suites", "workflows"]
+
+BOILERPLATE = """About Us
+{company} is a global leader in building products people love. Our mission is to empower every team.
+
+Benefits
+- Competitive salary and equity
+- Health, dental and vision insurance
+- Flexible working hours and remote options
+
+Equal Employment Opportunity
+{company} is an equal opportunity employer. All qualified applicants will receive consideration for
+employment without regard to race, color, religion, sex, sexual orientation, gender identity or national origin.
+"""
+
+
+def _sentence(rng, skills):
+    verb = rng.choice(sorted(ACTION_VERBS)).capitalize()
+    return (f"{verb} {rng.choice(NOUNS)} using {rng.choice(skills)} and {rng.choice(skills)}, "
+            f"improving {rng.choice(['latency', 'throughput', 'reliability', 'costs'])} by {rng.randint(5, 60)}%")
+
+
+def resume_lines(size, seed=0):
+    """Lines of a synthetic resume, roughly LINES_PER_PAGE per page"""
+    rng = random.Random(f"resume:{size}:{seed}")
+    pages, roles = RESUME_SIZES[size]
+    skills = rng.sample(sorted(SKILL_SYNONYMS), 12)
+    lines = [f"Candidate {seed}", f"candidate{seed}@example.com | (555) 010-{seed:04d}", "",
+             "Summary", f"{rng.choice(TITLES)} with {rng.randint(2, 15)} years of experience in "
+             f"{', '.join(skills[:4])}.", "", "Skills", ", ".join(skills), "", "Experience"]
+    per_role = max(3, (pages * LINES_PER_PAGE - len(lines)) // roles - 3)
+    for role in range(roles):
+        lines += [f"{rng.choice(TITLES)}, {rng.choice(COMPANIES)} ({2023 - 2 * role - 2}-{2023 - 2 * role})"]
+        lines += [f"- {_sentence(rng, skills)}" for _ in range(per_role)]
+        lines.append("")
+    lines += ["Education", "B.Sc. Computer Science, State University"]
+    return lines
+
+
+def job_description(size, seed=0):
+    """A synthetic job description; long ones include sections of boilerplate"""
+    rng = random.Random(f"jd:{size}:{seed}")
+    skills = rng.sample(sorted(SKILL_SYNONYMS), 8)
+    company = rng.choice(COMPANIES)
+    lines = [f"{rng.choice(TITLES)} at {company}", "", "Requirements:"]
+    lines += [f"- {rng.randint(2, 8)}+ years of experience with {skill}" for skill in skills[:5]]
+    lines += ["", "Responsibilities:"]
+    lines += [f"- {_sentence(rng, skills)}" for _ in range(5 if size == "short" else 20)]
+    lines += ["", f"Nice to have: {', '.join(skills[5:])}, {', '.join(rng.sample(sorted(INDUSTRY_BUZZWORDS), 3))}"]
+    if size == "long":
+        lines += ["", BOILERPLATE.format(company=company)]
+    return "\n".join(lines)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(lines):
+    """Minimal text-only PDF, one page per LINES_PER_PAGE lines"""
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+    font_id = 3 + 2 * len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(len(pages)))}] "
+        f"/Count {len(pages)} >>".encode(),
+    ]
+    for i, page in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        text = "".join(f"({_pdf_escape(line)}) Tj 0 -16 Td " for line in page)
+        stream = f"BT /F1 10 Tf 40 760 Td {text}ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def render_docx(lines):
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def render(lines, file_type):
+    """Bytes of a document in the given format"""
+    if file_type == "pdf":
+        return render_pdf(lines)
+    if file_type == "docx":
+        return render_docx(lines)
+    return "\n".join(lines).encode("utf-8")
+
+
+def build_corpus(resumes_per_size=3):
+    """Every resume size in every format plus every JD size, as plain data.
+
+    Returns {"documents": [(size, file_type, seed, bytes)], "resumes":
+    {size: [text]}, "job_descriptions": {size: text}}.
+    """
+    documents = []
+    resumes = {}
+    for size in RESUME_SIZES:
+        resumes[size] = []
+        for seed in range(resumes_per_size):
+            lines = resume_lines(size, seed)
+            resumes[size].append("\n".join(lines))
+            for file_type in FORMATS:
+                documents.append((size, file_type, seed, render(lines, file_type)))
+    return {
+        "documents": documents,
+        "resumes": resumes,
+        "job_descriptions": {size: job_description(size) for size in JD_SIZES},
+    }
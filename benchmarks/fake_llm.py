@@ -0,0 +1,198 @@
+"""Deterministic stand-in for ChatOpenAI, so the pipeline can be benchmarked offline.
+
+Each prompt is recognized by its template and answered with canned output of
+the right shape. Response latency is drawn from a log-normal distribution
+seeded by the prompt text, so a given corpus produces the same latencies on
+every run; ms_per_output_token adds generation time proportional to the
+answer's length. Token usage is reported like the real API, with prompt tokens
+estimated from the prompt length. Structured output is parsed like
+ChatOpenAI's; with malformed_rate set, that fraction of JSON answers comes
+back wrapped in prose and code fences, exercising the repair path.
+
+    from fake_llm import install_fake_llm
+    install_fake_llm(median_ms=400, sigma=0.4)
+    create_analysis_graph().invoke(...)   # no network
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+import resume_analyzer
+
+SKILLS = {
+    "skills_in_resume": ["Python", "SQL", "Docker", "AWS", "Leadership"],
+    "skills_in_job_description": ["Python", "Kubernetes", "AWS", "Terraform", "Go"],
+    "missing_skills": ["Kubernetes", "Terraform", "Go"],
+    "matching_skills": ["Python", "AWS"],
+}
+EXPERIENCE = {
+    "experience_required": ["5+ years backend development", "Cloud infrastructure", "Mentoring engineers"],
+    "experience_in_resume": ["6 years backend development", "Built data pipelines on AWS"],
+    "experience_gaps": ["Mentoring engineers"],
+    "experience_highlights": ["Backend development", "AWS"],
+}
+KEYWORDS = {
+    "essential_keywords": ["backend", "cloud", "scalable", "APIs"],
+    "technical_terms": ["Python", "Kubernetes", "Terraform", "AWS"],
+    "industry_buzzwords": ["cross-functional", "data-driven"],
+    "action_verbs": ["design", "build", "deploy", "lead"],
+}
+JOB_PROFILE = {
+    "required_skills": SKILLS["skills_in_job_description"],
+    "required_experience": EXPERIENCE["experience_required"],
+    **KEYWORDS,
+}
+PROFILE_MATCH = {key: value for key, value in {**SKILLS, **EXPERIENCE}.items()
+                 if key not in ("skills_in_job_description", "experience_required")}
+RECOMMENDATIONS = """## Skills to Add or Highlight
+- Add **Kubernetes** and **Terraform** to your skills section if you have used them.
+  Replace: "Worked with cloud tools" With: "Provisioned AWS infrastructure with Terraform"
+
+## Experience to Emphasize or Reframe
+- Lead with backend development on AWS; mention mentoring junior engineers.
+
+## Keywords to Incorporate
+- scalable, APIs, cross-functional, data-driven
+
+## Structural Changes
+- Move the skills section above experience.
+
+## Additional Improvements
+- Quantify the impact of each role with metrics."""
+
+COMBINED = {"skills_analysis": SKILLS, "experience_analysis": EXPERIENCE, "keyword_analysis": KEYWORDS}
+
+# Phrase unique to each prompt template -> canned response; the combined
+# prompt mentions the others' topics, so it is checked first
+RESPONSES = [
+    ("expert in resume analysis", json.dumps(COMBINED)),
+    ("expert in skill identification", json.dumps(SKILLS)),
+    ("analyzing professional experience", json.dumps(EXPERIENCE)),
+    ("keyword optimization", json.dumps(KEYWORDS)),
+    ("expert recruiter", json.dumps(JOB_PROFILE)),
+    ("matching candidates to job requirements", json.dumps(PROFILE_MATCH)),
+    ("professional resume consultant", RECOMMENDATIONS),
+]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with canned answers and a seeded latency distribution"""
+
+    median_ms: float = 400.0
+    sigma: float = 0.4
+    # Streamed responses are split into this many chunks after the first-token delay
+    stream_chunks: int = 40
+    seed: int = 0
+    # Fraction of JSON answers returned wrapped in prose and code fences
+    malformed_rate: float = 0.0
+    # Generation time per output token (about 4 characters), on top of the first-token latency
+    ms_per_output_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    @staticmethod
+    def _prompt(messages):
+        return "\n".join(str(message.content) for message in messages)
+
+    def _answer(self, prompt):
+        for marker, response in RESPONSES:
+            if marker in prompt:
+                break
+        else:
+            return "{}"
+        if response.startswith("{") and self._rng(prompt).random() < self.malformed_rate:
+            return f"Here is the analysis you asked for:\n```json\n{response}\n```"
+        return response
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).hexdigest()
+        return random.Random(digest)
+
+    def latency(self, prompt):
+        """Seconds this prompt takes; the same prompt always takes the same time"""
+        return self._rng(prompt).lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+    def _generation_time(self, content):
+        return self.ms_per_output_token * (len(content) // 4) / 1000
+
+    def with_structured_output(self, schema, *, include_raw=False, **kwargs):
+        """Validate the answer against schema, as ChatOpenAI's json_schema method does"""
+        def parse(message):
+            try:
+                parsed, error = schema.model_validate_json(message.content), None
+            except ValueError as e:
+                parsed, error = None, e
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            if error is not None:
+                raise error
+            return parsed
+
+        return self | RunnableLambda(parse)
+
+    def _message(self, prompt, content):
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=content, usage_metadata=usage)
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self._prompt(messages)
+        content = self._answer(prompt)
+        time.sleep(self.latency(prompt) + self._generation_time(content))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, content))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self._prompt(messages)
+        content = self._answer(prompt)
+        await asyncio.sleep(self.latency(prompt) + self._generation_time(content))
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, content))])
+
+    def _chunks(self, prompt, content):
+        size = max(1, math.ceil(len(content) / self.stream_chunks))
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        usage = self._message(prompt, content).usage_metadata
+        for index, piece in enumerate(pieces):
+            # Usage arrives on the final chunk, as with stream_options.include_usage
+            last = index == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage if last else None))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        content = self._answer(prompt)
+        time.sleep(self.latency(prompt))
+        for chunk in self._chunks(prompt, content):
+            time.sleep(self._generation_time(chunk.text))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        content = self._answer(prompt)
+        await asyncio.sleep(self.latency(prompt))
+        for chunk in self._chunks(prompt, content):
+            await asyncio.sleep(self._generation_time(chunk.text))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def install_fake_llm(median_ms=400.0, sigma=0.4, seed=0, malformed_rate=0.0, ms_per_output_token=0.0):
+    """Make resume_analyzer build its chains on FakeChatModel instead of ChatOpenAI"""
+    def fake_chat_openai(**kwargs):
+        return FakeChatModel(median_ms=median_ms, sigma=sigma, seed=seed, malformed_rate=malformed_rate,
+                             ms_per_output_token=ms_per_output_token)
+
+    resume_analyzer.ChatOpenAI = fake_chat_openai
+    resume_analyzer._cached_chain.cache_clear()
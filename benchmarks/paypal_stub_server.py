@@ -0,0 +1,160 @@
+"""Local stand-in for the PayPal REST API, for exercising checkout flows offline.
+
+Implements just the endpoints paypal_handler uses and counts every request,
+so scripts can check how many PayPal round-trips a flow costs.
+
+Usage:
+    python benchmarks/paypal_stub_server.py --port 8765
+    PAYPAL_ENDPOINT=http://localhost:8765 streamlit run app.py
+
+or from Python:
+    server = start_stub_server()
+    ... server.url, server.request_counts ...
+    server.shutdown()
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix):
+    return f"{prefix}-STUB{next(_ids):08d}"
+
+
+class PayPalStubHandler(BaseHTTPRequestHandler):
+    server_version = "PayPalStub/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            # The token endpoint sends form-encoded data
+            return {}
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload or {}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _approval_links(self, token):
+        return [{"rel": "approval_url", "method": "REDIRECT",
+                 "href": f"{self.server.url}/approve?token={token}"}]
+
+    def _route(self, method):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.strip("/").split("/")
+        self.server.request_counts[f"{method} {self._route_name(parts)}"] += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = self._read_json()
+        state = self.server.state
+
+        if method == "GET" and path == "/stub/stats":
+            return self._send(200, dict(self.server.request_counts))
+
+        if method == "POST" and path == "/v1/oauth2/token":
+            return self._send(200, {"access_token": _new_id("A21AA"), "token_type": "Bearer",
+                                    "app_id": "APP-STUB", "expires_in": 32400})
+
+        if method == "POST" and path == "/v1/payments/billing-plans":
+            plan = dict(body, id=_new_id("P"), state="CREATED")
+            state["plans"][plan["id"]] = plan
+            return self._send(201, plan)
+
+        if method == "PATCH" and parts[:3] == ["v1", "payments", "billing-plans"] and len(parts) == 4:
+            plan = state["plans"].get(parts[3])
+            if plan is None:
+                return self._send(404, {"name": "INVALID_RESOURCE_ID"})
+            plan["state"] = "ACTIVE"
+            return self._send(200)
+
+        if method == "POST" and path == "/v1/payments/billing-agreements":
+            plan = state["plans"].get(body.get("plan", {}).get("id"))
+            if plan is None or plan["state"] != "ACTIVE":
+                return self._send(400, {"name": "INVALID_PLAN_ID", "message": "Plan is not active"})
+            token = _new_id("EC")
+            state["agreements"][token] = body
+            return self._send(201, dict(body, links=self._approval_links(token)))
+
+        if method == "POST" and parts[:3] == ["v1", "payments", "billing-agreements"] and parts[-1] == "agreement-execute":
+            if parts[3] not in state["agreements"]:
+                return self._send(404, {"name": "INVALID_TOKEN"})
+            return self._send(200, {"id": _new_id("I"), "state": "Active"})
+
+        if method == "POST" and path == "/v1/payments/payment":
+            payment = dict(body, id=_new_id("PAYID"), state="created")
+            state["payments"][payment["id"]] = payment
+            return self._send(201, dict(payment, links=self._approval_links(payment["id"])))
+
+        if parts[:3] == ["v1", "payments", "payment"] and len(parts) >= 4:
+            payment = state["payments"].get(parts[3])
+            if payment is None:
+                return self._send(404, {"name": "INVALID_RESOURCE_ID"})
+            if method == "GET" and len(parts) == 4:
+                return self._send(200, payment)
+            if method == "POST" and parts[-1] == "execute":
+                payment["state"] = "approved"
+                return self._send(200, payment)
+
+        return self._send(404, {"name": "NOT_FOUND", "message": f"{method} {path}"})
+
+    @staticmethod
+    def _route_name(parts):
+        # Collapse resource IDs so counts group by endpoint
+        return "/" + "/".join("{id}" if "STUB" in part else part for part in parts)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0):
+    """Start the stub on a background thread; port 0 picks a free port.
+
+    latency adds a fixed delay (seconds) to every response, to mimic the real API.
+    """
+    server = ThreadingHTTPServer((host, port), PayPalStubHandler)
+    server.url = f"http://{host}:{server.server_address[1]}"
+    server.request_counts = Counter()
+    server.latency = latency
+    server.state = {"plans": {}, "agreements": {}, "payments": {}}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local PayPal REST API stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+    server = start_stub_server(args.host, args.port, args.latency)
+    print(f"PayPal stub listening on {server.url} (request counts at {server.url}/stub/stats)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Cold-start profile of the app: import time per package and time to first render.
+
+Starts a fresh interpreter under -X importtime in an empty working
+directory (no databases yet, as in a new container). It renders app.py
+once with Streamlit's AppTest, as for a visitor who hasn't logged in.
+It reports:
+
+- time to first render: the app script's first run, which is what the
+  first visitor to a new replica waits for once Streamlit is up
+- cold start: from launching the interpreter to that render finishing
+- import time per top-level package, heaviest first
+- which of the heavy subsystems (LLM, documents, payments) were loaded;
+  none are needed to show the login form
+
+Exits with status 1 when the first render takes longer than --budget-ms.
+
+Usage:
+    python benchmarks/profile_startup.py [--runs 3] [--top 15] [--budget-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# First render of the login page, in a fresh process
+FIRST_RENDER_BUDGET_MS = 1500
+
+# Modules that only analyses, uploads or payments need
+HEAVY_MODULES = ("langchain_openai", "langgraph", "langchain_core", "PyPDF2", "docx", "paypalrestsdk")
+
+_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+start = time.perf_counter()
+app.run()
+first_render = time.perf_counter() - start
+print("STARTUP " + json.dumps({{
+    "first_render_seconds": first_render,
+    "exceptions": [str(e.value) for e in app.exception],
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def _import_times(stderr):
+    """Self import time in seconds per top-level package, from -X importtime output"""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return dict(totals)
+
+
+def measure_startup():
+    """One cold start; returns first_render_ms, cold_start_ms, import_ms, imports_ms by package and heavy_modules"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    # Credentials are asked for on the page when absent; keep the environment's out of the profile
+    for name in ("OPENAI_API_KEY", "PAYPAL_CLIENT_ID", "PAYPAL_CLIENT_SECRET"):
+        env.pop(name, None)
+    with tempfile.TemporaryDirectory() as directory:
+        # The page looks up credentials in st.secrets, which needs a secrets file to exist
+        os.makedirs(os.path.join(directory, ".streamlit"))
+        open(os.path.join(directory, ".streamlit", "secrets.toml"), "w").close()
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _CHILD.format(app=os.path.join(REPO_DIR, "app.py"))],
+            cwd=directory, env=env, capture_output=True, text=True, check=True)
+        cold_start = time.perf_counter() - start
+    report = json.loads(next(line[len("STARTUP "):] for line in process.stdout.splitlines()
+                             if line.startswith("STARTUP ")))
+    if report["exceptions"]:
+        raise RuntimeError(f"app.py raised on first render: {report['exceptions']}")
+    imports = _import_times(process.stderr)
+    return {
+        "first_render_ms": 1000 * report["first_render_seconds"],
+        "cold_start_ms": 1000 * cold_start,
+        "import_ms": 1000 * sum(imports.values()),
+        "imports_ms": {package: 1000 * seconds for package, seconds in imports.items()},
+        "heavy_modules": [name for name in HEAVY_MODULES if name in report["modules"]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to take the median of")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--budget-ms", type=float, default=FIRST_RENDER_BUDGET_MS)
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(args.runs)]
+    first_render = statistics.median(run["first_render_ms"] for run in runs)
+    packages = {package: statistics.median(run["imports_ms"].get(package, 0.0) for run in runs)
+                for package in runs[0]["imports_ms"]}
+
+    print(f"Time to first render: {first_render:7.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"Cold start:           {statistics.median(run['cold_start_ms'] for run in runs):7.0f} ms")
+    print(f"Imports:              {statistics.median(run['import_ms'] for run in runs):7.0f} ms in all")
+    for package, milliseconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:30}{milliseconds:7.0f} ms")
+    print(f"Heavy modules loaded: {', '.join(runs[0]['heavy_modules']) or 'none'}")
+    if first_render > args.budget_ms:
+        print(f"OVER BUDGET by {first_render - args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
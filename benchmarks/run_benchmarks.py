@@ -0,0 +1,389 @@
+"""Offline benchmark suite for document extraction and the analysis graph.
+
+Runs every suite in a fresh process against the synthetic corpus in
+corpus.py, with ChatOpenAI replaced by the seeded FakeChatModel and the
+analysis cache disabled, so no network is used and results are comparable
+run to run. Each suite reports throughput, latency percentiles, peak RSS and
+tracemalloc allocation figures; the analysis suites also report the
+per-stage telemetry summary.
+
+Suites:
+    extraction        extract_document_text on every resume size and format
+    graph             create_analysis_graph().invoke, one analysis at a time
+    graph_concurrent  the same analyses through ainvoke, several at once
+    local_matcher     the LLM-free prescore on every resume/JD pair
+    startup           cold starts of app.py up to the login page (profile_startup.py)
+
+Usage:
+    python benchmarks/run_benchmarks.py [--suite graph ...] [--output results/latest.json]
+    python benchmarks/run_benchmarks.py --compare results/baseline.json [--threshold 0.25]
+
+Results depend on the machine, so none are checked in: record a baseline
+with --output results/baseline.json on the machine you compare on. With
+--compare, suite-level metrics that got worse by more than the
+threshold are listed and the exit status is 1. The exit status is also 1
+when the startup suite's median time to first render exceeds
+--startup-budget-ms.
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from profile_startup import FIRST_RENDER_BUDGET_MS
+
+SUITES = ("extraction", "graph", "graph_concurrent", "local_matcher", "startup")
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "results", "latest.json")
+
+# Metric name suffixes and whether a larger value is better
+HIGHER_IS_BETTER = ("_per_second", "_per_minute")
+LOWER_IS_BETTER = ("_ms", "_mb", "_kb", "_usd_per_analysis", "_tokens_per_analysis")
+
+
+def percentiles(samples_seconds):
+    """p50/p95/p99 and mean in milliseconds"""
+    ordered = sorted(samples_seconds)
+
+    def rank(q):
+        return 1000 * ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+    return {"p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99),
+            "mean_ms": 1000 * sum(ordered) / len(ordered)}
+
+
+def _rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _pairs(corpus):
+    return [(size, jd_size, resume, job_description)
+            for size, resumes in corpus["resumes"].items()
+            for resume in resumes
+            for jd_size, job_description in corpus["job_descriptions"].items()]
+
+
+def _graph_inputs(resume, job_description):
+    return {"resume": resume, "job_description": job_description,
+            "skills_analysis": {}, "experience_analysis": {}, "keyword_analysis": {}}
+
+
+def bench_extraction(corpus, options):
+    import document_processor
+
+    def run_once():
+        timings = {}
+        for size, file_type, _, data in corpus["documents"]:
+            # Measure parsing, not the content-hash cache
+            document_processor._text_cache.clear()
+            start = time.perf_counter()
+            document_processor.extract_document_text(io.BytesIO(data), file_type)
+            timings.setdefault(f"{size}_{file_type}", []).append((time.perf_counter() - start, len(data)))
+        return timings
+
+    run_once()
+    timings = {}
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        for key, samples in run_once().items():
+            timings.setdefault(key, []).extend(samples)
+    elapsed = time.perf_counter() - start
+
+    documents = sum(len(samples) for samples in timings.values())
+    megabytes = sum(size for samples in timings.values() for _, size in samples) / (1024 * 1024)
+    return {
+        "documents": documents,
+        "documents_per_second": documents / elapsed,
+        "megabytes_per_second": megabytes / elapsed,
+        **percentiles([seconds for samples in timings.values() for seconds, _ in samples]),
+        "by_document": {key: percentiles([seconds for seconds, _ in samples]) for key, samples in sorted(timings.items())},
+    }, run_once
+
+
+def bench_graph(corpus, options):
+    from resume_analyzer import create_analysis_graph
+
+    workflow = create_analysis_graph()
+    pairs = _pairs(corpus)
+
+    def run_once():
+        latencies = {}
+        for size, jd_size, resume, job_description in pairs:
+            start = time.perf_counter()
+            workflow.invoke(_graph_inputs(resume, job_description))
+            latencies.setdefault(f"{size}_resume_{jd_size}_jd", []).append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    latencies = {}
+    for key, samples in run_once().items():
+        latencies.setdefault(key, []).extend(samples)
+    elapsed = time.perf_counter() - start
+
+    analyses = sum(len(samples) for samples in latencies.values())
+    return {
+        "analyses": analyses,
+        "analyses_per_minute": 60 * analyses / elapsed,
+        **percentiles([seconds for samples in latencies.values() for seconds in samples]),
+        "by_pair": {key: percentiles(samples) for key, samples in sorted(latencies.items())},
+    }, run_once
+
+
+def bench_graph_concurrent(corpus, options):
+    from resume_analyzer import create_analysis_graph
+
+    workflow = create_analysis_graph()
+    pairs = _pairs(corpus)
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(options.concurrency)
+        latencies = []
+
+        async def one(resume, job_description):
+            async with semaphore:
+                start = time.perf_counter()
+                await workflow.ainvoke(_graph_inputs(resume, job_description))
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(resume, job_description) for _, _, resume, job_description in pairs))
+        return latencies
+
+    def run_once():
+        return asyncio.run(run_all())
+
+    start = time.perf_counter()
+    latencies = run_once()
+    elapsed = time.perf_counter() - start
+    return {
+        "analyses": len(latencies),
+        "concurrency": options.concurrency,
+        "analyses_per_minute": 60 * len(latencies) / elapsed,
+        **percentiles(latencies),
+    }, run_once
+
+
+def bench_local_matcher(corpus, options):
+    from skill_matcher import prescore
+
+    pairs = _pairs(corpus)
+
+    def run_once():
+        latencies = []
+        for _, _, resume, job_description in pairs:
+            start = time.perf_counter()
+            prescore(resume, job_description)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    run_once()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(options.repeat):
+        latencies.extend(run_once())
+    elapsed = time.perf_counter() - start
+    return {
+        "pairs": len(latencies),
+        "pairs_per_second": len(latencies) / elapsed,
+        **percentiles(latencies),
+    }, run_once
+
+
+def bench_startup(corpus, options):
+    from profile_startup import measure_startup
+
+    runs = [measure_startup() for _ in range(options.startup_runs)]
+    return {
+        "cold_starts": len(runs),
+        **percentiles([run["first_render_ms"] / 1000 for run in runs]),
+        "cold_start_ms": sorted(run["cold_start_ms"] for run in runs)[len(runs) // 2],
+        "import_ms": sorted(run["import_ms"] for run in runs)[len(runs) // 2],
+        # Analysis, document and payment libraries the login page loaded; ideally none
+        "heavy_modules_loaded": runs[0]["heavy_modules"],
+    }, measure_startup
+
+
+BENCHES = {
+    "extraction": bench_extraction,
+    "graph": bench_graph,
+    "graph_concurrent": bench_graph_concurrent,
+    "local_matcher": bench_local_matcher,
+    "startup": bench_startup,
+}
+
+
+def run_suite(name, options):
+    """Run one suite in the current process; meant to be called in a fresh one"""
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-not-used")
+    # The fake model has no rate limits; measure the pipeline, not the account's budget
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = os.environ["LLM_TOKENS_PER_MINUTE"] = "0"
+    from corpus import build_corpus
+    from fake_llm import install_fake_llm
+    import telemetry
+
+    install_fake_llm(median_ms=options.median_ms, sigma=options.sigma, seed=options.seed,
+                     malformed_rate=options.malformed_rate)
+    corpus = build_corpus(options.resumes_per_size)
+    rss_before = _rss_mb()
+
+    results, run_once = BENCHES[name](corpus, options)
+    summary = telemetry.stage_summary()
+    results["stages"] = {stage: {key: value for key, value in stats.items()
+                                 if key.endswith("_ms") or key in ("count", "models", "cost_usd", "repairs",
+                                                                   "prompt_tokens")}
+                         for stage, stats in summary.items()}
+    if "analyses" in results:
+        # Fake token counts follow prompt length, so this tracks prompt size and model routing
+        results["cost_usd_per_analysis"] = sum(stats["cost_usd"] for stats in summary.values()) / results["analyses"]
+        # The "analysis" run span, where there is one, also counts its stages' tokens
+        results["prompt_tokens_per_analysis"] = sum(
+            stats["prompt_tokens"] for stage, stats in summary.items() if stage != "analysis") / results["analyses"]
+        results["recommendations_prompt_tokens_per_analysis"] = (
+            summary["generate_recommendations"]["prompt_tokens"] / results["analyses"])
+    results["rss_at_start_mb"] = rss_before
+    results["peak_rss_mb"] = _rss_mb()
+    results["peak_rss_children_mb"] = _rss_mb(resource.RUSAGE_CHILDREN)
+
+    # Allocations are traced in a separate pass; tracemalloc slows everything down
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    run_once()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["alloc_peak_mb"] = (peak - baseline) / (1024 * 1024)
+    results["alloc_retained_kb"] = (current - baseline) / 1024
+    return results
+
+
+def _suite_worker(name, options, queue):
+    try:
+        queue.put((name, run_suite(name, options), None))
+    except Exception as e:
+        queue.put((name, None, f"{type(e).__name__}: {e}"))
+    finally:
+        import document_processor
+        # A multiprocessing child joins its own children before atexit hooks
+        # run, so a page pool left open would keep this process from exiting
+        if document_processor._page_pool.cache_info().currsize:
+            document_processor._page_pool().shutdown()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _suite_metrics(report):
+    # Only suite-level figures are compared; the per-document, per-pair and
+    # per-stage breakdowns have too few samples each to be stable
+    for suite, results in report["suites"].items():
+        for key, value in results.items():
+            if isinstance(value, (int, float)):
+                yield f"{suite}.{key}", value
+
+
+def compare(baseline, current, threshold):
+    """Lines describing metrics that regressed by more than threshold (a fraction)"""
+    old = dict(_suite_metrics(baseline))
+    regressions = []
+    for path, value in _suite_metrics(current):
+        before = old.get(path)
+        if not before:
+            continue
+        change = (value - before) / before
+        if path.endswith(HIGHER_IS_BETTER):
+            change = -change
+        elif not path.endswith(LOWER_IS_BETTER):
+            continue
+        if change > threshold:
+            regressions.append(f"{path}: {before:.3f} -> {value:.3f} ({100 * change:+.0f}% worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Suite to run (default: all)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--resumes-per-size", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus for the fast suites")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--startup-runs", type=int, default=3, help="Cold starts measured by the startup suite")
+    parser.add_argument("--startup-budget-ms", type=float, default=FIRST_RENDER_BUDGET_MS,
+                        help="Allowed median time to first render in the startup suite")
+    parser.add_argument("--median-ms", type=float, default=200.0, help="Fake LLM median latency")
+    parser.add_argument("--sigma", type=float, default=0.4, help="Fake LLM log-normal latency spread")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of fake JSON answers returned malformed, to exercise output repair")
+    options = parser.parse_args()
+
+    suites = {}
+    context = multiprocessing.get_context("spawn")
+    for name in options.suite or SUITES:
+        queue = context.Queue()
+        process = context.Process(target=_suite_worker, args=(name, options, queue))
+        process.start()
+        _, results, error = queue.get()
+        process.join()
+        if error:
+            print(f"{name}: failed: {error}", file=sys.stderr)
+            continue
+        suites[name] = results
+        rate = next((f"{value:.1f} {key}, " for key, value in results.items() if key.endswith(HIGHER_IS_BETTER)), "")
+        print(f"{name}: p50 {results['p50_ms']:.1f} ms, p95 {results['p95_ms']:.1f} ms, {rate}"
+              f"peak RSS {results['peak_rss_mb']:.0f} MB, alloc peak {results['alloc_peak_mb']:.1f} MB")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "options": vars(options),
+        },
+        "suites": suites,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {options.output}")
+
+    over_budget = "startup" in suites and suites["startup"]["p50_ms"] > options.startup_budget_ms
+    if over_budget:
+        print(f"OVER BUDGET startup.p50_ms: {suites['startup']['p50_ms']:.0f} ms, "
+              f"budget {options.startup_budget_ms:.0f} ms")
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(json.load(f), report, options.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {100 * options.threshold:.0f}% against {options.compare}")
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""User credentials stored in an indexed SQLite table.
+
+Passwords are bcrypt-hashed once, at registration. Each signup is a single
+INSERT, so concurrent registrations can't overwrite each other the way
+rewriting a YAML file could. The credentials dict handed to
+streamlit_authenticator is loaded once per process and refreshed only when
+another process has added users.
+
+With SHARED_STATE_URL set, users live in the shared-state store instead, so
+an account registered on one app replica can log in on any other.
+"""
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+import streamlit_authenticator as stauth
+
+from shared_state import get_shared_state, shared_state_configured
+
+# Seeded on first run only, so the demo login keeps working. The password
+# ("password") is stored pre-hashed: bcrypt would add a third of a second to
+# every fresh container's first page load
+DEMO_USER = ("demo", "Demo User", "$2b$12$.E5oHLNZNk6ihNoXgXLDOeoh8/llQHMfsnZq3qa/rBP/yuSJYI3vO")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class UsernameTakenError(ValueError):
+    pass
+
+
+def hash_password(password):
+    """bcrypt hash in the format streamlit_authenticator expects"""
+    return stauth.Hasher([password]).generate()[0]
+
+
+class CredentialStore:
+    def __init__(self, path="users.db"):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._loaded_version = None
+
+        conn = self._connection()
+        with conn:
+            conn.execute(SCHEMA)
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            try:
+                self._insert_user(*DEMO_USER)
+            except UsernameTakenError:
+                # Another process seeded it first
+                pass
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _version(self):
+        # Users are only ever added, so the highest rowid changes exactly when the table does
+        return self._connection().execute("SELECT MAX(rowid) FROM users").fetchone()[0]
+
+    def credentials(self):
+        """Credentials dict for stauth.Authenticate, reloaded only when users were added"""
+        version = self._version()
+        with self._lock:
+            if self._credentials is None or version != self._loaded_version:
+                rows = self._connection().execute("SELECT username, name, password_hash FROM users").fetchall()
+                self._credentials = {
+                    "usernames": {
+                        username: {"name": name, "password": password_hash}
+                        for username, name, password_hash in rows
+                    }
+                }
+                self._loaded_version = version
+            return self._credentials
+
+    def add_user(self, username, name, password):
+        """Hash the password and insert the user; raises UsernameTakenError if it exists"""
+        self._insert_user(username, name, hash_password(password))
+
+    def _insert_user(self, username, name, password_hash):
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO users (username, name, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                    (username, name, password_hash, time.time()),
+                )
+        except sqlite3.IntegrityError:
+            raise UsernameTakenError(f"Username '{username}' is already taken")
+
+
+class SharedCredentialStore:
+    """Credential store on the shared-state store (shared_state.py), for several app replicas.
+
+    Each user is one key, inserted only if absent, and a counter is bumped
+    on every signup so replicas reload their credentials only when it moves.
+    """
+
+    def __init__(self, kv, prefix="user:"):
+        self.kv = kv
+        self.prefix = prefix
+        self._version_key = prefix.rstrip(":") + "s:version"
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._loaded_version = None
+
+        if self.kv.get(self._version_key) is None:
+            try:
+                self._insert_user(*DEMO_USER)
+            except UsernameTakenError:
+                # Another replica seeded it first
+                pass
+
+    def credentials(self):
+        """Credentials dict for stauth.Authenticate, reloaded only when users were added"""
+        version = self.kv.get(self._version_key)
+        with self._lock:
+            if self._credentials is None or version != self._loaded_version:
+                self._credentials = {
+                    "usernames": {
+                        key[len(self.prefix):]: {"name": user["name"], "password": user["password_hash"]}
+                        for key, user in self.kv.scan(self.prefix)
+                    }
+                }
+                self._loaded_version = version
+            return self._credentials
+
+    def add_user(self, username, name, password):
+        """Hash the password and insert the user; raises UsernameTakenError if it exists"""
+        self._insert_user(username, name, hash_password(password))
+
+    def _insert_user(self, username, name, password_hash):
+        user = {"name": name, "password_hash": password_hash, "created_at": time.time()}
+        if not self.kv.add(self.prefix + username, user):
+            raise UsernameTakenError(f"Username '{username}' is already taken")
+        self.kv.incr(self._version_key)
+
+
+@lru_cache(maxsize=None)
+def get_credential_store():
+    """Process-wide credential store: the shared-state store when SHARED_STATE_URL is set,
+    otherwise SQLite at USER_DB_PATH"""
+    if shared_state_configured():
+        return SharedCredentialStore(get_shared_state())
+    return CredentialStore(os.environ.get("USER_DB_PATH", "users.db"))
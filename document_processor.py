@@ -1,16 +1,157 @@
 import streamlit as st
 import PyPDF2
 import docx
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+import hashlib
 import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from analysis_cache import MemoryCache
+from telemetry import trace_stage
+
+# PDFs with at least this many pages are split across a process pool
+PARALLEL_PAGE_THRESHOLD = 16
+PAGES_PER_TASK = 4
+
+# Extracted text by file content hash, so re-uploads and reruns skip parsing
+_text_cache = MemoryCache(max_entries=128, ttl=None)
+
+def content_digest(file):
+    """SHA-256 of a file-like object's contents, read in chunks"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1 << 20), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def _page_pool():
+    workers = max(1, min(8, (os.cpu_count() or 2) - 1))
+    # Spawned, not forked: the app server has threads, and a forked child
+    # could inherit a lock one of them was holding
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _page_range_pdf(pdf_reader, start, stop):
+    """Pages [start, stop) of a parsed PDF as a small PDF of their own"""
+    writer = PyPDF2.PdfWriter()
+    for i in range(start, stop):
+        writer.add_page(pdf_reader.pages[i])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def _extract_pages(data):
+    """Process pool task: extract the text of every page of a (small) PDF"""
+    return [page.extract_text() or "" for page in PyPDF2.PdfReader(io.BytesIO(data)).pages]
+
+def iter_pdf_pages(file):
+    """Yield the text of each PDF page, in order, as soon as it is ready.
+    
+    Large PDFs are parsed once here and split into small PDFs of a few
+    pages each, whose text is extracted in parallel in a process pool;
+    small ones are parsed in-process, straight from the file object
+    without copying it.
+    """
+    file.seek(0)
+    pdf_reader = PyPDF2.PdfReader(file)
+    page_count = len(pdf_reader.pages)
+    
+    if page_count < PARALLEL_PAGE_THRESHOLD:
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
+        return
+    
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    futures = [_page_pool().submit(_extract_pages, _page_range_pdf(pdf_reader, start, stop)) for start, stop in ranges]
+    for future in futures:
+        yield from future.result()
+
+def _iter_docx_table(table):
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            # Merged cells repeat across the row; only keep each once
+            text = cell.text.strip()
+            if text and (not cells or cells[-1] != text):
+                cells.append(text)
+        if cells:
+            yield " | ".join(cells)
+
+def iter_docx_blocks(file):
+    """Yield DOCX text block by block: headers, then body paragraphs and tables in document order, then footers"""
+    file.seek(0)
+    doc = docx.Document(file)
+    
+    def header_footer_lines(attr):
+        seen = set()
+        for section in doc.sections:
+            part = getattr(section, attr)
+            if part.is_linked_to_previous:
+                continue
+            for paragraph in part.paragraphs:
+                text = paragraph.text.strip()
+                if text and text not in seen:
+                    seen.add(text)
+                    yield text
+            for table in part.tables:
+                yield from _iter_docx_table(table)
+    
+    yield from header_footer_lines("header")
+    
+    # Walk the body XML so tables appear where they are in the document
+    for child in doc.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            yield Paragraph(child, doc).text
+        elif child.tag.endswith("}tbl"):
+            yield from _iter_docx_table(Table(child, doc))
+    
+    yield from header_footer_lines("footer")
+
+def iter_document_text(file, file_type):
+    """Generator API: yield text chunks (pages for PDF, blocks for DOCX) as they become ready"""
+    if file_type == "pdf":
+        yield from iter_pdf_pages(file)
+    elif file_type == "docx":
+        yield from iter_docx_blocks(file)
+    elif file_type == "txt":
+        file.seek(0)
+        yield file.read().decode("utf-8")
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+def extract_document_text(file, file_type):
+    """Extract all text from a document, cached by content hash. Raises on failure."""
+    with trace_stage("document_extraction", file_type=file_type) as span:
+        digest = content_digest(file)
+        key = f"{file_type}:{digest}"
+        text = _text_cache.get(key)
+        span["cache_hit"] = text is not None
+        if text is None:
+            # One join at the end instead of repeated string concatenation
+            text = "\n".join(iter_document_text(file, file_type)) + "\n"
+            _text_cache.set(key, text)
+        span["input_bytes"] = file.seek(0, io.SEEK_END)
+        file.seek(0)
+        span["output_bytes"] = len(text.encode("utf-8"))
+        return text
+
+def read_pdf_text(data):
+    """Extract text from PDF bytes, raising on failure"""
+    return extract_document_text(io.BytesIO(data), "pdf")
+
+def read_docx_text(data):
+    """Extract text from DOCX bytes, raising on failure"""
+    return extract_document_text(io.BytesIO(data), "docx")
 
 def extract_text_from_pdf(pdf_file):
     """Extract text from a PDF file"""
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_file.read()))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return extract_document_text(pdf_file, "pdf")
     except Exception as e:
         st.error(f"Error extracting text from PDF: {e}")
         return ""
@@ -18,15 +159,39 @@ def extract_text_from_pdf(pdf_file):
 def extract_text_from_docx(docx_file):
     """Extract text from a DOCX file"""
     try:
-        doc = docx.Document(io.BytesIO(docx_file.read()))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        return extract_document_text(docx_file, "docx")
     except Exception as e:
         st.error(f"Error extracting text from DOCX: {e}")
         return ""
 
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "txt")
+
+def extract_text_from_path(path):
+    """Extract text from a resume file on disk (for headless use outside Streamlit)"""
+    file_type = str(path).split('.')[-1].lower()
+    if file_type not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    with open(path, "rb") as file:
+        return extract_document_text(file, file_type)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def parse_uploaded_document(digest, size, file_type, _file):
+    """Parsed text of an upload, memoized across reruns and sessions by content hash and size"""
+    return extract_document_text(_file, file_type)
+
+def uploaded_file_digest(uploaded_file):
+    """Content hash of an upload, computed once per upload instead of on every rerun"""
+    file_id = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+    cached = st.session_state.get("resume_upload_digest")
+    if cached is None or cached[0] != file_id:
+        cached = (file_id, content_digest(uploaded_file))
+        st.session_state["resume_upload_digest"] = cached
+    return cached[1]
+
+def _edit_extracted_text(resume_text, digest):
+    # Keyed by content hash: the user's edits survive reruns and are reset only by a new upload
+    return st.text_area("Edit extracted text if needed:", value=resume_text, height=200, key=f"resume_edit_{digest}")
+
 def process_resume_file(resume_file):
     """Process the uploaded resume file and extract text"""
     if resume_file is None:
@@ -36,37 +201,33 @@ def process_resume_file(resume_file):
     file_type = resume_file.name.split('.')[-1].lower()
     
     try:
+        if file_type in SUPPORTED_EXTENSIONS:
+            # Streamlit reruns this on every widget interaction; only parse new uploads
+            digest = uploaded_file_digest(resume_file)
+            resume_text = parse_uploaded_document(digest, resume_file.size, file_type, resume_file)
+        
         if file_type == "txt":
-            # Reset file pointer and read
-            resume_file.seek(0)
-            resume_text = resume_file.read().decode("utf-8")
             st.success("Text file processed successfully!")
             return resume_text
             
         elif file_type == "pdf":
-            # Reset file pointer and process
-            resume_file.seek(0)
-            resume_text = extract_text_from_pdf(resume_file)
             if resume_text:
                 st.success("PDF processed successfully!")
                 # Show the extracted text in an expander
                 with st.expander("View extracted text"):
                     st.text(resume_text)
                 # Allow user to edit if needed
-                resume_text = st.text_area("Edit extracted text if needed:", value=resume_text, height=200)
+                resume_text = _edit_extracted_text(resume_text, digest)
                 return resume_text
                 
         elif file_type == "docx":
-            # Reset file pointer and process
-            resume_file.seek(0)
-            resume_text = extract_text_from_docx(resume_file)
             if resume_text:
                 st.success("DOCX processed successfully!")
                 # Show the extracted text in an expander
                 with st.expander("View extracted text"):
                     st.text(resume_text)
                 # Allow user to edit if needed
-                resume_text = st.text_area("Edit extracted text if needed:", value=resume_text, height=200)
+                resume_text = _edit_extracted_text(resume_text, digest)
                 return resume_text
                 
         else:
@@ -0,0 +1,473 @@
+"""Embedding index of stored job descriptions, for finding the postings that best match a resume.
+
+Usage:
+    python jd_index.py add postings/            # every .txt file, id = path, title = first line
+    python jd_index.py add postings.jsonl       # {"id": ..., "title": ..., "text": ...} per line
+    python jd_index.py search resume.pdf -k 10 [--analyze 3]
+    python jd_index.py build-ivf [--nlist 1024]
+    python jd_index.py stats
+
+Posting vectors live in a memory-mapped float32 matrix (vectors.f32) that
+grows in place as postings are added; ids, titles and text are kept next
+to it in SQLite. Vectors are L2-normalized, so a query is one matrix
+multiplication per block of rows, with cosine similarity as the score.
+
+For large corpora, build-ivf adds an approximate inverted-file index:
+postings are clustered around k-means centroids and a query is scored only
+against the postings of its nprobe nearest clusters. Postings added later
+are assigned to the nearest existing centroid; rebuild after the corpus
+has grown a lot.
+
+Embeddings come from JD_EMBEDDER: "hashing" (default), a deterministic
+feature-hashing model over words, bigrams and canonical skills that needs
+no downloads, or "sentence-transformers[:model]" for a local
+sentence-transformers model. An index must be queried with the embedder it
+was built with, which is used by default when JD_EMBEDDER is not set.
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from skill_matcher import STOPWORDS, find_skills, tokenize
+
+DEFAULT_INDEX_DIR = "jd_index"
+DEFAULT_HASHING_DIM = 512
+DEFAULT_SENTENCE_MODEL = "all-MiniLM-L6-v2"
+
+INITIAL_CAPACITY = 1024
+# Rows scored per matrix multiplication, bounding memory for huge indexes
+BLOCK_ROWS = 65536
+EMBED_BATCH_SIZE = 256
+DEFAULT_NPROBE = 16
+# Canonical skills count this many times as much as an ordinary word
+SKILL_WEIGHT = 3.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    row INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL UNIQUE,
+    title TEXT,
+    text TEXT NOT NULL,
+    cell INTEGER,
+    added_at REAL NOT NULL
+)
+"""
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(feature, dim):
+    digest = zlib.crc32(feature.encode("utf-8"))
+    # Signed hashing keeps colliding features from only ever adding up
+    return digest % dim, 1.0 if digest & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-features embedding; no model download, stable across processes"""
+
+    def __init__(self, dim=DEFAULT_HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text):
+        tokens = tokenize(text)
+        words = [token for token in tokens if token not in STOPWORDS and len(token) > 1]
+        features = Counter(words)
+        features.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+        # Synonyms ("k8s", "kubernetes") land on the same skill feature
+        for skill, count in find_skills(tokens).items():
+            features[f"skill:{skill}"] += SKILL_WEIGHT * count
+        return features
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                bucket, sign = _bucket(feature, self.dim)
+                vectors[row, bucket] += sign * (1.0 + math.log(count))
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """A local sentence-transformers model"""
+
+    def __init__(self, model_name=DEFAULT_SENTENCE_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("JD_EMBEDDER=sentence-transformers requires the 'sentence-transformers' package: "
+                              "pip install sentence-transformers")
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def get_embedder(spec=None):
+    """Embedder named by spec or JD_EMBEDDER"""
+    spec = spec or os.environ.get("JD_EMBEDDER", "hashing")
+    kind, _, option = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(option) if option else DEFAULT_HASHING_DIM)
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(option or DEFAULT_SENTENCE_MODEL)
+    raise ValueError(f"Unknown JD_EMBEDDER {spec!r}; use 'hashing' or 'sentence-transformers[:model]'")
+
+
+def _merge_top_k(scores, rows, k):
+    """The k highest-scoring columns of each row of scores, best first"""
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores, rows = np.take_along_axis(scores, keep, 1), np.take_along_axis(rows, keep, 1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, 1), np.take_along_axis(rows, order, 1)
+
+
+class JDIndex:
+    def __init__(self, directory=None, embedder=None):
+        self.directory = directory or os.environ.get("JD_INDEX_DIR", DEFAULT_INDEX_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        meta = self._read_meta()
+        if embedder is None:
+            embedder = get_embedder(None if meta is None or os.environ.get("JD_EMBEDDER") else meta["embedder"])
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._check_meta(meta)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_cell ON jobs (cell)")
+        self._count = self._connect().execute("SELECT COALESCE(MAX(row) + 1, 0) FROM jobs").fetchone()[0]
+        self._vectors = None
+        self._map_vectors(max(INITIAL_CAPACITY, self._count))
+        self._load_ivf()
+
+    def __len__(self):
+        return self._count
+
+    # Storage
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path("jobs.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _read_meta(self):
+        path = self._path("meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    def _check_meta(self, meta):
+        if meta is None:
+            with open(self._path("meta.json"), "w") as file:
+                json.dump({"embedder": self.embedder.name, "dim": self.dim}, file)
+        elif meta["embedder"] != self.embedder.name:
+            raise ValueError(f"The index in {self.directory} was built with JD_EMBEDDER {meta['embedder']!r}, "
+                             f"not {self.embedder.name!r}; use that embedder or rebuild the index")
+
+    def _map_vectors(self, rows):
+        """(Re)map vectors.f32 with room for at least rows vectors, growing the file in place"""
+        path = self._path("vectors.f32")
+        row_bytes = self.dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        capacity = size // row_bytes
+        if capacity < rows:
+            capacity = max(rows, 2 * capacity, INITIAL_CAPACITY)
+            if self._vectors is not None:
+                self._vectors.flush()
+            # Extending the file leaves the new rows zero-filled without copying the old ones
+            with open(path, "ab") as file:
+                file.truncate(capacity * row_bytes)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        cells = np.full(capacity, -1, dtype=np.int32)
+        if getattr(self, "_cells", None) is not None:
+            cells[:len(self._cells)] = self._cells
+        self._cells = cells
+
+    def _load_ivf(self):
+        path = self._path("centroids.npy")
+        self._centroids = np.load(path) if os.path.exists(path) else None
+        if self._centroids is not None:
+            for row, cell in self._connect().execute("SELECT row, cell FROM jobs WHERE cell IS NOT NULL"):
+                self._cells[row] = cell
+
+    # Writes
+
+    def add(self, job_id, text, title=None):
+        self.add_many([(job_id, text, title)])
+
+    def add_many(self, postings, batch_size=EMBED_BATCH_SIZE):
+        """Insert or replace (job_id, text, title) postings; returns how many were written"""
+        written = 0
+        batch = []
+        for posting in postings:
+            batch.append(posting)
+            if len(batch) == batch_size:
+                written += self._add_batch(batch)
+                batch = []
+        if batch:
+            written += self._add_batch(batch)
+        return written
+
+    def _add_batch(self, batch):
+        vectors = self.embedder.embed([text for _, text, _ in batch])
+        conn = self._connect()
+        with self._lock:
+            with conn:
+                # New rows are allocated inside the write transaction, and
+                # _count only moves past them once they are committed
+                conn.execute("BEGIN IMMEDIATE")
+                next_row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM jobs").fetchone()[0]
+                rows = []
+                for job_id, text, title in batch:
+                    existing = conn.execute("SELECT row FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                    if existing is not None:
+                        row = existing[0]
+                        conn.execute("UPDATE jobs SET title = ?, text = ?, added_at = ? WHERE row = ?",
+                                     (title, text, time.time(), row))
+                    else:
+                        row = next_row
+                        next_row += 1
+                        conn.execute("INSERT INTO jobs (row, job_id, title, text, added_at) VALUES (?, ?, ?, ?, ?)",
+                                     (row, job_id, title, text, time.time()))
+                    rows.append(row)
+                if next_row > len(self._vectors):
+                    self._map_vectors(next_row)
+                self._vectors[rows] = vectors
+                if self._centroids is not None:
+                    cells = np.argmax(vectors @ self._centroids.T, axis=1)
+                    self._cells[rows] = cells
+                    conn.executemany("UPDATE jobs SET cell = ? WHERE row = ?",
+                                     [(int(cell), row) for cell, row in zip(cells, rows)])
+                # Vectors reach disk before the rows that point at them are committed
+                self._vectors.flush()
+            self._count = max(self._count, next_row)
+        return len(batch)
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """Cluster the stored vectors (spherical k-means) into nlist cells for approximate search"""
+        n = self._count
+        if not n:
+            raise ValueError("The index is empty")
+        nlist = min(n, nlist or max(1, int(math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        # Train on a sample; a few hundred points per centroid is plenty
+        sample = self._vectors[np.sort(rng.choice(n, size=min(n, 256 * nlist), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            # Re-seed empty clusters from random points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        cells = np.concatenate([self._nearest(self._vectors[start:min(n, start + BLOCK_ROWS)], centroids)
+                                for start in range(0, n, BLOCK_ROWS)]).astype(np.int32)
+        with self._lock, self._connect() as conn:
+            conn.executemany("UPDATE jobs SET cell = ? WHERE row = ?",
+                             [(int(cell), row) for row, cell in enumerate(cells)])
+            np.save(self._path("centroids.npy"), centroids)
+            self._centroids = centroids
+            self._cells[:n] = cells
+        return nlist
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        return np.argmax(vectors @ centroids.T, axis=1)
+
+    # Queries
+
+    def search(self, text, k=10, approximate=None, nprobe=DEFAULT_NPROBE):
+        """The k postings most similar to text, best first, as {"job_id", "title", "score"} dicts"""
+        return self.search_many([text], k, approximate, nprobe)[0]
+
+    def search_many(self, texts, k=10, approximate=None, nprobe=DEFAULT_NPROBE):
+        """search() for several texts at once; exact queries share each block multiplication.
+
+        approximate=None uses the IVF index when one has been built.
+        """
+        queries = self.embedder.embed(list(texts))
+        n = self._count
+        if approximate is None:
+            approximate = self._centroids is not None
+        if approximate and self._centroids is None:
+            raise ValueError("No approximate index has been built; run build_ivf() first")
+        if not n:
+            return [[] for _ in texts]
+        k = min(k, n)
+        if approximate:
+            hits = [self._search_ivf(query, n, k, nprobe) for query in queries]
+        else:
+            scores, rows = self._search_exact(queries, n, k)
+            hits = list(zip(scores, rows))
+        return [self._describe(rows, scores) for scores, rows in hits]
+
+    def _search_exact(self, queries, n, k):
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            block = self._vectors[start:min(n, start + BLOCK_ROWS)]
+            scores = queries @ block.T
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores, best_rows = _merge_top_k(np.hstack([best_scores, scores]), np.hstack([best_rows, rows]), k)
+        return best_scores, best_rows
+
+    def _search_ivf(self, query, n, k, nprobe):
+        centroid_scores = self._centroids @ query
+        probe = np.argpartition(-centroid_scores, min(nprobe, len(centroid_scores)) - 1)[:nprobe]
+        rows = np.flatnonzero(np.isin(self._cells[:n], probe))
+        if not len(rows):
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        scores = self._vectors[rows] @ query
+        best_scores, best_rows = _merge_top_k(scores[None, :], rows[None, :], min(k, len(rows)))
+        return best_scores[0], best_rows[0]
+
+    def _describe(self, rows, scores):
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        found = {row: (job_id, title) for row, job_id, title in self._connect().execute(
+            f"SELECT row, job_id, title FROM jobs WHERE row IN ({placeholders})", rows)}
+        return [{"job_id": found[row][0], "title": found[row][1], "score": float(score)}
+                for row, score in zip(rows, scores) if row in found]
+
+    def get_text(self, job_id):
+        row = self._connect().execute("SELECT text FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        return {
+            "postings": self._count,
+            "capacity": len(self._vectors),
+            "dim": self.dim,
+            "embedder": self.embedder.name,
+            "ivf_cells": None if self._centroids is None else len(self._centroids),
+        }
+
+
+def index_exists(directory=None):
+    """Whether postings have been indexed in directory (or JD_INDEX_DIR)"""
+    directory = directory or os.environ.get("JD_INDEX_DIR", DEFAULT_INDEX_DIR)
+    return os.path.exists(os.path.join(directory, "jobs.db"))
+
+
+@lru_cache(maxsize=None)
+def get_jd_index(directory=None):
+    """Process-wide index for directory (or JD_INDEX_DIR)"""
+    return JDIndex(directory)
+
+
+def analyze_top_matches(resume_text, k=3, index=None, workflow=None, approximate=None):
+    """Find the k stored postings most similar to a resume and run the full analysis against each.
+
+    approximate is passed to JDIndex.search.
+
+    Returns the search hits, best first, each with "match_score" and the
+    finished "analysis" state added.
+    """
+    from resume_analyzer import compute_match_score, create_analysis_graph
+
+    index = index or get_jd_index()
+    matches = index.search(resume_text, k, approximate=approximate)
+    workflow = workflow or create_analysis_graph()
+    results = workflow.batch([{
+        "resume": resume_text,
+        "job_description": index.get_text(match["job_id"]),
+        "skills_analysis": {},
+        "experience_analysis": {},
+        "keyword_analysis": {},
+    } for match in matches])
+    return [dict(match, match_score=compute_match_score(result), analysis=result)
+            for match, result in zip(matches, results)]
+
+
+def _read_postings(source):
+    path = Path(source)
+    if path.is_dir():
+        for file in sorted(path.rglob("*.txt")):
+            text = file.read_text(errors="replace")
+            title = next((line.strip() for line in text.splitlines() if line.strip()), file.stem)
+            yield str(file.relative_to(path)), text, title
+    else:
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record["id"]), record["text"], record.get("title")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index job descriptions and find the best matches for a resume.")
+    parser.add_argument("--index", help=f"Index directory (default: JD_INDEX_DIR or {DEFAULT_INDEX_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Index a directory of .txt postings or a JSONL file")
+    add.add_argument("source")
+    search = commands.add_parser("search", help="Find the postings that best match a resume")
+    search.add_argument("resume", help="PDF, DOCX or TXT resume")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--exact", action="store_true", help="Ignore the approximate index")
+    search.add_argument("--analyze", type=int, default=0, metavar="N",
+                        help="Run the full LLM analysis against the top N postings")
+    ivf = commands.add_parser("build-ivf", help="Build the approximate index")
+    ivf.add_argument("--nlist", type=int, help="Number of clusters (default: sqrt(postings))")
+    commands.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    index = JDIndex(args.index)
+    if args.command == "add":
+        start = time.perf_counter()
+        written = index.add_many(_read_postings(args.source))
+        print(f"Indexed {written} postings in {time.perf_counter() - start:.1f}s ({len(index)} total)")
+    elif args.command == "build-ivf":
+        print(f"Built {index.build_ivf(args.nlist)} clusters over {len(index)} postings")
+    elif args.command == "stats":
+        print(json.dumps(index.stats(), indent=2))
+    else:
+        from document_processor import extract_text_from_path
+        resume_text = extract_text_from_path(args.resume)
+        if args.analyze:
+            if not os.environ.get("OPENAI_API_KEY"):
+                parser.error("--analyze needs OPENAI_API_KEY")
+            for match in analyze_top_matches(resume_text, args.analyze, index,
+                                             approximate=False if args.exact else None):
+                # No match score when the analysis output could not be repaired
+                match_score = "  n/a" if match["match_score"] is None else f"{match['match_score']:5.1f}"
+                print(f"{match['score']:.3f}  {match_score}  {match['job_id']}  {match['title'] or ''}")
+        else:
+            for match in index.search(resume_text, args.k, approximate=False if args.exact else None):
+                print(f"{match['score']:.3f}  {match['job_id']}  {match['title'] or ''}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
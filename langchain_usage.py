@@ -0,0 +1,45 @@
+"""Token usage of LangChain model calls, recorded on the active telemetry span.
+
+Kept apart from telemetry so that recording spans (document extraction,
+the login page) doesn't load LangChain. Importing this module hooks the
+handler into every stage; resume_analyzer does so before making any call.
+"""
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from telemetry import install_usage_handler
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Adds provider-reported token usage and LLM call counts to a span"""
+
+    run_inline = True
+
+    def __init__(self, span):
+        self.span = span
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.span.add("llm_calls")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.span.add("llm_calls")
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            # Streaming responses report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+        if prompt_tokens or completion_tokens:
+            self.span.add("prompt_tokens", prompt_tokens)
+            self.span.add("completion_tokens", completion_tokens)
+            self.span["usage_reported"] = True
+
+
+# Every LangChain callback manager created while a stage is active picks up its handler
+register_configure_hook(install_usage_handler(TokenUsageHandler), inheritable=True)
@@ -0,0 +1,338 @@
+"""Shared scheduler for every LLM call the analyzer makes.
+
+Calls wait in one priority queue (premium before basic, FIFO within a plan)
+and are admitted when all of these allow it:
+
+- a requests-per-minute token bucket
+- a tokens-per-minute bucket, charged with an estimate up front and
+  reconciled with the reported usage afterwards
+- an adaptive concurrency limit: +1 slot per window of successes, halved
+  on 429s, 503s and timeouts (AIMD)
+
+Retryable failures are retried here with jittered exponential backoff,
+honoring Retry-After, which also pauses admission for everyone. Queue depth
+and wait times are reported to telemetry.
+
+Configured from LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+LLM_MAX_CONCURRENCY and LLM_MAX_RETRIES; set them to the account's limits.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from telemetry import add_to_span, current_span, set_gauge
+
+PRIORITIES = {"premium": 0, "basic": 1, "batch": 2}
+
+DEFAULT_REQUESTS_PER_MINUTE = 3500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 5
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 60.0
+# Concurrent failures from one overload episode should halve the limit once, not repeatedly
+DECREASE_COOLDOWN_SECONDS = 2.0
+# Async waiters re-check admission at least this often
+ASYNC_POLL_SECONDS = 0.05
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+OVERLOAD_STATUS_CODES = {429, 503}
+RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+                    "TimeoutException", "ConnectError", "ReadTimeout"}
+
+_priority = ContextVar("llm_priority", default="basic")
+
+
+class LLMUnavailableError(RuntimeError):
+    """The model stayed overloaded or unreachable after every retry"""
+
+
+@contextmanager
+def llm_priority(plan_type):
+    """Schedule the LLM calls made inside this block with the given plan's priority"""
+    token = _priority.set(plan_type if plan_type in PRIORITIES else "basic")
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def retry_after(error):
+    """Seconds to wait from an API error's Retry-After header, if present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def is_overload(error):
+    return getattr(error, "status_code", None) in OVERLOAD_STATUS_CODES or "Timeout" in type(error).__name__
+
+
+class TokenBucket:
+    """Continuously refilling budget of per_minute units; disabled when per_minute is falsy"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute or 0)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)"""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= amount
+
+    def adjust(self, amount):
+        """Return (positive) or charge (negative) units once actual usage is known"""
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, min_concurrency=1, max_retries=DEFAULT_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.concurrency_limit = float(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._changed = threading.Condition(threading.Lock())
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waits = deque(maxlen=2048)
+        self.counts = {"admitted": 0, "retries": 0, "overloaded": 0, "failed": 0}
+
+    # Admission
+
+    def _try_admit(self, ticket, tokens):
+        """With the lock held: admit ticket and return 0, or return seconds to wait (None: until notified)"""
+        if self._waiting[0] != ticket:
+            return None
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= int(self.concurrency_limit):
+            return None
+        wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._waiting)
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self._in_flight += 1
+        self.counts["admitted"] += 1
+        # The next caller in line may be admissible too
+        self._changed.notify_all()
+        return 0
+
+    def _enqueue(self, priority):
+        ticket = (PRIORITIES.get(priority, PRIORITIES["basic"]), next(self._sequence))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _abandon(self, ticket):
+        self._waiting.remove(ticket)
+        heapq.heapify(self._waiting)
+        self._changed.notify_all()
+
+    def _admitted(self, started):
+        waited = time.monotonic() - started
+        self._waits.append(waited)
+        add_to_span("queue_wait_seconds", waited)
+        self._publish()
+
+    def acquire(self, tokens, priority=None):
+        """Block until a call costing about this many tokens may start"""
+        started = time.monotonic()
+        with self._changed:
+            ticket = self._enqueue(priority or _priority.get())
+            try:
+                while True:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0:
+                        break
+                    # Bounded so async admissions and refills are noticed even without a notify
+                    self._changed.wait(timeout=min(wait or 0.25, 0.25))
+            except BaseException:
+                self._abandon(ticket)
+                raise
+        self._admitted(started)
+
+    async def aacquire(self, tokens, priority=None):
+        """Async version of acquire"""
+        started = time.monotonic()
+        with self._changed:
+            ticket = self._enqueue(priority or _priority.get())
+        self._publish()
+        try:
+            while True:
+                with self._changed:
+                    wait = self._try_admit(ticket, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait or ASYNC_POLL_SECONDS, ASYNC_POLL_SECONDS))
+        except BaseException:
+            with self._changed:
+                self._abandon(ticket)
+            raise
+        self._admitted(started)
+
+    def release(self, reserved_tokens, used_tokens, error=None):
+        """Finish an admitted call, adjusting the token budget and concurrency limit"""
+        with self._changed:
+            self._in_flight -= 1
+            self._tokens.adjust(reserved_tokens - used_tokens)
+            now = time.monotonic()
+            if error is None:
+                # Additive increase: one more slot after a full window of successes
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+            elif is_overload(error):
+                self.counts["overloaded"] += 1
+                if now - self._last_decrease > DECREASE_COOLDOWN_SECONDS:
+                    self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+                    self._last_decrease = now
+                delay = retry_after(error)
+                if delay:
+                    self._paused_until = max(self._paused_until, now + delay)
+            self._changed.notify_all()
+        self._publish()
+
+    # Calls with retries
+
+    def _backoff(self, error, attempt):
+        return retry_after(error) or min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _give_up(self, error):
+        with self._changed:
+            self.counts["failed"] += 1
+        if is_retryable(error):
+            raise LLMUnavailableError(
+                "The AI service is busy or unreachable right now. Please try again in a minute."
+            ) from error
+        raise error
+
+    @staticmethod
+    def _reported_tokens():
+        span = current_span()
+        if span is None or not span.get("usage_reported"):
+            return None
+        return span.get("prompt_tokens", 0) + span.get("completion_tokens", 0)
+
+    def _used_tokens(self, before, reserved):
+        after = self._reported_tokens()
+        return after - (before or 0) if after is not None else reserved
+
+    def invoke(self, runnable, inputs, estimated_tokens, priority=None):
+        """Run runnable.invoke(inputs) under the scheduler's limits, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(estimated_tokens, priority)
+            before = self._reported_tokens()
+            try:
+                result = runnable.invoke(inputs)
+            except Exception as e:
+                self.release(estimated_tokens, self._used_tokens(before, estimated_tokens), error=e)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._give_up(e)
+                self._count_retry()
+                time.sleep(self._backoff(e, attempt))
+                continue
+            self.release(estimated_tokens, self._used_tokens(before, estimated_tokens))
+            return result
+
+    async def ainvoke(self, runnable, inputs, estimated_tokens, priority=None):
+        """Async version of invoke"""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(estimated_tokens, priority)
+            before = self._reported_tokens()
+            try:
+                result = await runnable.ainvoke(inputs)
+            except Exception as e:
+                self.release(estimated_tokens, self._used_tokens(before, estimated_tokens), error=e)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._give_up(e)
+                self._count_retry()
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            self.release(estimated_tokens, self._used_tokens(before, estimated_tokens))
+            return result
+
+    def _count_retry(self):
+        with self._changed:
+            self.counts["retries"] += 1
+        add_to_span("retries")
+
+    # Reporting
+
+    def _publish(self):
+        set_gauge("llm_queue_depth", "LLM calls waiting for admission", len(self._waiting))
+        set_gauge("llm_in_flight", "LLM calls in progress", self._in_flight)
+        set_gauge("llm_concurrency_limit", "Current adaptive LLM concurrency limit", self.concurrency_limit)
+
+    def snapshot(self):
+        """Queue depth, in-flight calls, the concurrency limit, wait percentiles and counters"""
+        with self._changed:
+            waits = sorted(self._waits)
+            state = {
+                "queue_depth": len(self._waiting),
+                "in_flight": self._in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                **self.counts,
+            }
+        for q in (50, 95, 99):
+            state[f"wait_p{q}_ms"] = 1000 * waits[min(len(waits) - 1, int(q / 100 * len(waits)))] if waits else 0.0
+        return state
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler, configured from the LLM_* environment variables on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                requests_per_minute=int(os.environ.get("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)),
+                tokens_per_minute=int(os.environ.get("LLM_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE)),
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                max_retries=int(os.environ.get("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+            )
+        return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Replace the process-wide scheduler, e.g. with limits from command-line flags"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
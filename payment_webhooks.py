@@ -0,0 +1,362 @@
+"""PayPal payment confirmation, applied off the request path.
+
+PayPal webhook deliveries and checkout return redirects are both written to
+the payment_events queue in the subscription database. A background worker
+applies them: it executes approved checkouts against PayPal and writes the
+resulting subscription. Events are keyed by ID, so redelivered webhooks and
+refreshed return pages are applied once. The Streamlit return page only
+enqueues and then polls checkout_status(), a local database read.
+
+Run the webhook endpoint (with its own worker) next to the app:
+    python payment_webhooks.py serve --port 8502
+
+Replay recorded payloads without network access:
+    python payment_webhooks.py replay benchmarks/fixtures/paypal_webhooks/*.json --no-verify
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from subscription_store import get_subscription_store
+
+logger = logging.getLogger(__name__)
+
+# Local event type for a buyer returning from PayPal; the ID is derived from
+# the checkout, so reloading the return page doesn't queue it twice
+CHECKOUT_RETURNED = "CHECKOUT.RETURNED"
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2
+POLL_INTERVAL_SECONDS = 0.5
+
+SUBSCRIPTION_DAYS = 30
+BASIC_PLAN_ANALYSES = 5
+
+
+class WebhookVerificationError(Exception):
+    pass
+
+
+class PaymentExecutionError(Exception):
+    """PayPal refused the payment; retrying won't help"""
+
+
+def paypal_signature_verifier(headers, body):
+    """Check a delivery's transmission signature with PayPal's published certificate.
+
+    PAYPAL_WEBHOOK_ID must be the ID of the webhook registered for this app.
+    """
+    webhook_id = os.environ.get("PAYPAL_WEBHOOK_ID")
+    if not webhook_id:
+        raise WebhookVerificationError("PAYPAL_WEBHOOK_ID is not set")
+    import paypalrestsdk
+    try:
+        verified = paypalrestsdk.WebhookEvent.verify(
+            headers.get("PAYPAL-TRANSMISSION-ID"),
+            headers.get("PAYPAL-TRANSMISSION-TIME"),
+            webhook_id,
+            body.decode("utf-8"),
+            headers.get("PAYPAL-CERT-URL"),
+            headers.get("PAYPAL-TRANSMISSION-SIG"),
+            headers.get("PAYPAL-AUTH-ALGO") or "sha256",
+        )
+    except Exception as e:
+        raise WebhookVerificationError(f"Signature check failed: {e}")
+    if not verified:
+        raise WebhookVerificationError("Invalid webhook signature")
+
+
+def ingest_webhook(body, headers, verify=paypal_signature_verifier, store=None):
+    """Verify a webhook delivery and queue it. Returns (http_status, message).
+
+    Nothing is applied here, so PayPal gets its 200 as soon as the event is durable.
+    """
+    store = store or get_subscription_store()
+    if verify is not None:
+        try:
+            verify(headers, body)
+        except WebhookVerificationError as e:
+            return 400, str(e)
+    try:
+        event = json.loads(body)
+        event_id, event_type = event["id"], event["event_type"]
+    except (ValueError, KeyError, TypeError):
+        return 400, "Malformed webhook event"
+
+    if store.enqueue_payment_event(event_id, event_type, json.dumps(event.get("resource") or {})):
+        return 200, "queued"
+    return 200, "duplicate"
+
+
+def checkout_id_from_params(params):
+    """PayPal ID of the checkout a return redirect belongs to"""
+    if params.get("plan") == "premium":
+        return params.get("token")
+    return params.get("paymentId")
+
+
+def enqueue_checkout_return(params, store=None):
+    """Queue confirmation of the checkout in a return redirect's query params.
+
+    Returns the checkout ID to poll, or None if the params aren't a PayPal return.
+    """
+    store = store or get_subscription_store()
+    checkout_id = checkout_id_from_params(params)
+    if not checkout_id:
+        return None
+    resource = {"checkout_id": checkout_id, "plan": params.get("plan", "basic"), "payer_id": params.get("PayerID")}
+    store.enqueue_payment_event(f"return:{checkout_id}", CHECKOUT_RETURNED, json.dumps(resource))
+    return checkout_id
+
+
+def checkout_status(checkout_id, store=None):
+    """created, completed, failed or None for an unknown checkout"""
+    checkout = (store or get_subscription_store()).get_checkout(checkout_id)
+    return checkout and checkout["status"]
+
+
+def execute_paypal_checkout(plan, checkout_id, payer_id):
+    """Execute an approved checkout with PayPal; returns (payment_id, agreement_id)"""
+    # Imported on first use; the app starts a payment worker before anyone has paid
+    import paypalrestsdk
+    if plan == "premium":
+        agreement = paypalrestsdk.BillingAgreement.execute(checkout_id)
+        if not getattr(agreement, "id", None):
+            raise PaymentExecutionError("No agreement ID returned")
+        return None, agreement.id
+
+    payment = paypalrestsdk.Payment.find(checkout_id)
+    if payment.state == "approved" or payment.execute({"payer_id": payer_id}):
+        return checkout_id, None
+    if (payment.error or {}).get("name") == "PAYMENT_ALREADY_DONE":
+        return checkout_id, None
+    raise PaymentExecutionError(f"Error executing payment: {payment.error}")
+
+
+def paypal_checkout_executor(client_id, client_secret):
+    """execute_paypal_checkout with the SDK configured for these credentials first.
+
+    A worker may apply a checkout before anyone has logged in to the app
+    process it runs in, and so before the page has configured PayPal.
+    """
+    def execute(plan, checkout_id, payer_id):
+        from paypal_handler import configure_paypal_sdk
+        configure_paypal_sdk(client_id, client_secret)
+        return execute_paypal_checkout(plan, checkout_id, payer_id)
+    return execute
+
+
+class PaymentEventProcessor:
+    """Applies queued payment events to the subscription store.
+
+    execute_checkout is injectable so the processor can run against recorded
+    payloads and a stub instead of PayPal.
+    """
+
+    def __init__(self, store=None, execute_checkout=execute_paypal_checkout, worker_id=None):
+        self.store = store or get_subscription_store()
+        self.execute_checkout = execute_checkout
+        self.worker_id = worker_id or uuid.uuid4().hex
+
+    def _grant(self, username, plan, payment_id=None, agreement_id=None):
+        expiry = datetime.now() + timedelta(days=SUBSCRIPTION_DAYS)
+        analyses = float("inf") if plan == "premium" else BASIC_PLAN_ANALYSES
+        self.store.save(username, plan, expiry, analyses, payment_id=payment_id, agreement_id=agreement_id)
+
+    def _complete_checkout(self, checkout, payment_id=None, agreement_id=None):
+        # The buyer's return and PayPal's sale webhook race to confirm the same
+        # checkout; only the one that flips the status grants the plan, so the
+        # other can't reset the quota
+        if not self.store.mark_checkout_completed(checkout["checkout_id"]):
+            return "ignored"
+        try:
+            self._grant(checkout["username"], checkout["plan_type"], payment_id, agreement_id)
+        except Exception:
+            self.store.update_checkout(checkout["checkout_id"], "created")
+            raise
+        return "applied"
+
+    def apply(self, event_type, resource):
+        """Apply one event; returns 'applied' or 'ignored'. Raises to request a retry."""
+        if event_type == CHECKOUT_RETURNED:
+            checkout = self.store.get_checkout(resource["checkout_id"])
+            if checkout is None or checkout["status"] == "completed":
+                return "ignored"
+            try:
+                payment_id, agreement_id = self.execute_checkout(
+                    resource["plan"], resource["checkout_id"], resource.get("payer_id")
+                )
+            except PaymentExecutionError as e:
+                self.store.update_checkout(checkout["checkout_id"], "failed", str(e))
+                return "ignored"
+            return self._complete_checkout(checkout, payment_id, agreement_id)
+
+        if event_type == "PAYMENT.SALE.COMPLETED":
+            if resource.get("billing_agreement_id"):
+                # Recurring premium payment: extend the subscription another period
+                username = self.store.find_username(agreement_id=resource["billing_agreement_id"])
+                if username is None:
+                    return "ignored"
+                self._grant(username, "premium", agreement_id=resource["billing_agreement_id"])
+                return "applied"
+            checkout = self.store.get_checkout(resource.get("parent_payment"))
+            if checkout is None:
+                return "ignored"
+            return self._complete_checkout(checkout, payment_id=checkout["checkout_id"])
+
+        if event_type in ("PAYMENT.SALE.REFUNDED", "PAYMENT.SALE.REVERSED"):
+            username = self.store.find_username(payment_id=resource.get("parent_payment"))
+            if username is None:
+                return "ignored"
+            self.store.expire(username)
+            return "applied"
+
+        if event_type == "BILLING.SUBSCRIPTION.SUSPENDED":
+            username = self.store.find_username(agreement_id=resource.get("id"))
+            if username is None:
+                return "ignored"
+            self.store.expire(username)
+            return "applied"
+
+        return "ignored"
+
+    def process_next(self):
+        """Claim and apply one due event; returns False when the queue has nothing due"""
+        claimed = self.store.claim_payment_event(self.worker_id)
+        if claimed is None:
+            return False
+        event_id, event_type, payload, attempts = claimed
+        try:
+            status = self.apply(event_type, json.loads(payload))
+        except Exception as e:
+            if attempts >= MAX_ATTEMPTS:
+                self.store.finish_payment_event(event_id, "failed", str(e))
+                if event_type == CHECKOUT_RETURNED:
+                    self.store.update_checkout(json.loads(payload)["checkout_id"], "failed", str(e))
+            else:
+                delay = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                self.store.retry_payment_event(event_id, delay * random.uniform(0.5, 1.5), str(e))
+        else:
+            self.store.finish_payment_event(event_id, status)
+        return True
+
+    def run_until_idle(self):
+        """Apply every due event; returns how many were processed"""
+        processed = 0
+        while self.process_next():
+            processed += 1
+        return processed
+
+
+class PaymentWorker(threading.Thread):
+    """Daemon thread that keeps draining the payment event queue"""
+
+    def __init__(self, processor=None, poll_interval=POLL_INTERVAL_SECONDS):
+        super().__init__(name="payment-worker", daemon=True)
+        self.processor = processor or PaymentEventProcessor()
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                busy = self.processor.process_next()
+            except Exception:
+                # Database hiccups shouldn't kill the worker
+                logger.exception("payment worker error")
+                busy = False
+            if not busy:
+                self._stop_event.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ResumeMatcherWebhooks/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, message):
+        body = json.dumps({"status": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/paypal/webhook":
+            return self._send(404, "not found")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        headers = {name.upper(): value for name, value in self.headers.items()}
+        status, message = ingest_webhook(body, headers, verify=self.server.verify, store=self.server.store)
+        self._send(status, message)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/healthz":
+            return self._send(200, self.server.store.payment_event_counts())
+        self._send(404, "not found")
+
+
+def start_webhook_server(host="127.0.0.1", port=8502, verify=paypal_signature_verifier, store=None):
+    """Serve POST /paypal/webhook on a background thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), WebhookRequestHandler)
+    server.url = f"http://{host}:{server.server_address[1]}"
+    server.verify = verify
+    server.store = store or get_subscription_store()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PayPal webhook endpoint and payment event worker.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    serve = subcommands.add_parser("serve", help="Receive webhooks and apply queued events")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8502)
+    serve.add_argument("--workers", type=int, default=1)
+    replay = subcommands.add_parser("replay", help="Ingest recorded webhook payloads and apply them")
+    replay.add_argument("payloads", nargs="+", help="JSON files, one webhook event each")
+    for subcommand in (serve, replay):
+        subcommand.add_argument("--no-verify", action="store_true", help="Skip signature verification")
+    args = parser.parse_args()
+    verify = None if args.no_verify else paypal_signature_verifier
+
+    if args.command == "replay":
+        for path in args.payloads:
+            with open(path, "rb") as f:
+                status, message = ingest_webhook(f.read(), {}, verify=verify)
+            print(f"{path}: {status} {message}")
+        processed = PaymentEventProcessor().run_until_idle()
+        print(f"Applied {processed} events: {get_subscription_store().payment_event_counts()}")
+        return
+
+    client_id = os.environ.get("PAYPAL_CLIENT_ID")
+    client_secret = os.environ.get("PAYPAL_CLIENT_SECRET")
+    if client_id and client_secret:
+        from paypal_handler import configure_paypal_sdk
+        configure_paypal_sdk(client_id, client_secret)
+    server = start_webhook_server(args.host, args.port, verify=verify)
+    workers = [PaymentWorker() for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    print(f"Listening for PayPal webhooks on {server.url}/paypal/webhook")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
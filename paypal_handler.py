@@ -1,7 +1,41 @@
 import streamlit as st
 import paypalrestsdk
+import hashlib
+import json
 import os
+import threading
 from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from subscription_store import get_subscription_store
+
+PAYPAL_MODE = os.environ.get("PAYPAL_MODE", "sandbox")  # Change to "live" for production
+# Override the API endpoint, e.g. to point at benchmarks/paypal_stub_server.py
+PAYPAL_ENDPOINT = os.environ.get("PAYPAL_ENDPOINT")
+
+_configure_lock = threading.Lock()
+_configured_credentials = None
+_premium_plan_ids = {}
+
+def configure_paypal_sdk(client_id, client_secret):
+    """Configure the SDK once per process and credential set.
+    
+    Reconfiguring creates a new API object, which throws away its cached
+    OAuth token, so this is skipped unless the credentials changed.
+    """
+    global _configured_credentials
+    credentials = (PAYPAL_MODE, PAYPAL_ENDPOINT, client_id, client_secret)
+    with _configure_lock:
+        if credentials != _configured_credentials:
+            options = {
+                "mode": PAYPAL_MODE,
+                "client_id": client_id,
+                "client_secret": client_secret
+            }
+            if PAYPAL_ENDPOINT:
+                options["endpoint"] = PAYPAL_ENDPOINT
+            paypalrestsdk.configure(options)
+            _configured_credentials = credentials
 
 # Initialize PayPal with your API credentials
 def initialize_paypal():
@@ -25,17 +59,13 @@ def initialize_paypal():
             st.warning("Please enter your PayPal API credentials to enable payments.")
             return False
     
-    # Configure the SDK
-    paypalrestsdk.configure({
-        "mode": "sandbox",  # Change to "live" for production
-        "client_id": client_id,
-        "client_secret": client_secret
-    })
+    # Configure the SDK (memoized per process)
+    configure_paypal_sdk(client_id, client_secret)
     
     return True
 
 # Create a PayPal payment for the basic plan
-def create_basic_plan_payment(return_url, cancel_url):
+def create_basic_plan_payment(return_url, cancel_url, username):
     payment = paypalrestsdk.Payment({
         "intent": "sale",
         "payer": {
@@ -59,17 +89,15 @@ def create_basic_plan_payment(return_url, cancel_url):
         for link in payment.links:
             if link.rel == "approval_url":
                 approval_url = link.href
-                # Store the payment ID in session state for later verification
-                st.session_state['paypal_payment_id'] = payment.id
+                # Record who is paying, so the return redirect can be confirmed without session state
+                get_subscription_store().save_checkout(payment.id, username, 'basic')
                 return approval_url
     else:
         st.error(f"Error creating PayPal payment: {payment.error}")
         return None
 
-# Create a PayPal billing agreement for the premium subscription
-def create_premium_subscription(return_url, cancel_url):
-    # First, create a billing plan
-    billing_plan = paypalrestsdk.BillingPlan({
+def _premium_plan_definition(return_url, cancel_url):
+    return {
         "name": "Resume Matcher Premium Monthly",
         "description": "Monthly subscription for Resume Matcher Pro",
         "type": "INFINITE",
@@ -95,35 +123,81 @@ def create_premium_subscription(return_url, cancel_url):
             "initial_fail_amount_action": "CONTINUE",
             "max_fail_attempts": "3"
         }
+    }
+
+def _premium_plan_key():
+    # Identifies the plan by its billing terms and merchant account, not by
+    # return URLs (agreements override those), so a price change provisions a new plan
+    definition = _premium_plan_definition(None, None)
+    fingerprint = json.dumps([PAYPAL_MODE, _configured_credentials and _configured_credentials[2], definition], sort_keys=True)
+    return "premium:" + hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+def get_premium_plan_id(return_url, cancel_url):
+    """ID of the active premium billing plan, creating and activating it only the first time"""
+    key = _premium_plan_key()
+    plan_id = _premium_plan_ids.get(key)
+    if plan_id:
+        return plan_id
+    
+    store = get_subscription_store()
+    plan_id = store.get_billing_plan_id(key)
+    if not plan_id:
+        billing_plan = paypalrestsdk.BillingPlan(_premium_plan_definition(return_url, cancel_url))
+        if not (billing_plan.create() and billing_plan.activate()):
+            st.error(f"Error creating or activating billing plan: {billing_plan.error}")
+            return None
+        # If another process provisioned one concurrently, use whichever was saved first
+        plan_id = store.save_billing_plan_id(key, billing_plan.id)
+    
+    _premium_plan_ids[key] = plan_id
+    return plan_id
+
+def forget_premium_plan_id():
+    """Drop the cached plan ID so the next checkout provisions a new plan"""
+    key = _premium_plan_key()
+    _premium_plan_ids.pop(key, None)
+    get_subscription_store().delete_billing_plan_id(key)
+
+# Create a PayPal billing agreement for the premium subscription
+def create_premium_subscription(return_url, cancel_url, username, retry_with_new_plan=True):
+    # Reuse the provisioned billing plan; only the agreement is created per checkout
+    plan_id = get_premium_plan_id(return_url, cancel_url)
+    if not plan_id:
+        return None
+    
+    # Create billing agreement
+    # Add sufficient time to the start date (1 day in the future)
+    start_date = (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
+    
+    billing_agreement = paypalrestsdk.BillingAgreement({
+        "name": "Resume Matcher Premium Subscription",
+        "description": "Monthly subscription for unlimited resume analyses",
+        "start_date": start_date,
+        "plan": {
+            "id": plan_id
+        },
+        "payer": {
+            "payment_method": "paypal"
+        },
+        "override_merchant_preferences": {
+            "return_url": return_url,
+            "cancel_url": cancel_url
+        }
     })
     
-    if billing_plan.create() and billing_plan.activate():
-        # Create billing agreement
-        # Add sufficient time to the start date (1 day in the future)
-        start_date = (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z'
-        
-        billing_agreement = paypalrestsdk.BillingAgreement({
-            "name": "Resume Matcher Premium Subscription",
-            "description": "Monthly subscription for unlimited resume analyses",
-            "start_date": start_date,
-            "plan": {
-                "id": billing_plan.id
-            },
-            "payer": {
-                "payment_method": "paypal"
-            }
-        })
-        
-        if billing_agreement.create():
-            for link in billing_agreement.links:
-                if link.rel == "approval_url":
-                    # Store the billing agreement ID in session state
-                    st.session_state['paypal_agreement_id'] = billing_agreement.id
-                    return link.href
-        else:
-            st.error(f"Error creating billing agreement: {billing_agreement.error}")
+    if billing_agreement.create():
+        for link in billing_agreement.links:
+            if link.rel == "approval_url":
+                # The agreement has no ID until it is executed; PayPal returns the buyer with this token
+                token = parse_qs(urlparse(link.href).query)["token"][0]
+                get_subscription_store().save_checkout(token, username, 'premium')
+                return link.href
+    elif retry_with_new_plan and "plan" in json.dumps(billing_agreement.error or {}).lower():
+        # The cached plan was deactivated or deleted in the merchant account
+        forget_premium_plan_id()
+        return create_premium_subscription(return_url, cancel_url, username, retry_with_new_plan=False)
     else:
-        st.error(f"Error creating or activating billing plan: {billing_plan.error}")
+        st.error(f"Error creating billing agreement: {billing_agreement.error}")
     
     return None
 
@@ -148,12 +222,8 @@ def display_payment_options(username):
         
         if st.button("Purchase Basic Plan"):
             # Create PayPal payment
-            payment_url = create_basic_plan_payment(return_url, cancel_url)
+            payment_url = create_basic_plan_payment(return_url, cancel_url, username)
             if payment_url:
-                # Store the user's selection in the session state
-                st.session_state['selected_plan'] = 'basic'
-                st.session_state['username'] = username
-                
                 # Redirect the user to PayPal
                 st.markdown(f'<meta http-equiv="refresh" content="0;url={payment_url}">', unsafe_allow_html=True)
                 st.write("Redirecting to PayPal...")
@@ -168,132 +238,35 @@ def display_payment_options(username):
         
         if st.button("Subscribe to Premium Plan"):
             # Create PayPal subscription
-            subscription_url = create_premium_subscription(subscription_return_url, cancel_url)
+            subscription_url = create_premium_subscription(subscription_return_url, cancel_url, username)
             if subscription_url:
-                # Store the user's selection in the session state
-                st.session_state['selected_plan'] = 'premium'
-                st.session_state['username'] = username
-                
                 # Redirect the user to PayPal
                 st.markdown(f'<meta http-equiv="refresh" content="0;url={subscription_url}">', unsafe_allow_html=True)
                 st.write("Redirecting to PayPal...")
 
 # Function to verify if a user has an active subscription
 def check_user_subscription(username):
+    store = get_subscription_store()
+    
     # Debug information
     if st.checkbox("Show subscription debug info", key="debug_subscription"):
         st.write({
             "Username": username,
-            "Subscriptions data": st.session_state.get('user_subscriptions', {})
+            "Subscription data": store.get(username)
         })
     
-    # In a real app, you would query your database to check the user's subscription status
-    # For this example, we'll use a session state variable to simulate a database
-    
-    if 'user_subscriptions' not in st.session_state:
-        st.session_state['user_subscriptions'] = {}
-    
     # Add test subscription for debugging if needed
-    if username not in st.session_state['user_subscriptions'] and st.checkbox("Add test subscription", key="add_test_sub"):
+    if store.get(username) is None and st.checkbox("Add test subscription", key="add_test_sub"):
         expiry = datetime.now() + timedelta(days=30)
-        st.session_state['user_subscriptions'][username] = {
-            'plan_type': 'basic',
-            'expiry_date': expiry,
-            'analyses_remaining': 5,
-            'payment_id': 'test_payment'
-        }
+        store.save(username, 'basic', expiry, 5, payment_id='test_payment')
         st.success(f"Added test subscription for {username}")
     
-    if username in st.session_state['user_subscriptions']:
-        subscription = st.session_state['user_subscriptions'][username]
-        
+    subscription = store.get(username)
+    if subscription is not None:
         try:
-            expiry_date = subscription['expiry_date']
-            # Handle different date formats
-            if isinstance(expiry_date, str):
-                expiry_date = datetime.fromisoformat(expiry_date)
-                
-            if expiry_date > datetime.now():
+            if subscription['expiry_date'] > datetime.now():
                 return True, subscription['plan_type']
         except Exception as e:
             st.error(f"Error checking subscription: {e}")
     
     return False, None
-
-def execute_paypal_payment():
-    # Get the PayPal payment ID and payer ID from URL parameters
-    params = dict(st.query_params)  # Convert to dictionary for easier access
-    
-    st.write(f"Payment parameters: {params}")
-    
-    if 'success' in params and params['success'] == 'true':
-        plan = params.get('plan', 'basic')
-        st.write(f"Processing plan: {plan}")
-        
-        if plan == 'basic' and 'paymentId' in params and 'PayerID' in params:
-            payment_id = params['paymentId']
-            payer_id = params['PayerID']
-            
-            # Verify that this payment ID matches the one we stored
-            if 'paypal_payment_id' in st.session_state and payment_id == st.session_state['paypal_payment_id']:
-                # Execute the payment
-                try:
-                    payment = paypalrestsdk.Payment.find(payment_id)
-                    if payment.execute({"payer_id": payer_id}):
-                        # Payment successful, update the user's subscription
-                        if 'username' in st.session_state:
-                            username = st.session_state['username']
-                            
-                            if 'user_subscriptions' not in st.session_state:
-                                st.session_state['user_subscriptions'] = {}
-                            
-                            # Set expiry date 30 days from now
-                            expiry = datetime.now() + timedelta(days=30)
-                            st.session_state['user_subscriptions'][username] = {
-                                'plan_type': 'basic',
-                                'expiry_date': expiry,
-                                'analyses_remaining': 5,
-                                'payment_id': payment_id
-                            }
-                            
-                            st.success("Payment successful! You now have access to the Basic Plan.")
-                            return True
-                    else:
-                        st.error(f"Error executing payment: {payment.error}")
-                except Exception as e:
-                    st.error(f"Exception during payment execution: {str(e)}")
-        
-        elif plan == 'premium' and 'token' in params:
-            token = params['token']
-            st.write(f"Premium plan token: {token}")
-            
-            try:
-                # Execute the billing agreement
-                agreement = paypalrestsdk.BillingAgreement.execute(token)
-                
-                # Check if execution was successful
-                if hasattr(agreement, 'id'):
-                    # Agreement successful, update the user's subscription
-                    if 'username' in st.session_state:
-                        username = st.session_state['username']
-                        
-                        if 'user_subscriptions' not in st.session_state:
-                            st.session_state['user_subscriptions'] = {}
-                        
-                        # Set expiry date 1 month from now
-                        expiry = datetime.now() + timedelta(days=30)
-                        st.session_state['user_subscriptions'][username] = {
-                            'plan_type': 'premium',
-                            'expiry_date': expiry,
-                            'analyses_remaining': float('inf'),
-                            'agreement_id': agreement.id
-                        }
-                        
-                        st.success("Subscription successful! You now have access to the Premium Plan.")
-                        return True
-                else:
-                    st.error("Error executing billing agreement - no agreement ID returned")
-            except Exception as e:
-                st.error(f"Exception during agreement execution: {str(e)}")
-    
-    return False
@@ -0,0 +1,298 @@
+"""Shrink resume and job description text before it is pasted into prompts.
+
+Job descriptions lose boilerplate sections (EEO statements, benefits, about
+the company), extracted PDF text loses repeated page headers/footers and
+runs of whitespace, and every prompt field is held to a per-node token
+budget. Token counts before and after are logged for each node.
+Intermediate analyses are passed on to later prompts in a compact encoding
+that lists each item once.
+"""
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-node token budgets for each prompt field. Fields not listed are not truncated.
+NODE_TOKEN_BUDGETS = {
+    "extract_skills": {"resume": 3000, "job_description": 1500},
+    "analyze_experience": {"resume": 3000, "job_description": 1500},
+    "extract_keywords": {"job_description": 1500},
+    "extract_combined": {"resume": 3000, "job_description": 1500},
+    "generate_recommendations": {
+        "resume": 3000,
+        "job_description": 1500,
+        "skills_analysis": 600,
+        "experience_analysis": 600,
+        "keyword_analysis": 400,
+    },
+    "job_profile": {"job_description": 2000},
+    "score_against_profile": {"resume": 3000, "required_skills": 500, "required_experience": 500},
+    "update_skills": {"removed_sections": 1500, "added_sections": 1500},
+    "update_experience": {"removed_sections": 1500, "added_sections": 1500},
+}
+
+# Headers of job description sections that never affect matching
+BOILERPLATE_HEADERS = re.compile(
+    r"^\W*(equal (employment )?opportunity|eeo|benefits|perks|what we offer|why join us|why work"
+    r"|about (us|the company|our company)|who we are|our (story|mission|values)|how to apply"
+    r"|accommodations?|privacy( notice| policy)?|disclaimer|legal|e-?verify|compensation and benefits)\b",
+    re.IGNORECASE,
+)
+
+# Boilerplate sentences that appear without a header of their own
+BOILERPLATE_PARAGRAPHS = re.compile(
+    r"equal opportunity employer|without regard to (race|color|religion)|reasonable accommodation"
+    r"|e-verify|protected veteran|sexual orientation|gender identity|national origin",
+    re.IGNORECASE,
+)
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+# Stripping boilerplate never leaves less than this share of a job
+# description; below it the heuristics have misfired and the text is kept whole
+MIN_KEPT_JD_SHARE = 0.25
+
+# Typical page furniture in extracted PDF text
+PAGE_NUMBER_LINE = re.compile(r"^\s*(page\s*)?\d+\s*(of\s*\d+)?\s*$|^\s*-\s*\d+\s*-\s*$", re.IGNORECASE)
+
+# Content typical of resume page headers and footers
+HEADER_FOOTER_HINTS = re.compile(
+    r"@|https?://|www\.|linkedin|\+?\d[\d\s().-]{7,}\d|confidential|curriculum vitae|\bresume\b|\bcv\b",
+    re.IGNORECASE,
+)
+
+# Common job description section headers
+KNOWN_SECTIONS = re.compile(
+    r"^\W*(about the (role|job|position|team)|responsibilities|requirements|qualifications"
+    r"|(preferred|minimum|basic) qualifications|what you('ll| will) do|who you are|skills"
+    r"|nice to have|the role|job (summary|description)|overview|duties)\W*$",
+    re.IGNORECASE,
+)
+
+
+def _is_section_header(line):
+    """Heuristic for a section header: markdown heading, short line ending in a colon, ALL CAPS or a known title"""
+    stripped = line.strip().strip("*").strip()
+    if not stripped or len(stripped) > 60:
+        return False
+    return (
+        line.lstrip().startswith("#")
+        or stripped.endswith(":")
+        or (stripped.isupper() and any(char.isalpha() for char in stripped))
+        or bool(KNOWN_SECTIONS.match(stripped))
+    )
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """The model's tiktoken encoding, or None if tiktoken is unavailable.
+
+    Failures are cached too: when the encoding files can't be downloaded,
+    retrying on every call would block each prompt on a network timeout.
+    """
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Tokenizer-accurate token count, falling back to an estimate if tiktoken is unavailable"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        # tiktoken missing or its encoding files can't be fetched; ~4 characters per token
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text, budget, model="gpt-3.5-turbo"):
+    """Cut text to at most budget tokens, preferring to end on a line boundary"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= budget:
+            return text
+        truncated = encoding.decode(tokens[:budget])
+    else:
+        if len(text) <= budget * 4:
+            return text
+        truncated = text[:budget * 4]
+
+    cut = truncated.rfind("\n")
+    if cut > len(truncated) * 0.8:
+        truncated = truncated[:cut]
+    return truncated.rstrip() + "\n[...truncated]"
+
+
+def normalize_whitespace(text):
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\u00a0", " ")
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+@lru_cache(maxsize=64)
+def clean_document_text(text):
+    """Drop page numbers, repeated headers/footers and duplicate lines from extracted document text"""
+    lines = normalize_whitespace(text).split("\n")
+
+    # Short lines that repeat on several pages and look like page furniture (the
+    # candidate's name from the first line, contact details, confidentiality
+    # notes) are headers/footers. Repeated job titles are left alone.
+    counts = Counter(line for line in lines if line and len(line) < 80)
+    first_line = next((line for line in lines if line), "")
+    repeated = {
+        line for line, count in counts.items()
+        if count >= 3 and (line == first_line or HEADER_FOOTER_HINTS.search(line))
+    }
+
+    cleaned = []
+    seen_repeated = set()
+    for line in lines:
+        if PAGE_NUMBER_LINE.match(line):
+            continue
+        if line in repeated:
+            # Keep the first occurrence; it may be the candidate's name at the top
+            if line in seen_repeated:
+                continue
+            seen_repeated.add(line)
+        if cleaned and line and line == cleaned[-1]:
+            continue
+        cleaned.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(cleaned)).strip()
+
+
+def _is_boilerplate_header(line):
+    """A section header (or a bare line holding only the title) that starts a boilerplate section"""
+    match = BOILERPLATE_HEADERS.match(line)
+    if match is None:
+        return False
+    return _is_section_header(line) or not line[match.end():].strip(" \t:.*#-")
+
+
+def _strip_boilerplate_sentences(line):
+    """The line without its EEO/accommodation sentences"""
+    sentences = SENTENCE_BREAK.split(line)
+    return " ".join(sentence for sentence in sentences if not BOILERPLATE_PARAGRAPHS.search(sentence)).strip()
+
+
+@lru_cache(maxsize=64)
+def strip_jd_boilerplate(text):
+    """Remove EEO, benefits, company-blurb and similar sections from a job description.
+
+    If that would leave less than MIN_KEPT_JD_SHARE of the text, the
+    description is returned whitespace-normalized but otherwise whole.
+    """
+    original = normalize_whitespace(text)
+    kept = []
+    skipping = False
+    for line in original.split("\n"):
+        if _is_section_header(line) or _is_boilerplate_header(line):
+            # A new section starts; skip it entirely if it's boilerplate
+            skipping = _is_boilerplate_header(line)
+        if skipping:
+            continue
+        if line:
+            line = _strip_boilerplate_sentences(line)
+            if not line:
+                continue
+        kept.append(line)
+
+    stripped = re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+    if len(stripped) < MIN_KEPT_JD_SHARE * len(original):
+        return original
+    return stripped
+
+
+# Fields of each intermediate analysis in the order they are encoded for
+# prompts: the specific lists first, so the broader lists that repeat them
+# (skills_in_resume holds every matching skill) shrink to what is left
+ANALYSIS_FIELD_ORDER = {
+    "skills_analysis": ("matching_skills", "missing_skills", "skills_in_resume", "skills_in_job_description"),
+    "experience_analysis": ("experience_highlights", "experience_gaps", "experience_in_resume", "experience_required"),
+    "keyword_analysis": ("essential_keywords", "technical_terms", "industry_buzzwords", "action_verbs"),
+}
+
+
+def _item_key(item):
+    return " ".join(str(item).lower().split())
+
+
+def encode_analyses(state):
+    """Compact prompt text for each intermediate analysis in state, as {key: text}.
+
+    Each field becomes one `field: item; item` line. An item already listed
+    under an earlier field of the same analysis is left out (compared
+    case-insensitively); a field left with nothing new reads "see above",
+    and a field that was empty to begin with reads "none".
+    """
+    encoded = {}
+    for key, order in ANALYSIS_FIELD_ORDER.items():
+        analysis = state.get(key) or {}
+        seen = set()
+        lines = []
+        for field in list(order) + [field for field in analysis if field not in order]:
+            if field not in analysis:
+                continue
+            values = analysis[field] if isinstance(analysis[field], list) else [analysis[field]]
+            items = []
+            for item in values:
+                item_key = _item_key(item)
+                if item_key and item_key not in seen:
+                    seen.add(item_key)
+                    items.append(str(item).strip())
+            lines.append(f"{field}: {'; '.join(items) or ('see above' if values else 'none')}")
+        encoded[key] = "\n".join(lines) or "none"
+    return encoded
+
+
+def _clean_field(name, value):
+    if name == "resume":
+        return clean_document_text(value)
+    if name == "job_description":
+        return clean_document_text(strip_jd_boilerplate(value))
+    return value
+
+
+def compact_inputs(node, inputs, model="gpt-3.5-turbo", summarizer=None):
+    """Clean and budget a node's prompt inputs.
+
+    Fields over their budget are truncated, or passed to
+    summarizer(text, budget) if one is given.
+
+    Returns the compacted inputs and a report of {field: (tokens_before,
+    tokens_after)}, which is also logged.
+    """
+    budgets = NODE_TOKEN_BUDGETS.get(node, {})
+    compacted = {}
+    report = {}
+    for name, value in inputs.items():
+        if not isinstance(value, str):
+            compacted[name] = value
+            continue
+        before = count_tokens(value, model)
+        value = _clean_field(name, value)
+        if name in budgets and count_tokens(value, model) > budgets[name]:
+            if summarizer is not None:
+                value = summarizer(value, budgets[name])
+            value = truncate_to_tokens(value, budgets[name], model)
+        compacted[name] = value
+        report[name] = (before, count_tokens(value, model))
+
+    total_before = sum(before for before, _ in report.values())
+    total_after = sum(after for _, after in report.values())
+    logger.info(
+        "%s prompt inputs: %d -> %d tokens (%s)",
+        node, total_before, total_after,
+        ", ".join(f"{name} {before}->{after}" for name, (before, after) in report.items()),
+    )
+    return compacted, report
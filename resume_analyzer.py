@@ -1,8 +1,47 @@
-from typing import Dict, TypedDict
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, TypedDict
+
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
-from langgraph.graph import StateGraph, END
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
+
+from analysis_cache import get_cache, make_cache_key, normalize_text
+from analysis_schemas import (
+    CombinedAnalysis, ExperienceAnalysis, JobProfileExtraction, KeywordAnalysis, ProfileMatch, SkillsAnalysis,
+    empty_output, repair_output,
+)
+# Imported for its hook: each model call's token usage is recorded on its telemetry span
+import langchain_usage  # noqa: F401
+from llm_scheduler import get_scheduler
+from prompt_compaction import compact_inputs, count_tokens, encode_analyses
+from resume_sections import changed_sections, format_sections, trim_to_changes
+from skill_matcher import extract_keywords_local, match_skills
+from telemetry import count_http_request, trace_run, trace_stage
+
+# Every node runs on a small, fast model by default. EXTRACTION_MODEL and
+# RECOMMENDATIONS_MODEL change the defaults (e.g. RECOMMENDATIONS_MODEL=gpt-4o
+# for stronger recommendations at about 15x the cost), MODEL_<NODE>
+# (e.g. MODEL_EXTRACT_SKILLS) one node.
+DEFAULT_EXTRACTION_MODEL = "gpt-4o-mini"
+DEFAULT_RECOMMENDATIONS_MODEL = "gpt-4o-mini"
+
+# USD per million (prompt, completion) tokens, matched by model name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Models that accept a JSON schema as response_format; others get the schema as a function
+JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
 
 # Define the state for our LangGraph
 class GraphState(TypedDict):
@@ -12,11 +51,22 @@ class GraphState(TypedDict):
     experience_analysis: Dict
     keyword_analysis: Dict
     final_recommendations: str
+    job_profile: Dict
+    # An earlier analysis of this job description (its resume and the three
+    # analyses), for re-analyzing an edited resume incrementally
+    previous: Dict
 
-# Create nodes for the graph
-def extract_skills(state: GraphState) -> GraphState:
-    """Extract skills from both resume and job description"""
-    template = """You are an expert in skill identification. Analyze the following resume and job description to identify skills:
+# Job-level artifacts computed once per distinct job description and
+# reused for every resume scored against it
+class JobProfile(TypedDict):
+    job_description: str
+    required_skills: List[str]
+    required_experience: List[str]
+    keyword_analysis: Dict
+    # plus DEGRADED: True when the profile extraction could not be repaired
+
+# Prompt templates for each node
+SKILLS_TEMPLATE = """You are an expert in skill identification. Analyze the following resume and job description to identify skills:
     
 Resume:
 {resume}
@@ -32,24 +82,8 @@ Return a JSON with the following structure:
   "matching_skills": ["skill1", "skill2"]
 }}
 """
-    
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-    parser = JsonOutputParser()
-    chain = prompt | llm | parser
-    
-    skills_analysis = chain.invoke({
-        "resume": state["resume"],
-        "job_description": state["job_description"]
-    })
-    
-    return {"skills_analysis": skills_analysis, **state}
 
-def analyze_experience(state: GraphState) -> GraphState:
-    """Analyze experience requirements vs. resume experience"""
-    template = """You are an expert in analyzing professional experience. Compare the experience mentioned in the resume with the requirements in the job description:
+EXPERIENCE_TEMPLATE = """You are an expert in analyzing professional experience. Compare the experience mentioned in the resume with the requirements in the job description:
     
 Resume:
 {resume}
@@ -65,24 +99,8 @@ Return a JSON with the following structure:
   "experience_highlights": ["highlight1", "highlight2"]
 }}
 """
-    
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-    parser = JsonOutputParser()
-    chain = prompt | llm | parser
-    
-    experience_analysis = chain.invoke({
-        "resume": state["resume"],
-        "job_description": state["job_description"]
-    })
-    
-    return {"experience_analysis": experience_analysis, **state}
 
-def extract_keywords(state: GraphState) -> GraphState:
-    """Extract important keywords from the job description"""
-    template = """You are an expert in keyword optimization for resumes. Analyze this job description and identify key terms that should be included in a resume:
+KEYWORDS_TEMPLATE = """You are an expert in keyword optimization for resumes. Analyze this job description and identify key terms that should be included in a resume:
     
 Job Description:
 {job_description}
@@ -95,23 +113,41 @@ Return a JSON with the following structure:
   "action_verbs": ["verb1", "verb2"]
 }}
 """
+
+# Single-pass alternative to the three prompts above: the resume and job
+# description are sent (and billed) once instead of three times
+COMBINED_TEMPLATE = """You are an expert in resume analysis, covering skill identification, professional experience and keyword optimization. Analyze the following resume against the job description:
     
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-    parser = JsonOutputParser()
-    chain = prompt | llm | parser
-    
-    keyword_analysis = chain.invoke({
-        "job_description": state["job_description"]
-    })
-    
-    return {"keyword_analysis": keyword_analysis, **state}
+Resume:
+{resume}
 
-def generate_recommendations(state: GraphState) -> GraphState:
-    """Generate final recommendations based on all analyses with specific replacement examples"""
-    template = """You are a professional resume consultant. Based on the detailed analysis, provide specific recommendations for improving the resume to match the job description better.
+Job Description:
+{job_description}
+
+Return a JSON with the following structure:
+{{
+  "skills_analysis": {{
+    "skills_in_job_description": ["skill1", "skill2"],
+    "skills_in_resume": ["skill1", "skill2"],
+    "missing_skills": ["skill1", "skill2"],
+    "matching_skills": ["skill1", "skill2"]
+  }},
+  "experience_analysis": {{
+    "experience_required": ["req1", "req2"],
+    "experience_in_resume": ["exp1", "exp2"],
+    "experience_gaps": ["gap1", "gap2"],
+    "experience_highlights": ["highlight1", "highlight2"]
+  }},
+  "keyword_analysis": {{
+    "essential_keywords": ["keyword1", "keyword2"],
+    "technical_terms": ["term1", "term2"],
+    "industry_buzzwords": ["buzzword1", "buzzword2"],
+    "action_verbs": ["verb1", "verb2"]
+  }}
+}}
+"""
+
+RECOMMENDATIONS_TEMPLATE = """You are a professional resume consultant. Based on the detailed analysis, provide specific recommendations for improving the resume to match the job description better.
     
 Resume:
 {resume}
@@ -128,6 +164,8 @@ Experience Analysis:
 Keyword Analysis:
 {keyword_analysis}
 
+(Analysis items are listed once, under the first field they fit.)
+
 Provide detailed, actionable recommendations organized in these sections. For each recommendation, include BOTH:
 1. The original text or section from the resume that should be changed (or indicate where to add new content)
 2. The exact replacement text that should be used instead
@@ -162,41 +200,698 @@ REPLACEMENT: "Convert to bullet points highlighting key achievements and quantif
 ORIGINAL: "Managed social media accounts"
 REPLACEMENT: "Grew company social media presence by 200%, increasing engagement by 45% and generating 60+ qualified leads per month"
 """
+
+JOB_PROFILE_TEMPLATE = """You are an expert recruiter. Analyze this job description and extract the requirements a candidate's resume will be scored against, plus the key terms that should appear in a matching resume:
     
+Job Description:
+{job_description}
+
+Return a JSON with the following structure:
+{{
+  "required_skills": ["skill1", "skill2"],
+  "required_experience": ["req1", "req2"],
+  "essential_keywords": ["keyword1", "keyword2"],
+  "technical_terms": ["term1", "term2"],
+  "industry_buzzwords": ["buzzword1", "buzzword2"],
+  "action_verbs": ["verb1", "verb2"]
+}}
+"""
+
+PROFILE_MATCH_TEMPLATE = """You are an expert in matching candidates to job requirements. Compare the following resume against the job's required skills and required experience:
+    
+Resume:
+{resume}
+
+Required Skills:
+{required_skills}
+
+Required Experience:
+{required_experience}
+
+Return a JSON with the following structure:
+{{
+  "skills_in_resume": ["skill1", "skill2"],
+  "missing_skills": ["skill1", "skill2"],
+  "matching_skills": ["skill1", "skill2"],
+  "experience_in_resume": ["exp1", "exp2"],
+  "experience_gaps": ["gap1", "gap2"],
+  "experience_highlights": ["highlight1", "highlight2"]
+}}
+"""
+
+# Incremental re-analysis: bring an earlier analysis up to date with an edited
+# resume from the changed sections alone, without resending the resume or
+# the job description
+UPDATE_SKILLS_TEMPLATE = """You are an expert in skill identification. A resume was analyzed against a job description, and then some of its sections were edited. Update the analysis to match the edited resume.
+
+Previous analysis:
+{previous_analysis}
+
+Resume sections before the edit:
+{removed_sections}
+
+The same sections after the edit:
+{added_sections}
+
+Keep everything the edit does not affect. Remove skills that only the removed text showed, add skills the new text shows, and move skills between missing and matching accordingly.
+
+Return the complete updated analysis as a JSON with the following structure:
+{{
+  "skills_in_job_description": ["skill1", "skill2"],
+  "skills_in_resume": ["skill1", "skill2"],
+  "missing_skills": ["skill1", "skill2"],
+  "matching_skills": ["skill1", "skill2"]
+}}
+"""
+
+UPDATE_EXPERIENCE_TEMPLATE = """You are an expert in analyzing professional experience. A resume was compared against a job description's requirements, and then some of its sections were edited. Update the analysis to match the edited resume.
+
+Previous analysis:
+{previous_analysis}
+
+Resume sections before the edit:
+{removed_sections}
+
+The same sections after the edit:
+{added_sections}
+
+Keep everything the edit does not affect. Remove experience that only the removed text showed, add experience and highlights from the new text, and drop gaps the new text now covers.
+
+Return the complete updated analysis as a JSON with the following structure:
+{{
+  "experience_required": ["req1", "req2"],
+  "experience_in_resume": ["exp1", "exp2"],
+  "experience_gaps": ["gap1", "gap2"],
+  "experience_highlights": ["highlight1", "highlight2"]
+}}
+"""
+
+REPAIR_TEMPLATE = """The text below was supposed to be a JSON object with this structure, every list holding strings:
+{structure}
+
+Rewrite it as that JSON object, keeping its content. Use an empty list for any key it has no content for.
+
+Text:
+{output}
+"""
+
+# node -> (prompt template, output schema; None for free text)
+NODES = {
+    "extract_skills": (SKILLS_TEMPLATE, SkillsAnalysis),
+    "analyze_experience": (EXPERIENCE_TEMPLATE, ExperienceAnalysis),
+    "extract_keywords": (KEYWORDS_TEMPLATE, KeywordAnalysis),
+    "extract_combined": (COMBINED_TEMPLATE, CombinedAnalysis),
+    "generate_recommendations": (RECOMMENDATIONS_TEMPLATE, None),
+    "job_profile": (JOB_PROFILE_TEMPLATE, JobProfileExtraction),
+    "score_against_profile": (PROFILE_MATCH_TEMPLATE, ProfileMatch),
+    "update_skills": (UPDATE_SKILLS_TEMPLATE, SkillsAnalysis),
+    "update_experience": (UPDATE_EXPERIENCE_TEMPLATE, ExperienceAnalysis),
+}
+
+def model_for(node):
+    """The model a node runs on"""
+    if NODES[node][1] is None:
+        default = os.environ.get("RECOMMENDATIONS_MODEL", DEFAULT_RECOMMENDATIONS_MODEL)
+    else:
+        default = os.environ.get("EXTRACTION_MODEL", DEFAULT_EXTRACTION_MODEL)
+    return os.environ.get(f"MODEL_{node.upper()}", default)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """USD cost of a call, or None for a model without a known price"""
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            prompt_price, completion_price = MODEL_PRICES[prefix]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+    return None
+
+# Keep-alive pool shared by every LLM call in the process, so analyses reuse
+# open TLS connections to the API instead of handshaking per request
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+# Completion tokens reserved against the tokens-per-minute budget before a
+# call; the reservation is corrected with the reported usage afterwards
+DEFAULT_COMPLETION_TOKEN_ESTIMATE = 400
+COMPLETION_TOKEN_ESTIMATES = {"generate_recommendations": 1000, "extract_combined": 1000}
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """Process-wide pooled HTTP client for OpenAI requests"""
+    return httpx.Client(limits=HTTP_POOL_LIMITS, timeout=httpx.Timeout(60.0, connect=10.0),
+                        event_hooks={"request": [count_http_request]})
+
+@lru_cache(maxsize=32)
+def _cached_chain(template, schema, model, api_key):
     prompt = ChatPromptTemplate.from_template(template)
     
     # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
-    chain = prompt | llm | StrOutputParser()
+    # stream_usage makes streamed responses report token usage too; retries
+    # are left to the shared scheduler so they respect its rate limits
+    llm = ChatOpenAI(temperature=0, model=model, api_key=api_key, http_client=get_http_client(),
+                     stream_usage=True, max_retries=0)
+    if schema is None:
+        return prompt | llm | StrOutputParser()
+    # Schema-constrained output; the raw message is kept so a response that
+    # still fails validation can be repaired instead of failing the run
+    method = "json_schema" if model.startswith(JSON_SCHEMA_MODELS) else "function_calling"
+    return prompt | llm.with_structured_output(schema, method=method, strict=True if method == "json_schema" else None,
+                                               include_raw=True)
+
+def _build_chain(node):
+    """Get the prompt | llm | parser chain for a node, built once per process.
     
-    final_recommendations = chain.invoke({
+    Chains are keyed on the model and API key too, so a key entered later in
+    the Streamlit sidebar takes effect without a restart.
+    """
+    template, schema = NODES[node]
+    return _cached_chain(template, schema, model_for(node), os.environ.get("OPENAI_API_KEY"))
+
+def _build_repair_chain(node):
+    """Chain asking a node's model to reformat its own malformed output"""
+    return _cached_chain(REPAIR_TEMPLATE, NODES[node][1], model_for(node), os.environ.get("OPENAI_API_KEY"))
+
+def _record_usage(span, template, model, inputs, report, result):
+    """Payload sizes and cost for a node span, and token estimates if the provider reported none"""
+    output = result if isinstance(result, str) else json.dumps(result)
+    span["input_bytes"] = sum(len(value.encode("utf-8")) for value in inputs.values() if isinstance(value, str))
+    span["output_bytes"] = len(output.encode("utf-8"))
+    span["input_tokens"] = sum(after for _, after in report.values())
+    if span.get("cache_hit"):
+        return
+    if not span.get("usage_reported"):
+        span["prompt_tokens"] = span["input_tokens"] + count_tokens(template, model)
+        span["completion_tokens"] = count_tokens(output, model)
+        span["tokens_estimated"] = True
+    cost = estimate_cost(model, span["prompt_tokens"], span["completion_tokens"])
+    if cost is not None:
+        span["cost_usd"] = cost
+
+@lru_cache(maxsize=32)
+def _template_tokens(template, model):
+    return count_tokens(template, model)
+
+def _estimated_tokens(node, model, template, report):
+    """Tokens to reserve with the scheduler for one call: the prompt plus a typical completion"""
+    completion = COMPLETION_TOKEN_ESTIMATES.get(node, DEFAULT_COMPLETION_TOKEN_ESTIMATE)
+    return _template_tokens(template, model) + sum(after for _, after in report.values()) + completion
+
+def _raw_text(message):
+    """The text a structured-output call actually returned, from the content or the function call"""
+    calls = message.additional_kwargs.get("tool_calls") or []
+    if calls:
+        return calls[0]["function"]["arguments"]
+    return message.content if isinstance(message.content, str) else ""
+
+def _parse_structured(schema, span, output):
+    """A structured-output response as a dict, repaired locally if it failed validation; None if unusable"""
+    if output["parsed"] is not None:
+        return output["parsed"].model_dump()
+    span.add("parse_errors")
+    result = repair_output(schema, _raw_text(output["raw"]))
+    if result is not None:
+        span.setdefault("repair", "local")
+    return result
+
+def _repair_inputs(schema, output):
+    return {"structure": json.dumps(empty_output(schema)), "output": _raw_text(output["raw"])}
+
+def _invoke_node(node, inputs, estimate, span):
+    """Run a node's chain through the scheduler, validating and repairing structured output"""
+    schema = NODES[node][1]
+    output = get_scheduler().invoke(_build_chain(node), inputs, estimate)
+    if schema is None:
+        return output
+    result = _parse_structured(schema, span, output)
+    if result is None and _raw_text(output["raw"]):
+        # Not salvageable locally; give the model one chance to reformat its own answer
+        span["repair"] = "llm"
+        output = get_scheduler().invoke(_build_repair_chain(node), _repair_inputs(schema, output), estimate)
+        result = _parse_structured(schema, span, output)
+    return result
+
+async def _ainvoke_node(node, inputs, estimate, span):
+    """Async version of _invoke_node"""
+    schema = NODES[node][1]
+    output = await get_scheduler().ainvoke(_build_chain(node), inputs, estimate)
+    if schema is None:
+        return output
+    result = _parse_structured(schema, span, output)
+    if result is None and _raw_text(output["raw"]):
+        span["repair"] = "llm"
+        output = await get_scheduler().ainvoke(_build_repair_chain(node), _repair_inputs(schema, output), estimate)
+        result = _parse_structured(schema, span, output)
+    return result
+
+# Set on an analysis that is empty because the model's output could not be
+# parsed or repaired; its empty lists mean "unknown", not "nothing to match"
+DEGRADED = "degraded"
+
+def _unrepairable(node, span):
+    # An empty analysis degrades this node's part of the report instead of failing the whole run
+    span["repair"] = "empty"
+    output = empty_output(NODES[node][1])
+    # The combined extraction nests its three analyses; each of them is flagged
+    nested = [value for value in output.values() if isinstance(value, dict)]
+    for analysis in nested or [output]:
+        analysis[DEGRADED] = True
+    return output
+
+def is_degraded(result) -> bool:
+    """Whether any analysis in a finished state (or a job profile) came back empty after a failed repair"""
+    return bool(result.get(DEGRADED)) or any(
+        (result.get(key) or {}).get(DEGRADED) for key in ("skills_analysis", "experience_analysis", "keyword_analysis"))
+
+def _cached_invoke(node, inputs):
+    """Compact a node's inputs and run its chain, skipping the LLM call on a cache hit"""
+    template = NODES[node][0]
+    model = model_for(node)
+    with trace_stage(node, model=model) as span:
+        inputs, report = compact_inputs(node, inputs, model=model)
+        cache = get_cache()
+        key = make_cache_key(node, model, template, inputs)
+        result = cache.get(key)
+        span["cache_hit"] = result is not None
+        if result is None:
+            result = _invoke_node(node, inputs, _estimated_tokens(node, model, template, report), span)
+            if result is None:
+                result = _unrepairable(node, span)
+            else:
+                cache.set(key, result)
+        _record_usage(span, template, model, inputs, report, result)
+        return result
+
+async def _cached_ainvoke(node, inputs):
+    """Async version of _cached_invoke"""
+    template = NODES[node][0]
+    model = model_for(node)
+    with trace_stage(node, model=model) as span:
+        inputs, report = compact_inputs(node, inputs, model=model)
+        cache = get_cache()
+        key = make_cache_key(node, model, template, inputs)
+        result = cache.get(key)
+        span["cache_hit"] = result is not None
+        if result is None:
+            result = await _ainvoke_node(node, inputs, _estimated_tokens(node, model, template, report), span)
+            if result is None:
+                result = _unrepairable(node, span)
+            else:
+                cache.set(key, result)
+        _record_usage(span, template, model, inputs, report, result)
+        return result
+
+def _skills_inputs(state):
+    return {
+        "resume": state["resume"],
+        "job_description": state["job_description"]
+    }
+
+def _experience_inputs(state):
+    return {
+        "resume": state["resume"],
+        "job_description": state["job_description"]
+    }
+
+def _keywords_inputs(state):
+    return {
+        "job_description": state["job_description"]
+    }
+
+def _recommendations_inputs(state):
+    return {
         "resume": state["resume"],
         "job_description": state["job_description"],
-        "skills_analysis": str(state["skills_analysis"]),
-        "experience_analysis": str(state["experience_analysis"]),
-        "keyword_analysis": str(state["keyword_analysis"])
-    })
+        **encode_analyses(state)
+    }
+
+def _job_profile_inputs(job_description):
+    return {
+        "job_description": job_description
+    }
+
+def _profile_match_inputs(state):
+    profile = state["job_profile"]
+    return {
+        "resume": state["resume"],
+        "required_skills": "\n".join(f"- {skill}" for skill in profile["required_skills"]),
+        "required_experience": "\n".join(f"- {req}" for req in profile["required_experience"])
+    }
+
+def _job_profile_from_response(job_description, response):
+    profile = {
+        "job_description": job_description,
+        "required_skills": response.get("required_skills", []),
+        "required_experience": response.get("required_experience", []),
+        "keyword_analysis": {
+            "essential_keywords": response.get("essential_keywords", []),
+            "technical_terms": response.get("technical_terms", []),
+            "industry_buzzwords": response.get("industry_buzzwords", []),
+            "action_verbs": response.get("action_verbs", [])
+        }
+    }
+    if response.get(DEGRADED):
+        profile[DEGRADED] = profile["keyword_analysis"][DEGRADED] = True
+    return profile
+
+def _split_profile_match(profile, response):
+    """Split a profile match response into the usual skills/experience analyses"""
+    skills_analysis = {
+        "skills_in_job_description": profile["required_skills"],
+        "skills_in_resume": response.get("skills_in_resume", []),
+        "missing_skills": response.get("missing_skills", []),
+        "matching_skills": response.get("matching_skills", [])
+    }
+    experience_analysis = {
+        "experience_required": profile["required_experience"],
+        "experience_in_resume": response.get("experience_in_resume", []),
+        "experience_gaps": response.get("experience_gaps", []),
+        "experience_highlights": response.get("experience_highlights", [])
+    }
+    if response.get(DEGRADED) or profile.get(DEGRADED):
+        skills_analysis[DEGRADED] = experience_analysis[DEGRADED] = True
+    return {
+        "skills_analysis": skills_analysis,
+        "experience_analysis": experience_analysis,
+        "keyword_analysis": profile["keyword_analysis"]
+    }
+
+def _job_profile_key(job_description):
+    # Keyed on the normalized job description, so a re-pasted posting skips prompt compaction too
+    return make_cache_key("built_job_profile", model_for("job_profile"), JOB_PROFILE_TEMPLATE,
+                          {"job_description": job_description})
+
+def _cache_job_profile(key, profile):
+    # A degraded profile is retried next time rather than reused
+    if not is_degraded(profile):
+        get_cache().set(key, profile)
+    return profile
+
+def build_job_profile(job_description: str) -> JobProfile:
+    """Build the reusable job profile for a job description (one LLM call per distinct JD)"""
+    key = _job_profile_key(job_description)
+    profile = get_cache().get(key)
+    if profile is None:
+        response = _cached_invoke("job_profile", _job_profile_inputs(job_description))
+        profile = _cache_job_profile(key, _job_profile_from_response(job_description, response))
+    return dict(profile, job_description=job_description)
+
+async def abuild_job_profile(job_description: str) -> JobProfile:
+    """Async version of build_job_profile"""
+    key = _job_profile_key(job_description)
+    profile = get_cache().get(key)
+    if profile is None:
+        response = await _cached_ainvoke("job_profile", _job_profile_inputs(job_description))
+        profile = _cache_job_profile(key, _job_profile_from_response(job_description, response))
+    return dict(profile, job_description=job_description)
+
+# Incremental re-analysis. Each extraction depends only on some resume
+# sections; when state["previous"] holds an analysis of the same job
+# description, an edit to other sections reuses the previous result, and a
+# small edit to its sections is applied with an update prompt. Contact
+# details feed no analysis; keywords depend on the job description alone.
+SECTION_DEPENDENCIES = {
+    "extract_skills": ("summary", "skills", "experience", "projects", "certifications", "other"),
+    "analyze_experience": ("summary", "experience", "education", "projects", "certifications", "other"),
+    "extract_keywords": (),
+}
+ANALYSIS_KEYS = {
+    "extract_skills": "skills_analysis",
+    "analyze_experience": "experience_analysis",
+    "extract_keywords": "keyword_analysis",
+}
+UPDATE_NODES = {"extract_skills": "update_skills", "analyze_experience": "update_experience"}
+
+# Fields that come from the job description alone, carried over from the previous analysis
+JOB_FIELDS = {"extract_skills": ("skills_in_job_description",), "analyze_experience": ("experience_required",)}
+
+# Edits touching more than this share of the resume are analyzed from scratch
+INCREMENTAL_MAX_CHANGED_SHARE = 0.5
+
+def _incremental_plan(node, state):
+    """How node can reuse state["previous"]: ("reuse", result), ("update", inputs), or None for a full run"""
+    previous = state.get("previous")
+    key = ANALYSIS_KEYS[node]
+    if not previous or not any((previous.get(key) or {}).values()):
+        return None
+    if normalize_text(previous["job_description"]) != normalize_text(state["job_description"]):
+        return None
+    removed, added = changed_sections(previous["resume"], state["resume"])
+    removed = [section for section in removed if section["kind"] in SECTION_DEPENDENCIES[node]]
+    added = [section for section in added if section["kind"] in SECTION_DEPENDENCIES[node]]
+    if not removed and not added:
+        return "reuse", previous[key]
+    removed, added = trim_to_changes(removed, added)
+    changed = sum(len(section["text"]) for section in removed + added)
+    if changed > INCREMENTAL_MAX_CHANGED_SHARE * len(normalize_text(state["resume"])):
+        return None
+    return "update", {
+        "previous_analysis": json.dumps(previous[key], indent=1),
+        "removed_sections": format_sections(removed),
+        "added_sections": format_sections(added),
+    }
+
+def _reused(node, result):
+    with trace_stage(node, incremental="reused"):
+        return result
+
+def _merged(node, previous, updated):
+    # The job description is unchanged, so its side of the analysis is too
+    return {**updated, **{field: previous[field] for field in JOB_FIELDS[node] if field in previous}}
+
+def _analysis(node, state, inputs):
+    """Run an extraction node, incrementally when state has a previous analysis"""
+    plan = _incremental_plan(node, state)
+    if plan is None:
+        return _cached_invoke(node, inputs(state))
+    how, value = plan
+    if how == "reuse":
+        return _reused(node, value)
+    return _merged(node, state["previous"][ANALYSIS_KEYS[node]], _cached_invoke(UPDATE_NODES[node], value))
+
+async def _aanalysis(node, state, inputs):
+    """Async version of _analysis"""
+    plan = _incremental_plan(node, state)
+    if plan is None:
+        return await _cached_ainvoke(node, inputs(state))
+    how, value = plan
+    if how == "reuse":
+        return _reused(node, value)
+    return _merged(node, state["previous"][ANALYSIS_KEYS[node]], await _cached_ainvoke(UPDATE_NODES[node], value))
+
+# Create nodes for the graph
+# Nodes return only the keys they produce so the three analysis branches can
+# run in parallel without conflicting writes to the shared state.
+def extract_skills(state: GraphState) -> GraphState:
+    """Extract skills from both resume and job description"""
+    return {"skills_analysis": _analysis("extract_skills", state, _skills_inputs)}
+
+async def aextract_skills(state: GraphState) -> GraphState:
+    """Async version of extract_skills"""
+    return {"skills_analysis": await _aanalysis("extract_skills", state, _skills_inputs)}
+
+def analyze_experience(state: GraphState) -> GraphState:
+    """Analyze experience requirements vs. resume experience"""
+    return {"experience_analysis": _analysis("analyze_experience", state, _experience_inputs)}
+
+async def aanalyze_experience(state: GraphState) -> GraphState:
+    """Async version of analyze_experience"""
+    return {"experience_analysis": await _aanalysis("analyze_experience", state, _experience_inputs)}
+
+def extract_keywords(state: GraphState) -> GraphState:
+    """Extract important keywords from the job description"""
+    return {"keyword_analysis": _analysis("extract_keywords", state, _keywords_inputs)}
+
+async def aextract_keywords(state: GraphState) -> GraphState:
+    """Async version of extract_keywords"""
+    return {"keyword_analysis": await _aanalysis("extract_keywords", state, _keywords_inputs)}
+
+def _combined_inputs(state):
+    return {
+        "resume": state["resume"],
+        "job_description": state["job_description"]
+    }
+
+def _reusable_combined(state):
+    # One call produces all three analyses, so it is skipped only if all of them are unaffected
+    plans = {node: _incremental_plan(node, state) for node in ANALYSIS_KEYS}
+    if all(plan is not None and plan[0] == "reuse" for plan in plans.values()):
+        return _reused("extract_combined", {ANALYSIS_KEYS[node]: plan[1] for node, plan in plans.items()})
+    return None
+
+def extract_combined(state: GraphState) -> GraphState:
+    """Skills, experience and keyword analyses from a single call"""
+    return _reusable_combined(state) or _cached_invoke("extract_combined", _combined_inputs(state))
+
+async def aextract_combined(state: GraphState) -> GraphState:
+    """Async version of extract_combined"""
+    return _reusable_combined(state) or await _cached_ainvoke("extract_combined", _combined_inputs(state))
+
+def generate_recommendations(state: GraphState) -> GraphState:
+    """Generate final recommendations based on all analyses with specific replacement examples"""
+    return {"final_recommendations": _cached_invoke("generate_recommendations", _recommendations_inputs(state))}
+
+async def agenerate_recommendations(state: GraphState) -> GraphState:
+    """Async version of generate_recommendations"""
+    return {"final_recommendations": await _cached_ainvoke("generate_recommendations", _recommendations_inputs(state))}
+
+def local_extract_skills(state: GraphState) -> GraphState:
+    """LLM-free extract_skills using the local skill dictionary"""
+    with trace_stage("extract_skills", local=True):
+        return {"skills_analysis": match_skills(state["resume"], state["job_description"])}
+
+def local_extract_keywords(state: GraphState) -> GraphState:
+    """LLM-free extract_keywords using the local keyword extractor"""
+    with trace_stage("extract_keywords", local=True):
+        return {"keyword_analysis": extract_keywords_local(state["job_description"])}
+
+def score_against_profile(state: GraphState) -> GraphState:
+    """Score the resume against a prebuilt job profile in a single call"""
+    response = _cached_invoke("score_against_profile", _profile_match_inputs(state))
+    return _split_profile_match(state["job_profile"], response)
+
+async def ascore_against_profile(state: GraphState) -> GraphState:
+    """Async version of score_against_profile"""
+    response = await _cached_ainvoke("score_against_profile", _profile_match_inputs(state))
+    return _split_profile_match(state["job_profile"], response)
+
+def _coverage(matched, total):
+    return matched / total if total else 1.0
+
+def compute_match_score(result) -> Optional[float]:
+    """Overall 0-100 match score from a finished analysis, used for ranking resumes.
+
+    None when an analysis is degraded: its empty lists would otherwise count
+    as full coverage and rank the resume near the top.
+    """
+    if is_degraded(result):
+        return None
+    skills = result.get("skills_analysis") or {}
+    experience = result.get("experience_analysis") or {}
+    keywords = result.get("keyword_analysis") or {}
     
-    return {"final_recommendations": final_recommendations, **state}
+    skills_score = _coverage(len(skills.get("matching_skills", [])), len(skills.get("skills_in_job_description", [])))
+    experience_score = 1.0 - _coverage(len(experience.get("experience_gaps", [])), len(experience.get("experience_required", []))) \
+        if experience.get("experience_required") else 1.0
+    
+    # Keywords are checked directly against the resume text
+    resume = result.get("resume", "").lower()
+    terms = keywords.get("essential_keywords", []) + keywords.get("technical_terms", [])
+    keyword_score = _coverage(sum(1 for term in terms if term.lower() in resume), len(terms))
+    
+    score = 0.5 * min(skills_score, 1.0) + 0.3 * max(experience_score, 0.0) + 0.2 * keyword_score
+    return round(100 * score, 1)
+
+# Independent analysis nodes; none of them reads another's output
+ANALYSIS_NODES = ["extract_skills", "analyze_experience", "extract_keywords"]
+
+# Analysis graph layouts, chosen per deployment with ANALYSIS_MODE:
+# "multi" runs the three extraction prompts in parallel, "single" makes one
+# combined extraction call (fewer input tokens, one fewer round of calls),
+# "local" is "multi" with skills and keywords from the local matcher
+ANALYSIS_MODES = ("multi", "single", "local")
+DEFAULT_ANALYSIS_MODE = "multi"
+
+def analysis_mode():
+    """The configured analysis graph layout"""
+    mode = os.environ.get("ANALYSIS_MODE", DEFAULT_ANALYSIS_MODE).lower()
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"ANALYSIS_MODE must be one of {', '.join(ANALYSIS_MODES)}, not {mode!r}")
+    return mode
 
 # Create the graph
-def create_analysis_graph():
+# With use_local_matcher, skills and keywords come from the deterministic
+# local matcher and only experience analysis and recommendations call the LLM.
+# mode overrides ANALYSIS_MODE; "local" mode implies use_local_matcher,
+# which does not apply to "single".
+def create_analysis_graph(use_local_matcher=False, mode=None):
+    mode = mode or analysis_mode()
+    if mode == "single":
+        return _create_single_pass_graph()
+    use_local_matcher = use_local_matcher or mode == "local"
+    
     # Initialize the graph
     graph = StateGraph(GraphState)
     
-    # Add nodes
-    graph.add_node("extract_skills", extract_skills)
-    graph.add_node("analyze_experience", analyze_experience)
-    graph.add_node("extract_keywords", extract_keywords)
-    graph.add_node("generate_recommendations", generate_recommendations)
+    # Add nodes (each supports both invoke and ainvoke)
+    if use_local_matcher:
+        graph.add_node("extract_skills", local_extract_skills)
+        graph.add_node("extract_keywords", local_extract_keywords)
+    else:
+        graph.add_node("extract_skills", RunnableLambda(extract_skills, afunc=aextract_skills))
+        graph.add_node("extract_keywords", RunnableLambda(extract_keywords, afunc=aextract_keywords))
+    graph.add_node("analyze_experience", RunnableLambda(analyze_experience, afunc=aanalyze_experience))
+    graph.add_node("generate_recommendations", RunnableLambda(generate_recommendations, afunc=agenerate_recommendations))
+    
+    # Fan out: the three analyses run concurrently from the start
+    for node in ANALYSIS_NODES:
+        graph.add_edge(START, node)
+    
+    # Fan in: recommendations wait for all three analyses
+    graph.add_edge(ANALYSIS_NODES, "generate_recommendations")
+    graph.add_edge("generate_recommendations", END)
+    
+    return graph.compile()
+
+def _create_single_pass_graph():
+    graph = StateGraph(GraphState)
+    
+    graph.add_node("extract_combined", RunnableLambda(extract_combined, afunc=aextract_combined))
+    graph.add_node("generate_recommendations", RunnableLambda(generate_recommendations, afunc=agenerate_recommendations))
     
-    # Define the flow
-    graph.add_edge("extract_skills", "analyze_experience")
-    graph.add_edge("analyze_experience", "extract_keywords")
-    graph.add_edge("extract_keywords", "generate_recommendations")
+    graph.add_edge(START, "extract_combined")
+    graph.add_edge("extract_combined", "generate_recommendations")
     graph.add_edge("generate_recommendations", END)
     
-    # Set the entry point
-    graph.set_entry_point("extract_skills")
+    return graph.compile()
+
+# Create the graph for scoring many resumes against one job profile.
+# Invoke it with a "job_profile" from build_job_profile in the input state;
+# each resume then costs two LLM calls instead of four.
+def create_profile_analysis_graph():
+    graph = StateGraph(GraphState)
+    
+    graph.add_node("score_against_profile", RunnableLambda(score_against_profile, afunc=ascore_against_profile))
+    graph.add_node("generate_recommendations", RunnableLambda(generate_recommendations, afunc=agenerate_recommendations))
+    
+    graph.add_edge(START, "score_against_profile")
+    graph.add_edge("score_against_profile", "generate_recommendations")
+    graph.add_edge("generate_recommendations", END)
+    
+    return graph.compile()
+
+# Node whose tokens are streamed to the UI as they are generated
+STREAMED_NODE = "generate_recommendations"
+
+def stream_analysis(workflow, inputs):
+    """Run a compiled analysis graph, yielding progress events as they happen.
+
+    Yields ("node", (name, update)) when a node finishes, ("token", text)
+    for each token of the final recommendations, and finally
+    ("result", state) with the complete state. Cached recommendations
+    arrive as a single token event. When the scheduler retries the
+    recommendations call after part of the answer has streamed, ("reset",
+    None) comes first: the tokens so far are void and the answer restarts.
+    """
+    state = dict(inputs)
+    streamed = False
+    message_id = None
+    # Every node span below shares this run, which measures their queue wait
+    with trace_run("analysis"):
+        for mode, chunk in workflow.stream(inputs, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == STREAMED_NODE and message.content:
+                    # Every model call streams under its own message ID
+                    if streamed and message.id != message_id:
+                        yield "reset", None
+                    streamed, message_id = True, message.id
+                    yield "token", message.content
+                continue
+            
+            for name, update in chunk.items():
+                if not update:
+                    continue
+                state.update(update)
+                if name == STREAMED_NODE and not streamed:
+                    yield "token", update["final_recommendations"]
+                yield "node", (name, update)
     
-    return graph.compile()
\ No newline at end of file
+    yield "result", state
@@ -0,0 +1,164 @@
+"""Split resume text into sections and find which ones changed between two versions.
+
+Sections are found by their headers (Summary, Experience, Skills,
+Education, ...). Experience and project sections are split further into one
+section per role or project, so a single edited bullet point changes only
+its own entry. Each section is identified by a hash of its normalized text,
+so moving a section or changing its whitespace is not a change.
+"""
+import hashlib
+import re
+from collections import Counter
+
+from analysis_cache import normalize_text
+
+# Section kind -> header titles that start it
+SECTION_HEADERS = {
+    "summary": r"(professional |career |executive )?(summary|profile|overview)|about me|(career )?objective",
+    "experience": r"(work |professional |relevant )?experience|employment( history)?|(work|career) history",
+    "skills": r"(technical |core |key )?(skills|competencies)( summary)?|technologies|tech(nical)? stack|tools",
+    "education": r"education( and training)?|academic background",
+    "projects": r"(personal |selected |key )?projects",
+    "certifications": r"certifications?( and licenses)?|licenses|courses|training|awards",
+}
+_HEADER_PATTERNS = {kind: re.compile(f"(?:{pattern})", re.IGNORECASE) for kind, pattern in SECTION_HEADERS.items()}
+
+# Sections made of entries (roles, projects) that are compared one by one
+ENTRY_SECTIONS = ("experience", "projects")
+
+# Lines before the first header are contact details, unless there are enough
+# of them to be an untitled summary
+MAX_CONTACT_LINES = 4
+
+BULLET = re.compile(r"^\s*([-*•‣▪●–⁃]|\d+[.)])\s+")
+DATE = re.compile(r"\b(19|20)\d{2}\b|\bpresent\b|\bcurrent\b", re.IGNORECASE)
+
+
+def _header_kind(line):
+    """The section kind a line is the header of, or None"""
+    title = line.strip().lstrip("#").strip().strip("*_").strip().rstrip(":").strip()
+    if not title or len(title) > 40:
+        return None
+    for kind, pattern in _HEADER_PATTERNS.items():
+        if pattern.fullmatch(title):
+            return kind
+    return None
+
+
+def _split_entries(lines):
+    """Split an experience or projects section into its entries.
+
+    An entry starts at a non-bullet line after a blank line, or at a
+    non-bullet line with a date once the current entry has bullets.
+    """
+    entries, current, has_bullets, after_blank = [], [], False, False
+    for line in lines:
+        if not line.strip():
+            after_blank = True
+            continue
+        is_bullet = bool(BULLET.match(line))
+        if current and not is_bullet and (after_blank or (has_bullets and DATE.search(line))):
+            entries.append(current)
+            current, has_bullets = [], False
+        current.append(line)
+        has_bullets = has_bullets or is_bullet
+        after_blank = False
+    if current:
+        entries.append(current)
+    return entries
+
+
+def _section(kind, title, lines):
+    text = normalize_text("\n".join(lines))
+    return {"kind": kind, "title": title, "text": text,
+            "digest": hashlib.sha256(f"{kind}\n{text}".encode("utf-8")).hexdigest()}
+
+
+def split_sections(text):
+    """The resume's sections, in order, as dicts with kind, title, text and digest.
+
+    kind is one of SECTION_HEADERS, "contact" for the lines before the first
+    header, or "other" for sections under headers that aren't recognized.
+    """
+    blocks, kind, title, lines = [], "contact", "", []
+    for line in normalize_text(text).split("\n"):
+        header = _header_kind(line)
+        if header is None and lines and not lines[-1].strip() and line.strip() and line.strip().endswith(":") \
+                and len(line.strip()) <= 40:
+            # An unrecognized titled section ends the previous one
+            header = "other"
+        if header is not None:
+            blocks.append((kind, title, lines))
+            kind, title, lines = header, line.strip().rstrip(":"), []
+        else:
+            lines.append(line)
+    blocks.append((kind, title, lines))
+
+    sections = []
+    for kind, title, lines in blocks:
+        if not any(line.strip() for line in lines):
+            continue
+        if kind == "contact" and sum(1 for line in lines if line.strip()) > MAX_CONTACT_LINES:
+            kind = "summary"
+        if kind in ENTRY_SECTIONS:
+            sections.extend(_section(kind, title, entry) for entry in _split_entries(lines))
+        else:
+            sections.append(_section(kind, title, lines))
+    return sections
+
+
+def changed_sections(old_text, new_text):
+    """(removed, added): sections of old_text not in new_text, and sections of new_text not in old_text"""
+    old_sections, new_sections = split_sections(old_text), split_sections(new_text)
+    old_counts = Counter(section["digest"] for section in old_sections)
+    new_counts = Counter(section["digest"] for section in new_sections)
+    removed, added = [], []
+    for section in old_sections:
+        if new_counts[section["digest"]] > 0:
+            new_counts[section["digest"]] -= 1
+        else:
+            removed.append(section)
+    for section in new_sections:
+        if old_counts[section["digest"]] > 0:
+            old_counts[section["digest"]] -= 1
+        else:
+            added.append(section)
+    return removed, added
+
+
+def _first_line(section):
+    return section["text"].split("\n", 1)[0]
+
+
+def trim_to_changes(removed, added):
+    """removed and added, with each edited section cut down to its first line and the lines that changed.
+
+    A removed and an added section are the same section, edited, when they
+    share kind, title and first line (a role's title and dates); sections
+    that were only removed or only added are kept whole.
+    """
+    def key(section):
+        return section["kind"], section["title"], _first_line(section)
+
+    added_keys = Counter(key(section) for section in added)
+    removed_keys = Counter(key(section) for section in removed)
+    edited = {section_key for section_key in added_keys if added_keys[section_key] == removed_keys[section_key] == 1}
+
+    def trim(section, other_sections):
+        if key(section) not in edited:
+            return section
+        other = next(other for other in other_sections if key(other) == key(section))
+        other_lines = set(other["text"].split("\n"))
+        heading, *lines = section["text"].split("\n")
+        changed = [line for line in lines if line not in other_lines]
+        return dict(section, text="\n".join([heading] + changed))
+
+    return [trim(section, added) for section in removed], [trim(section, removed) for section in added]
+
+
+def format_sections(sections):
+    """Sections as prompt text, each under its kind and title"""
+    if not sections:
+        return "(none)"
+    return "\n\n".join(f"[{section['kind']}{': ' + section['title'] if section['title'] else ''}]\n{section['text']}"
+                       for section in sections)
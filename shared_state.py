@@ -0,0 +1,210 @@
+"""Key-value state shared by every app replica.
+
+SHARED_STATE_URL selects the store:
+
+- sqlite:///shared_state.db: one file, shared by the processes on one host
+- redis://host:6379/0: a Redis (or Redis-protocol compatible) server, for
+  replicas on several hosts
+- memory://: this process only, for tests
+
+Values are JSON. add() is an atomic insert-if-absent and incr() an atomic
+counter, which is what callers use to stay correct when several replicas
+write at once. Registered users and the analysis cache live here when
+SHARED_STATE_URL is set.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# Share of writes that also sweep expired entries out of the SQLite store
+SWEEP_PROBABILITY = 0.01
+
+
+class SQLiteKV:
+    """Key-value store in a SQLite file (WAL), shared by every process on the host"""
+
+    def __init__(self, path="shared_state.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _expires_at(ttl):
+        return time.time() + ttl if ttl else None
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), self._expires_at(ttl)))
+            if random.random() < SWEEP_PROBABILITY:
+                conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def add(self, key, value, ttl=None):
+        """Set key only if it is absent (or expired); returns whether it was set"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                                  (key, json.dumps(value), self._expires_at(ttl)))
+            return cursor.rowcount == 1
+
+    def incr(self, key, amount=1):
+        """Add amount to an integer (absent counts as 0); returns the new value"""
+        with self._connect() as conn:
+            conn.execute("INSERT INTO kv (key, value, expires_at) VALUES (?, ?, NULL) "
+                         "ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + ? AS TEXT)",
+                         (key, str(amount), amount))
+            return int(conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0])
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def scan(self, prefix):
+        """(key, value) for every live key starting with prefix"""
+        rows = self._connect().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "\U0010ffff", time.time())).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self, prefix=""):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key >= ? AND key < ?", (prefix, prefix + "\U0010ffff"))
+
+
+class RedisKV:
+    """Key-value store on Redis or any server speaking its protocol.
+
+    client may be any object with the redis-py API, e.g. a local stand-in
+    for tests.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="resume-matcher:", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("A redis:// SHARED_STATE_URL requires the 'redis' package: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl) if ttl else None, nx=True))
+
+    def incr(self, key, amount=1):
+        return int(self.client.incrby(self.prefix + key, amount))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def scan(self, prefix):
+        keys = list(self.client.scan_iter(self.prefix + prefix + "*"))
+        values = self.client.mget(keys) if keys else []
+        return [(key.decode("utf-8")[len(self.prefix):] if isinstance(key, bytes) else key[len(self.prefix):],
+                 json.loads(value)) for key, value in zip(keys, values) if value is not None]
+
+    def clear(self, prefix=""):
+        for key in self.client.scan_iter(self.prefix + prefix + "*"):
+            self.client.delete(key)
+
+
+class MemoryKV:
+    """Key-value store in this process's memory, for tests and single-process runs"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return json.loads(entry[0]) if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._entries[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+            return True
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            entry = self._live(key)
+            value = (int(json.loads(entry[0])) if entry is not None else 0) + amount
+            self._entries[key] = (json.dumps(value), entry[1] if entry is not None else None)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def scan(self, prefix):
+        with self._lock:
+            return [(key, json.loads(self._entries[key][0])) for key in list(self._entries)
+                    if key.startswith(prefix) and self._live(key) is not None]
+
+    def clear(self, prefix=""):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+def shared_state_configured():
+    """Whether SHARED_STATE_URL is set, i.e. the app may run as several replicas"""
+    return bool(os.environ.get("SHARED_STATE_URL"))
+
+
+def open_shared_state(url):
+    """The key-value store for a SHARED_STATE_URL"""
+    if url.startswith("sqlite:///"):
+        return SQLiteKV(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisKV(url)
+    if url == "memory://":
+        return MemoryKV()
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+@lru_cache(maxsize=None)
+def get_shared_state():
+    """Process-wide key-value store at SHARED_STATE_URL (default sqlite:///shared_state.db)"""
+    return open_shared_state(os.environ.get("SHARED_STATE_URL", "sqlite:///shared_state.db"))
@@ -0,0 +1,427 @@
+"""Deterministic, LLM-free matching of resumes against job descriptions.
+
+Produces the same JSON shapes as the extract_skills and extract_keywords
+nodes in resume_analyzer, so it can stand in for them entirely (local mode)
+or pre-score resumes before deciding which ones are worth LLM calls.
+
+prescore() reuses the job-description side of the work (tokens, skills,
+keywords, term statistics) across resumes through prepare_job(), so
+scoring a batch against one posting only does the resume's share.
+"""
+import json
+import os
+import re
+from collections import Counter, deque
+from functools import lru_cache
+
+import numpy as np
+
+# Canonical skill name -> surface forms found in resumes and job postings
+SKILL_SYNONYMS = {
+    "Python": ["python", "python3", "python 3"],
+    "Java": ["java"],
+    "JavaScript": ["javascript", "js", "ecmascript", "es6"],
+    "TypeScript": ["typescript"],
+    "C++": ["c++", "cpp"],
+    "C#": ["c#", "csharp", "c sharp"],
+    "Go": ["golang", "go lang"],
+    "Rust": ["rust"],
+    "Ruby": ["ruby"],
+    "PHP": ["php"],
+    "Scala": ["scala"],
+    "Kotlin": ["kotlin"],
+    "Swift": ["swift"],
+    "R": ["r programming", "rstudio"],
+    "SQL": ["sql", "t-sql", "pl/sql", "plsql"],
+    "NoSQL": ["nosql"],
+    "PostgreSQL": ["postgresql", "postgres"],
+    "MySQL": ["mysql"],
+    "MongoDB": ["mongodb", "mongo"],
+    "Redis": ["redis"],
+    "Elasticsearch": ["elasticsearch", "elastic search"],
+    "Kafka": ["kafka", "apache kafka"],
+    "Spark": ["spark", "apache spark", "pyspark"],
+    "Hadoop": ["hadoop"],
+    "Airflow": ["airflow", "apache airflow"],
+    "Snowflake": ["snowflake"],
+    "dbt": ["dbt"],
+    "Pandas": ["pandas"],
+    "NumPy": ["numpy"],
+    "scikit-learn": ["scikit-learn", "sklearn", "scikit learn"],
+    "TensorFlow": ["tensorflow"],
+    "PyTorch": ["pytorch", "torch"],
+    "Machine Learning": ["machine learning", "ml"],
+    "Deep Learning": ["deep learning"],
+    "NLP": ["nlp", "natural language processing"],
+    "Computer Vision": ["computer vision"],
+    "Data Analysis": ["data analysis", "data analytics"],
+    "Data Visualization": ["data visualization", "data visualisation"],
+    "Statistics": ["statistics", "statistical analysis"],
+    "Excel": ["excel", "microsoft excel", "ms excel"],
+    "Tableau": ["tableau"],
+    "Power BI": ["power bi", "powerbi"],
+    "React": ["react", "reactjs", "react.js"],
+    "Angular": ["angular", "angularjs"],
+    "Vue": ["vue", "vuejs", "vue.js"],
+    "Node.js": ["node.js", "nodejs"],
+    "Django": ["django"],
+    "Flask": ["flask"],
+    "FastAPI": ["fastapi"],
+    "Spring": ["spring", "spring boot"],
+    ".NET": [".net", "dotnet", "asp.net"],
+    "HTML": ["html", "html5"],
+    "CSS": ["css", "css3"],
+    "REST APIs": ["restful", "rest api", "rest apis"],
+    "GraphQL": ["graphql"],
+    "Microservices": ["microservices", "microservice"],
+    "AWS": ["aws", "amazon web services"],
+    "Azure": ["azure", "microsoft azure"],
+    "GCP": ["gcp", "google cloud", "google cloud platform"],
+    "Docker": ["docker"],
+    "Kubernetes": ["kubernetes", "k8s"],
+    "Terraform": ["terraform"],
+    "Ansible": ["ansible"],
+    "CI/CD": ["ci/cd", "ci cd", "continuous integration", "continuous delivery", "continuous deployment"],
+    "Jenkins": ["jenkins"],
+    "Git": ["git", "github", "gitlab"],
+    "Linux": ["linux", "unix"],
+    "Agile": ["agile", "scrum", "kanban"],
+    "Jira": ["jira"],
+    "Project Management": ["project management", "program management"],
+    "Product Management": ["product management"],
+    "Stakeholder Management": ["stakeholder management"],
+    "Salesforce": ["salesforce"],
+    "SAP": ["sap"],
+    "Figma": ["figma"],
+    "UX Design": ["ux", "user experience", "ux design"],
+    "SEO": ["seo", "search engine optimization"],
+    "Digital Marketing": ["digital marketing"],
+    "Financial Modeling": ["financial modeling", "financial modelling"],
+    "Accounting": ["accounting", "gaap"],
+    "Leadership": ["leadership", "team leadership", "people management"],
+    "Communication": ["communication", "communication skills"],
+    "Problem Solving": ["problem solving", "problem-solving"],
+    "Teamwork": ["teamwork", "team player", "collaboration"],
+    "Customer Service": ["customer service", "customer support"],
+}
+
+SOFT_SKILLS = {
+    "Leadership", "Communication", "Problem Solving", "Teamwork", "Customer Service",
+    "Project Management", "Product Management", "Stakeholder Management", "Agile",
+}
+
+ACTION_VERBS = {
+    "achieve", "analyze", "architect", "automate", "build", "collaborate", "coordinate",
+    "create", "deliver", "deploy", "design", "develop", "drive", "enhance", "establish",
+    "execute", "identify", "implement", "improve", "increase", "launch", "lead", "maintain",
+    "manage", "mentor", "migrate", "monitor", "optimize", "own", "partner", "plan",
+    "reduce", "research", "resolve", "scale", "streamline", "support", "test", "troubleshoot",
+}
+
+INDUSTRY_BUZZWORDS = {
+    "cross-functional", "data-driven", "fast-paced", "scalable", "stakeholders", "end-to-end",
+    "best practices", "innovative", "mission-critical", "high-performance", "cloud-native",
+    "customer-centric", "self-starter", "results-oriented", "roadmap", "kpis", "roi",
+    "distributed systems", "real-time", "startup", "enterprise", "saas",
+}
+
+STOPWORDS = {
+    "a", "about", "across", "after", "all", "also", "an", "and", "any", "are", "as", "at",
+    "be", "been", "being", "both", "but", "by", "can", "could", "do", "does", "each", "etc",
+    "for", "from", "has", "have", "having", "he", "her", "his", "how", "i", "if", "in",
+    "including", "into", "is", "it", "its", "may", "me", "more", "most", "must", "my", "not",
+    "of", "on", "or", "other", "our", "ours", "over", "per", "plus", "preferred", "required",
+    "requirements", "responsibilities", "role", "she", "should", "so", "such", "than", "that",
+    "the", "their", "them", "then", "there", "these", "they", "this", "those", "through",
+    "to", "under", "up", "us", "using", "very", "was", "we", "well", "were", "what", "when",
+    "where", "which", "while", "who", "will", "with", "within", "work", "working", "would",
+    "year", "years", "you", "your", "job", "position", "candidate", "ability", "strong",
+    "experience", "skills", "team", "company", "knowledge", "understanding", "new",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#./\-]*[a-z0-9+#]|[a-z0-9][+#]*|\.[a-z][a-z0-9]*")
+
+# Lines and sentences are the "documents" IDF is computed over. A period
+# only ends one when no token character follows, so node.js and 3.5 stay whole.
+SENTENCE_BREAK = re.compile(r"[\n;•]|\.(?![a-z0-9+#./\-])")
+
+
+def _split_token(token):
+    # "ci/cd" and "node.js" stay whole, but split slashed word pairs like "design/build"
+    if "/" in token and token not in ("ci/cd", "pl/sql"):
+        return [part for part in token.split("/") if part]
+    return [token]
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping tech spellings like c++, c#, node.js and ci/cd together"""
+    result = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        result.extend(_split_token(token))
+    return result
+
+
+def _tokenize_with_stats(text):
+    """tokenize(text), plus the statistics keyword overlap needs, in one pass.
+
+    Returns the tokens and (tf, df, sentences): the count of each content
+    term, the number of lines/sentences it appears in, and the number of
+    lines/sentences with any content term.
+    """
+    tokens, df, sentences = [], Counter(), 0
+    for chunk in SENTENCE_BREAK.split(text.lower()):
+        found = TOKEN_PATTERN.findall(chunk)
+        if "/" in chunk:
+            found = [part for token in found for part in _split_token(token)]
+        tokens += found
+        unique = set(found)
+        if any(map(_is_content_term, unique)):
+            sentences += 1
+            df.update(unique)
+    tf = Counter(tokens)
+    for token in [token for token in tf if not _is_content_term(token)]:
+        del tf[token]
+        df.pop(token, None)
+    return tokens, (tf, df, sentences)
+
+
+class PhraseIndex:
+    """Aho-Corasick automaton over token sequences.
+
+    Finds every dictionary phrase in a token stream in a single pass,
+    regardless of how many phrases the dictionary holds. Matching on tokens
+    rather than characters means "go" never matches inside "google".
+    """
+
+    def __init__(self, phrases):
+        # phrases: iterable of (token tuple, value)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for tokens, value in phrases:
+            state = 0
+            for token in tokens:
+                nxt = self._goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(tokens), value))
+
+        # Breadth-first pass to build failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(token, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, tokens):
+        """Yield (start_index, length, value) for every phrase occurrence"""
+        state = 0
+        for i, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for length, value in self._out[state]:
+                yield i - length + 1, length, value
+
+
+def load_skill_dictionary(path=None):
+    """Built-in skill dictionary, extended by a JSON file of {canonical: [synonyms]} if given"""
+    dictionary = {name: list(forms) for name, forms in SKILL_SYNONYMS.items()}
+    path = path or os.environ.get("SKILL_DICTIONARY_PATH")
+    if path:
+        with open(path) as file:
+            for name, forms in json.load(file).items():
+                dictionary.setdefault(name, []).extend(forms)
+    return dictionary
+
+
+@lru_cache(maxsize=None)
+def _skill_index():
+    phrases = []
+    for name, forms in load_skill_dictionary().items():
+        for form in set(forms):
+            tokens = tuple(tokenize(form))
+            if tokens:
+                phrases.append((tokens, name))
+    return PhraseIndex(phrases)
+
+
+@lru_cache(maxsize=None)
+def _buzzword_index():
+    return PhraseIndex((tuple(tokenize(phrase)), phrase) for phrase in INDUSTRY_BUZZWORDS)
+
+
+def find_skills(tokens, covered=None):
+    """Canonical skills in a token stream, ordered by first appearance, with counts.
+
+    If a set is passed as covered, the token positions of every match are added to it.
+    """
+    counts = Counter()
+    for start, length, name in _skill_index().find(tokens):
+        counts[name] += 1
+        if covered is not None:
+            covered.update(range(start, start + length))
+    return counts
+
+
+def _stem_verb(token):
+    for suffix in ("ing", "ed", "es", "s"):
+        if token.endswith(suffix) and token[:-len(suffix)] in ACTION_VERBS:
+            return token[:-len(suffix)]
+        if suffix in ("ing", "ed") and token.endswith(suffix) and token[:-len(suffix)] + "e" in ACTION_VERBS:
+            return token[:-len(suffix)] + "e"
+    return token if token in ACTION_VERBS else None
+
+
+def match_skills(resume, job_description):
+    """Local equivalent of the extract_skills node"""
+    return _skills_analysis(find_skills(tokenize(resume)), find_skills(tokenize(job_description)))
+
+
+def _skills_analysis(resume_skills, jd_skills):
+    return {
+        "skills_in_job_description": list(jd_skills),
+        "skills_in_resume": list(resume_skills),
+        "missing_skills": [skill for skill in jd_skills if skill not in resume_skills],
+        "matching_skills": [skill for skill in jd_skills if skill in resume_skills],
+    }
+
+
+@lru_cache(maxsize=65536)
+def _is_content_term(token):
+    return token not in STOPWORDS and len(token) > 1 and any(char.isalpha() for char in token)
+
+
+def _content_terms(tokens):
+    return [token for token in tokens if _is_content_term(token)]
+
+
+def extract_keywords_local(job_description, max_keywords=15):
+    """Local equivalent of the extract_keywords node"""
+    tokens = tokenize(job_description)
+    covered = set()
+    skills = find_skills(tokens, covered)
+
+    # Rank the remaining content words by frequency in the posting, skill terms first
+    uncovered = [token for i, token in enumerate(tokens) if i not in covered]
+    terms = Counter(term for term in _content_terms(uncovered) if _stem_verb(term) is None)
+    essential = [skill for skill, _ in skills.most_common()]
+    essential += [term for term, _ in terms.most_common(max(0, max_keywords - len(essential)))]
+
+    verbs = []
+    for token in tokens:
+        verb = _stem_verb(token)
+        if verb and verb not in verbs:
+            verbs.append(verb)
+
+    buzzwords = []
+    for _, _, phrase in _buzzword_index().find(tokens):
+        if phrase not in buzzwords:
+            buzzwords.append(phrase)
+
+    return {
+        "essential_keywords": essential[:max_keywords],
+        "technical_terms": [skill for skill in skills if skill not in SOFT_SKILLS],
+        "industry_buzzwords": buzzwords,
+        "action_verbs": verbs,
+    }
+
+
+class PreparedJob:
+    """The job-description side of prescore(), computed once per posting"""
+
+    def __init__(self, job_description):
+        self.job_description = job_description
+        tokens, self.term_stats = _tokenize_with_stats(job_description)
+        self.skills = find_skills(tokens)
+        self.keyword_analysis = extract_keywords_local(job_description)
+
+
+@lru_cache(maxsize=16)
+def prepare_job(job_description):
+    """PreparedJob for a job description, cached for the next resumes scored against it"""
+    return PreparedJob(job_description)
+
+
+def _as_job(job_description):
+    return job_description if isinstance(job_description, PreparedJob) else prepare_job(job_description)
+
+
+def _overlap(job_stats, resume_stats, k1, b):
+    jd_tf, jd_df, jd_sentences = job_stats
+    resume_tf, resume_df, resume_sentences = resume_stats
+    if not resume_tf or not jd_tf:
+        return {"tfidf_cosine": 0.0, "bm25": 0.0}
+
+    vocabulary = list(jd_tf) + [term for term in resume_tf if term not in jd_tf]
+    df = np.array([jd_df.get(term, 0) + resume_df.get(term, 0) for term in vocabulary], dtype=float)
+    n = jd_sentences + resume_sentences
+    idf = np.log((n - df + 0.5) / (df + 0.5) + 1.0)
+
+    jd_counts = np.array([jd_tf.get(term, 0) for term in vocabulary], dtype=float)
+    resume_counts = np.array([resume_tf.get(term, 0) for term in vocabulary], dtype=float)
+    jd_length, resume_length = jd_counts.sum(), resume_counts.sum()
+
+    jd_vec = jd_counts * idf
+    resume_vec = resume_counts * idf
+    denom = np.linalg.norm(jd_vec) * np.linalg.norm(resume_vec)
+    cosine = float(jd_vec @ resume_vec / denom) if denom else 0.0
+
+    # BM25 of the resume for the posting's terms, normalized by the posting scored against itself
+    avgdl = (jd_length + resume_length) / 2.0
+    query = jd_counts > 0
+
+    def bm25(tf, length):
+        saturation = tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avgdl))
+        return float(np.sum(idf[query] * saturation[query]))
+
+    best = bm25(jd_counts, jd_length)
+    return {
+        "tfidf_cosine": round(cosine, 4),
+        "bm25": round(min(bm25(resume_counts, resume_length) / best, 1.0), 4) if best else 0.0,
+    }
+
+
+def keyword_overlap(resume, job_description, k1=1.2, b=0.75):
+    """TF-IDF cosine similarity and normalized BM25 score of the resume against the posting.
+
+    IDF comes from sentence-level document frequencies over both texts, so
+    terms repeated in every line of the posting count for less. The posting
+    may be given as a PreparedJob.
+    """
+    return _overlap(_as_job(job_description).term_stats, _tokenize_with_stats(resume)[1], k1, b)
+
+
+def prescore(resume, job_description):
+    """Full local analysis: skills, keywords, lexical overlap and a 0-100 match score.
+
+    job_description may be a PreparedJob from prepare_job(); plain text is
+    prepared (and cached) the same way. The resume is tokenized once, so
+    the cost grows with its length: about 1 ms for two pages, 3-4 ms for
+    eight and 10-15 ms for 24.
+    """
+    job = _as_job(job_description)
+    tokens, term_stats = _tokenize_with_stats(resume)
+    skills_analysis = _skills_analysis(find_skills(tokens), job.skills)
+    overlap = _overlap(job.term_stats, term_stats, k1=1.2, b=0.75)
+
+    required = len(skills_analysis["skills_in_job_description"])
+    skill_coverage = len(skills_analysis["matching_skills"]) / required if required else 1.0
+    score = 100 * (0.6 * skill_coverage + 0.4 * overlap["bm25"])
+    return {
+        "skills_analysis": skills_analysis,
+        # Copied so callers can't alter the cached profile
+        "keyword_analysis": {key: list(value) for key, value in job.keyword_analysis.items()},
+        "overlap": overlap,
+        "match_score": round(score, 1),
+    }
@@ -0,0 +1,389 @@
+"""Durable subscription and quota storage shared by every session and tab.
+
+SQLite in WAL mode is the default; set SUBSCRIPTION_DB_URL to a
+postgresql:// URL to use a server database instead. Quota is spent with a
+single conditional UPDATE, so two tabs can never both spend the last
+analysis. The same database holds pending checkouts and the queue of
+payment events applied by payment_webhooks.
+"""
+import abc
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+
+from analysis_cache import MemoryCache
+
+# How long a cached read may be served before going back to the database.
+# Writes through this store invalidate immediately; this bounds staleness
+# for writes made by other processes.
+READ_CACHE_TTL_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    username TEXT PRIMARY KEY,
+    plan_type TEXT NOT NULL,
+    expiry_date TEXT NOT NULL,
+    analyses_remaining INTEGER,
+    payment_id TEXT,
+    agreement_id TEXT,
+    updated_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+BILLING_PLANS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS billing_plans (
+    plan_key TEXT PRIMARY KEY,
+    plan_id TEXT NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+CHECKOUTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkouts (
+    checkout_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    plan_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at DOUBLE PRECISION NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+PAYMENT_EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payment_events (
+    event_id TEXT PRIMARY KEY,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    available_at DOUBLE PRECISION NOT NULL,
+    claimed_by TEXT,
+    error TEXT,
+    received_at DOUBLE PRECISION NOT NULL,
+    processed_at DOUBLE PRECISION
+)
+"""
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS payment_events_pending ON payment_events (status, available_at)",
+    "CREATE INDEX IF NOT EXISTS subscriptions_payment_id ON subscriptions (payment_id)",
+    "CREATE INDEX IF NOT EXISTS subscriptions_agreement_id ON subscriptions (agreement_id)",
+)
+
+# A claimed event whose worker died is handed out again after this long
+EVENT_CLAIM_TIMEOUT_SECONDS = 300
+
+COLUMNS = ("username", "plan_type", "expiry_date", "analyses_remaining", "payment_id", "agreement_id")
+
+
+class SubscriptionStore(abc.ABC):
+    """Subscription storage over any DB-API connection.
+
+    analyses_remaining is NULL in the database for unlimited plans and
+    float('inf') in the dicts returned to callers, matching the shape the
+    app has always used.
+    """
+
+    # DB-API parameter placeholder; "?" for sqlite3, "%s" for psycopg
+    placeholder = "?"
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cache = MemoryCache(max_entries=4096, ttl=READ_CACHE_TTL_SECONDS)
+        with self._transaction() as cursor:
+            cursor.execute(SCHEMA)
+            cursor.execute(BILLING_PLANS_SCHEMA)
+            cursor.execute(CHECKOUTS_SCHEMA)
+            cursor.execute(PAYMENT_EVENTS_SCHEMA)
+            for index in INDEXES:
+                cursor.execute(index)
+            self._upgrade_schema(cursor)
+
+    @abc.abstractmethod
+    def connect(self):
+        """A new DB-API connection to the database"""
+
+    def _upgrade_schema(self, cursor):
+        """Bring tables created by older versions up to the current schema"""
+
+    def _connection(self):
+        # One connection per thread; Streamlit serves each session on its own thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _sql(self, query):
+        return query.replace("?", self.placeholder)
+
+    @staticmethod
+    def _row_to_subscription(row):
+        subscription = dict(zip(COLUMNS, row))
+        subscription["expiry_date"] = datetime.fromisoformat(subscription["expiry_date"])
+        if subscription["analyses_remaining"] is None:
+            subscription["analyses_remaining"] = float("inf")
+        return subscription
+
+    def get(self, username):
+        """The user's subscription dict, or None"""
+        cached = self._cache.get(username)
+        if cached is not None:
+            # A copy, so callers changing it don't change the cached entry
+            return dict(cached) if cached else None
+
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(f"SELECT {', '.join(COLUMNS)} FROM subscriptions WHERE username = ?"), (username,))
+            row = cursor.fetchone()
+        subscription = self._row_to_subscription(row) if row else None
+        # Cache misses too (as an empty dict) so users without a plan don't hit the database every rerun
+        self._cache.set(username, subscription or {})
+        return dict(subscription) if subscription else None
+
+    def save(self, username, plan_type, expiry_date, analyses_remaining, payment_id=None, agreement_id=None):
+        """Create or replace a user's subscription"""
+        if analyses_remaining == float("inf"):
+            analyses_remaining = None
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "INSERT INTO subscriptions (username, plan_type, expiry_date, analyses_remaining, "
+                "payment_id, agreement_id, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET plan_type = excluded.plan_type, "
+                "expiry_date = excluded.expiry_date, analyses_remaining = excluded.analyses_remaining, "
+                "payment_id = excluded.payment_id, agreement_id = excluded.agreement_id, "
+                "updated_at = excluded.updated_at"
+            ), (username, plan_type, expiry_date.isoformat(), analyses_remaining, payment_id, agreement_id, time.time()))
+        self._cache.delete(username)
+
+    def consume_analysis(self, username, now=None):
+        """Atomically spend one analysis if the subscription is active and has any left.
+
+        Returns True if the analysis may go ahead. Unlimited plans always succeed
+        while active.
+        """
+        now = now or datetime.now()
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE subscriptions SET analyses_remaining = analyses_remaining - 1, updated_at = ? "
+                "WHERE username = ? AND expiry_date > ? "
+                "AND (analyses_remaining IS NULL OR analyses_remaining > 0)"
+            ), (time.time(), username, now.isoformat()))
+            consumed = cursor.rowcount == 1
+        self._cache.delete(username)
+        return consumed
+
+    def refund_analysis(self, username):
+        """Give back an analysis spent on a run that failed"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE subscriptions SET analyses_remaining = analyses_remaining + 1, updated_at = ? "
+                "WHERE username = ? AND analyses_remaining IS NOT NULL"
+            ), (time.time(), username))
+        self._cache.delete(username)
+
+    def find_username(self, payment_id=None, agreement_id=None):
+        """Owner of the subscription paid for by a payment or billing agreement, or None"""
+        column, value = ("payment_id", payment_id) if payment_id else ("agreement_id", agreement_id)
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(f"SELECT username FROM subscriptions WHERE {column} = ?"), (value,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def expire(self, username, now=None):
+        """End a subscription immediately, e.g. after a refund"""
+        now = now or datetime.now()
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE subscriptions SET expiry_date = ?, updated_at = ? WHERE username = ? AND expiry_date > ?"
+            ), (now.isoformat(), time.time(), username, now.isoformat()))
+        self._cache.delete(username)
+
+    def save_checkout(self, checkout_id, username, plan_type):
+        """Remember who started a PayPal checkout, so the return doesn't depend on session state"""
+        now = time.time()
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "INSERT INTO checkouts (checkout_id, username, plan_type, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'created', ?, ?) ON CONFLICT (checkout_id) DO NOTHING"
+            ), (checkout_id, username, plan_type, now, now))
+
+    def get_checkout(self, checkout_id):
+        """Checkout dict with username, plan_type, status and error, or None"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "SELECT checkout_id, username, plan_type, status, error FROM checkouts WHERE checkout_id = ?"
+            ), (checkout_id,))
+            row = cursor.fetchone()
+        return dict(zip(("checkout_id", "username", "plan_type", "status", "error"), row)) if row else None
+
+    def update_checkout(self, checkout_id, status, error=None):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE checkouts SET status = ?, error = ?, updated_at = ? WHERE checkout_id = ?"
+            ), (status, error, time.time(), checkout_id))
+
+    def mark_checkout_completed(self, checkout_id):
+        """Atomically move a checkout to completed; returns False if it already was"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE checkouts SET status = 'completed', error = NULL, updated_at = ? "
+                "WHERE checkout_id = ? AND status <> 'completed'"
+            ), (time.time(), checkout_id))
+            return cursor.rowcount == 1
+
+    def enqueue_payment_event(self, event_id, event_type, payload):
+        """Queue an event for the payment worker; returns False if this event ID was already queued"""
+        now = time.time()
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "INSERT INTO payment_events (event_id, event_type, payload, status, attempts, "
+                "available_at, received_at) VALUES (?, ?, ?, 'pending', 0, ?, ?) "
+                "ON CONFLICT (event_id) DO NOTHING"
+            ), (event_id, event_type, payload, now, now))
+            return cursor.rowcount == 1
+
+    def claim_payment_event(self, worker_id):
+        """Take the oldest due event for this worker.
+
+        Returns (event_id, event_type, payload, attempts) or None. The claim
+        is a single conditional UPDATE, so concurrent workers in any number of
+        processes never receive the same event.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "SELECT event_id, attempts FROM payment_events "
+                "WHERE (status = 'pending' AND available_at <= ?) OR (status = 'processing' AND available_at <= ?) "
+                "ORDER BY received_at LIMIT 1"
+            ), (now, now - EVENT_CLAIM_TIMEOUT_SECONDS))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            event_id, attempts = row
+            # attempts acts as a version number: if another worker claimed the
+            # event since the SELECT, it has moved on and this UPDATE matches nothing
+            cursor.execute(self._sql(
+                "UPDATE payment_events SET status = 'processing', claimed_by = ?, attempts = attempts + 1, "
+                "available_at = ? WHERE event_id = ? AND attempts = ?"
+            ), (worker_id, now, event_id, attempts))
+            if cursor.rowcount != 1:
+                return None
+            cursor.execute(self._sql(
+                "SELECT event_id, event_type, payload, attempts FROM payment_events WHERE event_id = ?"
+            ), (event_id,))
+            return cursor.fetchone()
+
+    def finish_payment_event(self, event_id, status, error=None):
+        """Mark a claimed event applied, ignored or failed"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE payment_events SET status = ?, error = ?, processed_at = ? WHERE event_id = ?"
+            ), (status, error, time.time(), event_id))
+
+    def retry_payment_event(self, event_id, delay, error):
+        """Put a claimed event back in the queue after a transient failure"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "UPDATE payment_events SET status = 'pending', error = ?, available_at = ? WHERE event_id = ?"
+            ), (error, time.time() + delay, event_id))
+
+    def payment_event_counts(self):
+        """Number of queued events by status"""
+        with self._transaction() as cursor:
+            cursor.execute("SELECT status, COUNT(*) FROM payment_events GROUP BY status")
+            return dict(cursor.fetchall())
+
+    def get_billing_plan_id(self, plan_key):
+        """Provisioned PayPal billing plan ID for a plan definition, or None"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql("SELECT plan_id FROM billing_plans WHERE plan_key = ?"), (plan_key,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def save_billing_plan_id(self, plan_key, plan_id):
+        """Record a provisioned plan; returns the plan ID that ends up stored (first writer wins)"""
+        with self._transaction() as cursor:
+            cursor.execute(self._sql(
+                "INSERT INTO billing_plans (plan_key, plan_id, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (plan_key) DO NOTHING"
+            ), (plan_key, plan_id, time.time()))
+        return self.get_billing_plan_id(plan_key)
+
+    def delete_billing_plan_id(self, plan_key):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql("DELETE FROM billing_plans WHERE plan_key = ?"), (plan_key,))
+
+
+class SQLiteSubscriptionStore(SubscriptionStore):
+    """Local SQLite store in WAL mode, so readers never block the writer"""
+
+    def __init__(self, path="subscriptions.db"):
+        self.path = path
+        super().__init__()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL: a crash can lose the last commits but never corrupts the database
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+
+class PostgresSubscriptionStore(SubscriptionStore):
+    """Store on a PostgreSQL server, for running several app replicas"""
+
+    placeholder = "%s"
+
+    def __init__(self, dsn):
+        self.dsn = dsn
+        super().__init__()
+
+    def connect(self):
+        try:
+            import psycopg
+        except ImportError:
+            raise ImportError("The PostgreSQL subscription store requires 'psycopg': pip install psycopg[binary]")
+        return psycopg.connect(self.dsn)
+
+    def _upgrade_schema(self, cursor):
+        # Timestamps were once REAL, which Postgres stores as float4: about a
+        # two-minute resolution for epoch seconds
+        cursor.execute(
+            "SELECT table_name, column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND data_type = 'real' "
+            "AND table_name IN ('subscriptions', 'billing_plans', 'checkouts', 'payment_events')")
+        for table, column in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE DOUBLE PRECISION")
+
+
+@lru_cache(maxsize=None)
+def get_subscription_store():
+    """Process-wide subscription store, chosen by SUBSCRIPTION_DB_URL.
+
+    sqlite:///path/to/file.db (default sqlite:///subscriptions.db) or a
+    postgresql:// connection URL.
+    """
+    url = os.environ.get("SUBSCRIPTION_DB_URL", "sqlite:///subscriptions.db")
+    if url.startswith("sqlite:///"):
+        return SQLiteSubscriptionStore(url[len("sqlite:///"):])
+    if url.startswith(("postgresql://", "postgres://")):
+        return PostgresSubscriptionStore(url)
+    raise ValueError(f"Unsupported SUBSCRIPTION_DB_URL: {url}")
@@ -0,0 +1,259 @@
+"""Per-stage latency and usage instrumentation.
+
+Each analysis node, job-profile call and document extraction runs inside a
+stage span recording wall time, queue wait, model, prompt and completion
+tokens, cost, retries, cache hits and payload sizes. Finished spans are:
+
+- kept in a bounded in-process window, summarized by stage_summary() as
+  p50/p95/p99 per stage
+- logged as one JSON object per line on the "telemetry" logger
+  (TELEMETRY_LOG=stderr or a file path attaches a handler)
+- exported as Prometheus metrics when prometheus_client is installed
+  (METRICS_PORT starts the scrape endpoint)
+
+Queue wait is the time between a stage becoming runnable and starting: from
+the start of the enclosing run for the first stages, and from the end of the
+latest finished stage for the ones that fan in after them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Spans kept per stage for percentiles
+WINDOW_SIZE = 2048
+
+_current_span = ContextVar("telemetry_span", default=None)
+_current_run = ContextVar("telemetry_run", default=None)
+_usage_handler = ContextVar("telemetry_usage_handler", default=None)
+_usage_handler_class = None
+
+_windows = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_windows_lock = threading.Lock()
+
+
+class Span(dict):
+    """Fields recorded for one execution of a stage"""
+
+    def add(self, field, amount=1):
+        self[field] = self.get(field, 0) + amount
+
+
+def install_usage_handler(handler_class):
+    """Give every stage a handler_class(span), in the context variable this returns.
+
+    langchain_usage installs its token counter this way, so importing
+    telemetry doesn't load LangChain.
+    """
+    global _usage_handler_class
+    _usage_handler_class = handler_class
+    return _usage_handler
+
+
+def current_span():
+    """The innermost active span, or None outside any stage"""
+    return _current_span.get()
+
+
+def add_to_span(field, amount=1):
+    """Add to a field of the active span, if there is one"""
+    span = _current_span.get()
+    if span is not None:
+        span.add(field, amount)
+
+
+def count_http_request(request):
+    """httpx request hook; more requests than LLM calls in a stage means the client retried"""
+    span = _current_span.get()
+    if span is not None:
+        span.add("http_requests")
+
+
+@contextmanager
+def trace_run(name):
+    """Group the stages of one analysis, so their queue wait can be measured"""
+    run = {"name": name, "started_at": time.perf_counter(), "last_finished_at": None}
+    token = _current_run.set(run)
+    try:
+        with trace_stage(name) as span:
+            yield span
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def trace_stage(stage, **fields):
+    """Record one execution of a stage; yields the Span for callers to annotate"""
+    run = _current_run.get()
+    span = Span(stage=stage, **fields)
+    started = time.perf_counter()
+    if run is not None and run["name"] != stage:
+        ready_at = max(run["started_at"], run["last_finished_at"] or 0)
+        span["queue_wait_seconds"] = max(0.0, started - ready_at)
+    span_token = _current_span.set(span)
+    handler_token = _usage_handler.set(_usage_handler_class(span) if _usage_handler_class else None)
+    try:
+        yield span
+    except BaseException as e:
+        span["error"] = type(e).__name__
+        raise
+    finally:
+        _usage_handler.reset(handler_token)
+        _current_span.reset(span_token)
+        finished = time.perf_counter()
+        span["wall_seconds"] = finished - started
+        if span.get("http_requests", 0) > span.get("llm_calls", 0):
+            span["retries"] = span.get("retries", 0) + span["http_requests"] - span["llm_calls"]
+        if run is not None and run["name"] != stage:
+            run["last_finished_at"] = max(run["last_finished_at"] or 0, finished)
+        record_span(span)
+
+
+def record_span(span):
+    """Keep, log and export a finished span"""
+    span.setdefault("timestamp", time.time())
+    with _windows_lock:
+        _windows[span["stage"]].append(dict(span))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(span, default=str, sort_keys=True))
+    metrics = _prometheus_metrics()
+    if metrics is not None:
+        _export(metrics, span)
+
+
+def _percentile(values, q):
+    # Nearest-rank percentile of sorted values
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def stage_summary():
+    """Latency percentiles and usage totals per stage over the recent window"""
+    with _windows_lock:
+        windows = {stage: list(spans) for stage, spans in _windows.items()}
+    summary = {}
+    for stage, spans in sorted(windows.items()):
+        wall = sorted(span["wall_seconds"] for span in spans)
+        queue = sorted(span.get("queue_wait_seconds", 0.0) for span in spans)
+        summary[stage] = {
+            "count": len(spans),
+            "errors": sum(1 for span in spans if "error" in span),
+            "p50_ms": 1000 * _percentile(wall, 50),
+            "p95_ms": 1000 * _percentile(wall, 95),
+            "p99_ms": 1000 * _percentile(wall, 99),
+            "queue_wait_p95_ms": 1000 * _percentile(queue, 95),
+            "cache_hit_rate": sum(1 for span in spans if span.get("cache_hit")) / len(spans),
+            "prompt_tokens": sum(span.get("prompt_tokens", 0) for span in spans),
+            "completion_tokens": sum(span.get("completion_tokens", 0) for span in spans),
+            "cost_usd": sum(span.get("cost_usd", 0.0) for span in spans),
+            "models": ", ".join(sorted({span["model"] for span in spans if span.get("model")})),
+            "repairs": sum(1 for span in spans if span.get("repair")),
+            "retries": sum(span.get("retries", 0) for span in spans),
+            "input_bytes": sum(span.get("input_bytes", 0) for span in spans),
+            "output_bytes": sum(span.get("output_bytes", 0) for span in spans),
+        }
+    return summary
+
+
+def reset():
+    """Forget every recorded span (Prometheus counters are cumulative and unaffected)"""
+    with _windows_lock:
+        _windows.clear()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def _prometheus_metrics():
+    # Metrics can only be registered once per process; stages on several
+    # threads may finish at the same moment
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = _create_prometheus_metrics()
+        return _metrics or None
+
+
+def _create_prometheus_metrics():
+    try:
+        import prometheus_client as prom
+    except ImportError:
+        return {}
+    byte_buckets = [2 ** exponent for exponent in range(8, 25, 2)]
+    return {
+        "wall": prom.Histogram("resume_matcher_stage_seconds", "Stage wall time", ["stage", "outcome"],
+                               buckets=[0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80]),
+        "queue": prom.Histogram("resume_matcher_stage_queue_wait_seconds", "Time a stage waited before starting",
+                                ["stage"], buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30]),
+        "tokens": prom.Counter("resume_matcher_llm_tokens", "LLM tokens used", ["stage", "kind"]),
+        "cost": prom.Counter("resume_matcher_llm_cost_usd", "Estimated LLM cost in USD", ["stage", "model"]),
+        "repairs": prom.Counter("resume_matcher_stage_output_repairs", "Malformed outputs repaired", ["stage", "how"]),
+        "retries": prom.Counter("resume_matcher_stage_retries", "Retried requests", ["stage"]),
+        "cache_hits": prom.Counter("resume_matcher_stage_cache_hits", "Stage results served from cache", ["stage"]),
+        "payload": prom.Histogram("resume_matcher_stage_payload_bytes", "Stage input and output sizes",
+                                  ["stage", "direction"], buckets=byte_buckets),
+    }
+
+
+_gauges = {}
+
+
+def set_gauge(name, description, value):
+    """Set a point-in-time Prometheus gauge (resume_matcher_<name>), if Prometheus is available"""
+    if _prometheus_metrics() is None:
+        return
+    with _metrics_lock:
+        gauge = _gauges.get(name)
+        if gauge is None:
+            import prometheus_client as prom
+            gauge = _gauges[name] = prom.Gauge(f"resume_matcher_{name}", description)
+    gauge.set(value)
+
+
+def _export(metrics, span):
+    stage = span["stage"]
+    metrics["wall"].labels(stage, "error" if "error" in span else "ok").observe(span["wall_seconds"])
+    if "queue_wait_seconds" in span:
+        metrics["queue"].labels(stage).observe(span["queue_wait_seconds"])
+    for kind in ("prompt", "completion"):
+        if span.get(f"{kind}_tokens"):
+            metrics["tokens"].labels(stage, kind).inc(span[f"{kind}_tokens"])
+    if span.get("cost_usd"):
+        metrics["cost"].labels(stage, span.get("model", "")).inc(span["cost_usd"])
+    if span.get("repair"):
+        metrics["repairs"].labels(stage, span["repair"]).inc()
+    if span.get("retries"):
+        metrics["retries"].labels(stage).inc(span["retries"])
+    if span.get("cache_hit"):
+        metrics["cache_hits"].labels(stage).inc()
+    for direction in ("input", "output"):
+        if f"{direction}_bytes" in span:
+            metrics["payload"].labels(stage, direction).observe(span[f"{direction}_bytes"])
+
+
+@lru_cache(maxsize=None)
+def configure_telemetry():
+    """Apply TELEMETRY_LOG and METRICS_PORT once per process"""
+    destination = os.environ.get("TELEMETRY_LOG")
+    if destination:
+        handler = logging.StreamHandler() if destination == "stderr" else logging.FileHandler(destination)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImportError("METRICS_PORT requires the 'prometheus_client' package: pip install prometheus-client")
+        prometheus_client.start_http_server(int(port))
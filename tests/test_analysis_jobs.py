@@ -0,0 +1,108 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import analysis_jobs
+from analysis_jobs import AnalysisWorker, SQLiteJobStore, submit_analysis
+from subscription_store import SQLiteSubscriptionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "analysis_jobs.db"))
+
+
+def test_concurrent_claims_hand_out_a_job_once(store):
+    job_id = submit_analysis("resume", "job", store=store)
+    barrier = threading.Barrier(8)
+    claimed = []
+
+    def claim(worker_id):
+        barrier.wait()
+        claimed.append(store.claim(worker_id))
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [job["job_id"] for job in claimed if job] == [job_id]
+
+
+def test_premium_jobs_are_claimed_first(store):
+    submit_analysis("resume", "job", plan_type="basic", store=store)
+    premium = submit_analysis("resume", "job", plan_type="premium", store=store)
+    assert store.claim("worker")["job_id"] == premium
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_loses_the_job(store, monkeypatch):
+    job_id = submit_analysis("resume", "job", store=store)
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 0)
+    assert store.claim("first")["attempts"] == 1
+
+    second = store.claim("second")
+    assert (second["job_id"], second["attempts"]) == (job_id, 2)
+    assert not store.renew_lease(job_id, "first")
+    assert not store.save_progress(job_id, "first", {"recommendations": "stale"})
+    assert not store.finish(job_id, "first", result={})
+    assert store.finish(job_id, "second", result={"final_recommendations": "done"})
+    assert store.get(job_id)["status"] == "completed"
+
+
+def test_renewed_lease_is_not_reclaimed(store, monkeypatch):
+    job_id = submit_analysis("resume", "job", store=store)
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 0)
+    store.claim("first")
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 60)
+    assert store.renew_lease(job_id, "first")
+    assert store.claim("second") is None
+
+
+def test_heartbeat_renews_the_lease_and_notices_a_lost_job(store, monkeypatch):
+    job_id = submit_analysis("resume", "job", store=store)
+    monkeypatch.setattr(analysis_jobs, "HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 0)
+    worker = AnalysisWorker(store=store)
+    store.claim(worker.worker_id)
+
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 60)
+    done, lost = threading.Event(), threading.Event()
+    heartbeat = threading.Thread(target=worker._heartbeat, args=(job_id, done, lost))
+    heartbeat.start()
+    try:
+        assert not lost.wait(0.1)
+        assert store.claim("other") is None
+    finally:
+        done.set()
+        heartbeat.join()
+
+    # Once another worker holds the job, the next beat reports it lost
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 0)
+    store.renew_lease(job_id, worker.worker_id)
+    store.claim("other")
+    done.clear()
+    heartbeat = threading.Thread(target=worker._heartbeat, args=(job_id, done, lost))
+    heartbeat.start()
+    assert lost.wait(1)
+    heartbeat.join()
+
+
+def test_abandoned_job_fails_after_its_last_attempt_and_is_refunded(store, tmp_path, monkeypatch):
+    subscriptions = SQLiteSubscriptionStore(str(tmp_path / "subscriptions.db"))
+    subscriptions.save("alice", "basic", datetime.now() + timedelta(days=30), 5)
+    monkeypatch.setattr(analysis_jobs, "get_subscription_store", lambda: subscriptions)
+    assert subscriptions.consume_analysis("alice")
+    job_id = submit_analysis("resume", "job", username="alice", refund=True, store=store)
+
+    monkeypatch.setattr(analysis_jobs, "LEASE_SECONDS", 0)
+    for attempt in range(analysis_jobs.MAX_ATTEMPTS):
+        assert store.claim(f"worker-{attempt}")["job_id"] == job_id
+    assert store.claim("late") is None
+
+    # A worker refunds abandoned jobs before claiming the next one
+    assert not AnalysisWorker(store=store).process_next()
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == ("failed", "The analysis worker stopped")
+    assert subscriptions.get("alice")["analyses_remaining"] == 5
+    assert store.fail_abandoned() == []
@@ -0,0 +1,121 @@
+"""A retried recommendations call must not leave its partial answer in the stored progress"""
+from typing import Any, List, Optional, TypedDict
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langgraph.graph import END, START, StateGraph
+
+import analysis_jobs
+import llm_scheduler
+from analysis_jobs import AnalysisWorker, SQLiteJobStore
+from llm_scheduler import LLMScheduler, set_scheduler
+from resume_analyzer import STREAMED_NODE, stream_analysis
+
+WORDS = ["Add ", "Kubernetes ", "to ", "your ", "skills."]
+ANSWER = "".join(WORDS)
+
+
+class APIConnectionError(Exception):
+    """Named like the OpenAI client's error, which the scheduler retries"""
+
+
+class FlakyStreamingModel(BaseChatModel):
+    """Streams WORDS, dropping the connection partway through its first `failures` calls"""
+
+    failures: List[int] = [1]
+
+    @property
+    def _llm_type(self):
+        return "flaky-streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=ANSWER))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        for i, word in enumerate(WORDS):
+            if i == 2 and self.failures[0]:
+                self.failures[0] -= 1
+                raise APIConnectionError("connection dropped")
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+class State(TypedDict, total=False):
+    resume: str
+    job_description: str
+    skills_analysis: dict
+    experience_analysis: dict
+    keyword_analysis: dict
+    final_recommendations: Optional[str]
+
+
+def _graph(model):
+    def generate(state):
+        message = llm_scheduler.get_scheduler().invoke(model, "recommend", estimated_tokens=10)
+        return {"final_recommendations": message.content}
+
+    graph = StateGraph(State)
+    graph.add_node(STREAMED_NODE, generate)
+    graph.add_edge(START, STREAMED_NODE)
+    graph.add_edge(STREAMED_NODE, END)
+    return graph.compile()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+    scheduler._backoff = lambda error, attempt: 0
+    set_scheduler(scheduler)
+    yield scheduler
+    set_scheduler(None)
+
+
+INPUTS = {"resume": "r", "job_description": "j", "skills_analysis": {}, "experience_analysis": {},
+          "keyword_analysis": {}}
+
+
+def test_stream_resets_when_the_call_is_retried(scheduler):
+    events = list(stream_analysis(_graph(FlakyStreamingModel(failures=[1])), INPUTS))
+    text = ""
+    for kind, payload in events:
+        if kind == "reset":
+            text = ""
+        elif kind == "token":
+            text += payload
+    assert ("reset", None) in events
+    assert text == ANSWER
+    assert scheduler.counts["retries"] == 1
+
+
+def test_stream_without_failures_has_no_reset(scheduler):
+    events = list(stream_analysis(_graph(FlakyStreamingModel(failures=[0])), INPUTS))
+    assert "reset" not in [kind for kind, _ in events]
+    assert "".join(payload for kind, payload in events if kind == "token") == ANSWER
+
+
+def test_worker_progress_never_repeats_the_partial_answer(scheduler, tmp_path, monkeypatch):
+    # Save every token, so the partial answer reaches the database before the failure
+    monkeypatch.setattr(analysis_jobs, "PROGRESS_INTERVAL_SECONDS", 0)
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    saved = []
+    save_progress = store.save_progress
+
+    def recording_save_progress(job_id, worker_id, progress):
+        saved.append(progress["recommendations"])
+        return save_progress(job_id, worker_id, progress)
+
+    store.save_progress = recording_save_progress
+    job_id = store.submit({"resume": "r", "job_description": "j"})
+    worker = AnalysisWorker(workflow=_graph(FlakyStreamingModel(failures=[1])), store=store)
+    assert worker.process_next()
+
+    assert "" in saved[1:], "the partial answer was not cleared when the call was retried"
+    assert all(ANSWER.startswith(text) for text in saved)
+    job = store.get(job_id)
+    assert job["status"] == "completed"
+    assert job["progress"]["recommendations"] == ANSWER
+    assert job["result"]["final_recommendations"] == ANSWER
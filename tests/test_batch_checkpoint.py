@@ -0,0 +1,36 @@
+import json
+
+from batch_runner import load_checkpoint, run_key
+
+
+def write_checkpoint(path, records, trailer=""):
+    with open(path, "w") as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+        file.write(trailer)
+
+
+def test_only_records_from_the_same_run_are_reused(tmp_path):
+    key = run_key("Python developer")
+    other = run_key("Go developer")
+    path = tmp_path / "checkpoint.jsonl"
+    write_checkpoint(path, [
+        {"sha256": "a", "status": "ok", "run_key": key},
+        {"sha256": "b", "status": "filtered", "run_key": key},
+        {"sha256": "c", "status": "error", "run_key": key},
+        {"sha256": "d", "status": "ok", "run_key": other},
+        {"sha256": "e", "status": "ok"},
+    ], trailer='{"sha256": "f", "sta')
+    assert sorted(load_checkpoint(str(path), key)) == ["a", "b"]
+    assert sorted(load_checkpoint(str(path), other)) == ["d"]
+
+
+def test_run_key_depends_on_mode_and_threshold_not_whitespace():
+    key = run_key("Python developer")
+    assert run_key("  Python   developer \n") == key
+    assert run_key("Python developer", local_only=True) != key
+    assert run_key("Python developer", min_prescore=40) != key
+
+
+def test_missing_checkpoint_is_empty(tmp_path):
+    assert load_checkpoint(str(tmp_path / "missing.jsonl"), run_key("job")) == {}
@@ -0,0 +1,41 @@
+import asyncio
+
+import batch_runner
+from resume_analyzer import DEGRADED, _unrepairable, compute_match_score, is_degraded
+
+
+class FixedWorkflow:
+    def __init__(self, result):
+        self.result = result
+
+    async def ainvoke(self, inputs):
+        return dict(inputs, **self.result)
+
+
+def test_unrepairable_output_is_flagged_degraded():
+    span = {}
+    output = _unrepairable("extract_skills", span)
+    assert span["repair"] == "empty"
+    assert is_degraded({"skills_analysis": output})
+
+
+def test_unrepairable_combined_output_flags_each_analysis():
+    output = _unrepairable("extract_combined", {})
+    assert all(analysis[DEGRADED] for analysis in output.values() if isinstance(analysis, dict))
+
+
+def test_degraded_analysis_has_no_match_score():
+    result = {"resume": "", "skills_analysis": _unrepairable("extract_skills", {}),
+              "experience_analysis": {}, "keyword_analysis": {}}
+    assert compute_match_score(result) is None
+
+
+def test_degraded_analysis_is_an_error_record(tmp_path, monkeypatch):
+    resume = tmp_path / "resume.txt"
+    resume.write_text("Python developer")
+    workflow = FixedWorkflow({"skills_analysis": _unrepairable("extract_skills", {}),
+                              "experience_analysis": {}, "keyword_analysis": {}, "final_recommendations": ""})
+    record = asyncio.run(batch_runner._analyze_resume(
+        resume, "digest", None, {"job_description": "Python"}, workflow))
+    assert record["status"] == "error"
+    assert "match_score" not in record
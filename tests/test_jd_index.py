@@ -0,0 +1,41 @@
+import pytest
+
+from jd_index import JDIndex
+
+
+class FailingFlush:
+    """Stands in for the vectors memmap and fails the flush before commit"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def __setitem__(self, rows, values):
+        self.vectors[rows] = values
+
+    def flush(self):
+        raise OSError("disk full")
+
+
+def test_failed_batch_does_not_advance_the_row_count(tmp_path):
+    index = JDIndex(str(tmp_path))
+    index.add_many([("a", "Python developer", "A"), ("b", "Go developer", "B")])
+    assert len(index) == 2
+
+    vectors = index._vectors
+    index._vectors = FailingFlush(vectors)
+    with pytest.raises(OSError):
+        index.add_many([("c", "Rust developer", "C")])
+    index._vectors = vectors
+    assert len(index) == 2
+
+    index.add_many([("c", "Rust developer", "C")])
+    assert len(index) == 3
+    assert [match["job_id"] for match in index.search("Rust developer", 1, approximate=False)] == ["c"]
+
+
+def test_reopened_index_counts_committed_rows(tmp_path):
+    JDIndex(str(tmp_path)).add_many([("a", "Python developer", "A"), ("b", "Go developer", "B")])
+    assert len(JDIndex(str(tmp_path))) == 2
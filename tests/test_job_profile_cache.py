@@ -0,0 +1,41 @@
+import pytest
+
+import resume_analyzer
+from analysis_cache import MemoryCache
+from resume_analyzer import DEGRADED, build_job_profile
+
+RESPONSE = {"required_skills": ["Python"], "required_experience": ["3+ years"], "essential_keywords": ["Python"],
+            "technical_terms": [], "industry_buzzwords": [], "action_verbs": []}
+
+
+@pytest.fixture
+def profile_calls(monkeypatch):
+    calls = []
+    responses = []
+
+    def fake_invoke(node, inputs):
+        calls.append(inputs["job_description"])
+        return responses.pop(0) if responses else dict(RESPONSE)
+
+    cache = MemoryCache(ttl=None)
+    monkeypatch.setattr(resume_analyzer, "get_cache", lambda: cache)
+    monkeypatch.setattr(resume_analyzer, "_cached_invoke", fake_invoke)
+    return calls, responses
+
+
+def test_job_profile_is_built_once_per_normalized_job_description(profile_calls):
+    calls, _ = profile_calls
+    first = build_job_profile("Python developer\n\n\n\nRemote")
+    second = build_job_profile("  Python developer  \r\n\r\nRemote ")
+    assert len(calls) == 1
+    assert second["required_skills"] == first["required_skills"] == ["Python"]
+    # Each caller gets the profile with its own text
+    assert second["job_description"] == "  Python developer  \r\n\r\nRemote "
+
+
+def test_degraded_job_profile_is_not_cached(profile_calls):
+    calls, responses = profile_calls
+    responses.append({DEGRADED: True})
+    assert build_job_profile("Go developer")[DEGRADED]
+    assert DEGRADED not in build_job_profile("Go developer")
+    assert len(calls) == 2
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from payment_webhooks import BASIC_PLAN_ANALYSES, PaymentEventProcessor, ingest_webhook
+from subscription_store import SQLiteSubscriptionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteSubscriptionStore(str(tmp_path / "subscriptions.db"))
+
+
+def sale_completed(event_id, payment_id):
+    return json.dumps({"id": event_id, "event_type": "PAYMENT.SALE.COMPLETED",
+                       "resource": {"parent_payment": payment_id}}).encode()
+
+
+def no_execution(plan, checkout_id, payer_id):
+    raise AssertionError("PayPal should not be called")
+
+
+def test_redelivered_event_is_queued_once(store):
+    body = sale_completed("WH-1", "PAY-1")
+    assert ingest_webhook(body, {}, verify=None, store=store) == (200, "queued")
+    assert ingest_webhook(body, {}, verify=None, store=store) == (200, "duplicate")
+    assert PaymentEventProcessor(store, execute_checkout=no_execution).run_until_idle() == 1
+
+
+def test_redelivery_after_processing_does_not_reset_the_quota(store):
+    store.save_checkout("PAY-1", "alice", "basic")
+    processor = PaymentEventProcessor(store, execute_checkout=no_execution)
+    ingest_webhook(sale_completed("WH-1", "PAY-1"), {}, verify=None, store=store)
+    processor.run_until_idle()
+    assert store.get("alice")["analyses_remaining"] == BASIC_PLAN_ANALYSES
+
+    assert store.consume_analysis("alice")
+    assert ingest_webhook(sale_completed("WH-1", "PAY-1"), {}, verify=None, store=store) == (200, "duplicate")
+    assert processor.run_until_idle() == 0
+    assert store.get("alice")["analyses_remaining"] == BASIC_PLAN_ANALYSES - 1
+
+
+def test_distinct_events_for_one_checkout_grant_the_plan_once(store):
+    store.save_checkout("PAY-1", "alice", "basic")
+    processor = PaymentEventProcessor(store, execute_checkout=no_execution)
+    ingest_webhook(sale_completed("WH-1", "PAY-1"), {}, verify=None, store=store)
+    processor.run_until_idle()
+    assert store.consume_analysis("alice")
+
+    ingest_webhook(sale_completed("WH-2", "PAY-1"), {}, verify=None, store=store)
+    assert processor.run_until_idle() == 1
+    assert store.get("alice")["analyses_remaining"] == BASIC_PLAN_ANALYSES - 1
+
+
+def test_malformed_event_is_rejected(store):
+    assert ingest_webhook(b"{}", {}, verify=None, store=store)[0] == 400
@@ -0,0 +1,30 @@
+from prompt_compaction import encode_analyses
+
+
+def test_items_are_deduplicated_within_an_analysis_only():
+    encoded = encode_analyses({
+        "skills_analysis": {"matching_skills": ["Python"], "missing_skills": ["Go"],
+                            "skills_in_resume": ["python", "SQL"], "skills_in_job_description": ["Python", "Go"]},
+        "experience_analysis": {"experience_gaps": ["Go"]},
+        "keyword_analysis": {"technical_terms": ["Python"]},
+    })
+    assert encoded["skills_analysis"].splitlines() == [
+        "matching_skills: Python",
+        "missing_skills: Go",
+        "skills_in_resume: SQL",
+        "skills_in_job_description: see above",
+    ]
+    # Items repeated from another analysis are kept
+    assert encoded["experience_analysis"] == "experience_gaps: Go"
+    assert encoded["keyword_analysis"] == "technical_terms: Python"
+
+
+def test_empty_and_missing_fields():
+    encoded = encode_analyses({"skills_analysis": {"matching_skills": [], "missing_skills": ["Go"]}})
+    assert encoded["skills_analysis"].splitlines() == ["matching_skills: none", "missing_skills: Go"]
+    assert encoded["experience_analysis"] == "none"
+
+
+def test_fields_outside_the_order_come_last():
+    encoded = encode_analyses({"keyword_analysis": {"notes": "Remote role", "action_verbs": ["Led"]}})
+    assert encoded["keyword_analysis"].splitlines() == ["action_verbs: Led", "notes: Remote role"]
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from subscription_store import SQLiteSubscriptionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteSubscriptionStore(str(tmp_path / "subscriptions.db"))
+
+
+def run_concurrently(target, threads):
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def run():
+        barrier.wait()
+        results.append(target())
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_concurrent_consumes_never_overspend(store):
+    store.save("alice", "basic", datetime.now() + timedelta(days=30), 5)
+    results = run_concurrently(lambda: store.consume_analysis("alice"), 20)
+    assert results.count(True) == 5
+    assert store.get("alice")["analyses_remaining"] == 0
+
+
+def test_concurrent_consume_and_refund_keep_the_count(store):
+    store.save("alice", "basic", datetime.now() + timedelta(days=30), 3)
+
+    def consume_then_refund():
+        consumed = store.consume_analysis("alice")
+        if consumed:
+            store.refund_analysis("alice")
+        return consumed
+
+    results = run_concurrently(consume_then_refund, 16)
+    assert any(results)
+    assert store.get("alice")["analyses_remaining"] == 3
+
+
+def test_expired_subscription_cannot_consume(store):
+    store.save("alice", "basic", datetime.now() - timedelta(days=1), 5)
+    assert not store.consume_analysis("alice")
+    assert store.get("alice")["analyses_remaining"] == 5
+
+
+def test_unlimited_plan_is_not_counted(store):
+    store.save("alice", "premium", datetime.now() + timedelta(days=30), float("inf"))
+    assert all(run_concurrently(lambda: store.consume_analysis("alice"), 8))
+    store.refund_analysis("alice")
+    assert store.get("alice")["analyses_remaining"] == float("inf")
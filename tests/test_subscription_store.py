@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from subscription_store import SQLiteSubscriptionStore, SubscriptionStore
+
+
+def test_base_store_is_abstract():
+    with pytest.raises(TypeError):
+        SubscriptionStore()
+
+
+def test_get_returns_a_copy_of_the_cached_subscription(tmp_path):
+    store = SQLiteSubscriptionStore(str(tmp_path / "subscriptions.db"))
+    store.save("alice", "basic", datetime.now() + timedelta(days=30), 5)
+
+    store.get("alice")["analyses_remaining"] = 0
+    assert store.get("alice")["analyses_remaining"] == 5
+    store.get("alice")["analyses_remaining"] = 0
+    assert store.get("alice")["analyses_remaining"] == 5